@@ -0,0 +1,321 @@
+import contextlib
+import functools
+import io
+import os
+import re
+import tarfile
+import threading
+import zipfile
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from tei_make_corpus.compression import (
+    compression_extension,
+    estimated_uncompressed_size,
+    is_corpus_file_name,
+    open_decompressed,
+    uncompressed_size,
+)
+from tei_make_corpus.path_finder import FileRecord
+
+ARCHIVE_EXTENSIONS = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+
+# an archive in a path, followed by the name of a member
+_ARCHIVE_IN_PATH = re.compile(
+    "(?:%s)(?=/)" % "|".join(re.escape(extension) for extension in ARCHIVE_EXTENSIONS),
+    re.IGNORECASE,
+)
+
+
+def is_archive(path: str) -> bool:
+    """
+    Return True if path is a zip or tar archive (recognized by its file
+    extension).
+    """
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def member_path(archive_path: str, member_name: str) -> str:
+    """
+    Return the path of a member of an archive, i.e. the path of the archive
+    and the name of the member, joined by '/'.
+    """
+    return f"{archive_path}/{member_name}"
+
+
+def split_member_path(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Return the path of the archive and the name of the member if path
+    refers to a member of an archive, else None.
+    """
+    for match in _ARCHIVE_IN_PATH.finditer(path):
+        if _is_archive_cached(path[: match.end()]):
+            return path[:match.end()], path[match.end() + 1:]
+    return None
+
+
+@contextlib.contextmanager
+def corpus_file_source(path: str) -> Iterator[Union[str, IO[bytes]]]:
+    """
+    Provide a source of the corpus file path for etree.parse or
+    etree.iterparse: the path itself for uncompressed files, a file object
+    for archive members and compressed files, which are decompressed while
+    they are read.
+    """
+    extension = compression_extension(path)
+    member = split_member_path(path)
+    if member is not None:
+        with _archive_reader(member[0]).open(member[1]) as source:
+            if extension is None:
+                yield source
+            else:
+                with open_decompressed(source, extension) as decompressed:
+                    yield decompressed
+    elif extension is None:
+        yield path
+    else:
+        with open(path, "rb") as compressed, open_decompressed(
+            compressed, extension
+        ) as decompressed:
+            yield decompressed
+
+
+def parse_corpus_file(
+    path: str, parser: Optional[etree.XMLParser] = None
+) -> etree._ElementTree:
+    """
+    Parse the corpus file path, which may be compressed or a member of an
+    archive.
+    """
+    with corpus_file_source(path) as source:
+        return etree.parse(source, parser)
+
+
+def iterparse_corpus_file(path: str, **options: Any) -> Iterator[Tuple[str, Any]]:
+    """
+    Parse the corpus file path incrementally with etree.iterparse and the
+    given options.
+    """
+    with corpus_file_source(path) as source:
+        yield from etree.iterparse(source, **options)
+
+
+def read_corpus_file(path: str, size: int = -1) -> bytes:
+    """
+    Return the (decompressed) content of the corpus file path, which may be
+    a member of an archive. If size is given, at most size bytes are read
+    from the start of the file.
+    """
+    with corpus_file_source(path) as source:
+        if isinstance(source, str):
+            with open(source, "rb") as ptr:
+                return ptr.read(size)
+        return source.read(size)
+
+
+def corpus_file_size(path: str) -> int:
+    """
+    Return the size in bytes of the corpus file path. For archive members,
+    the size in the member header is used; for compressed files, the
+    uncompressed size (see compression.uncompressed_size; estimated for
+    compressed archive members). Returns 0 if the file doesn't exist.
+    """
+    member = split_member_path(path)
+    if member is not None:
+        return estimated_uncompressed_size(
+            path, _archive_reader(member[0]).size(member[1])
+        )
+    if not os.path.exists(path):
+        return 0
+    return uncompressed_size(path, os.stat(path).st_size)
+
+
+def iter_archive_members(archive_path: str) -> Iterator[FileRecord]:
+    """
+    Yield the names and sizes in bytes of the regular files in an archive,
+    in the order of the archive.
+    """
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size
+        return
+    with tarfile.open(archive_path, "r|*") as archive:
+        while (tarinfo := archive.next()) is not None:
+            # the members are not kept
+            archive.members = []  # type: ignore[attr-defined]
+            if tarinfo.isfile():
+                yield tarinfo.name, tarinfo.size
+
+
+class ArchivePathFinder:
+    """
+    Implementation of PathFinder protocol for corpus files that are members
+    of a zip or tar archive (optionally compressed with gzip, bzip2 or xz),
+    passed as corpus_dir. The archive is not extracted; the file sizes are
+    taken from the member headers.
+
+    The paths of the members are the path of the archive and the name of
+    the member joined by '/' (e.g. 'corpus.tar.gz/dir/file.xml'). The
+    members are returned in the order of the archive, by all methods, so
+    the members of a tar archive are read in one pass through the archive
+    when they are processed in order.
+
+    As with files in a directory, only members ending in '.xml' (or the
+    extension of a compressed corpus file) are collected and members with
+    the name of the file containing the common header are excluded. The
+    sizes of compressed members are estimated.
+    """
+
+    def get_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> List[str]:
+        return list(self.iter_paths_for_corpus_files(corpus_dir, header_file))
+
+    def iter_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[str]:
+        for path, _ in self.iter_paths_and_sizes_for_corpus_files(
+            corpus_dir, header_file
+        ):
+            yield path
+
+    def iter_sorted_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[str]:
+        return self.iter_paths_for_corpus_files(corpus_dir, header_file)
+
+    def get_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> List[FileRecord]:
+        return list(self.iter_paths_and_sizes_for_corpus_files(corpus_dir, header_file))
+
+    def iter_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        header_file_name = os.path.basename(header_file)
+        for name, size in iter_archive_members(corpus_dir):
+            file_name = name.rsplit("/", 1)[-1]
+            if file_name != header_file_name and is_corpus_file_name(file_name):
+                path = member_path(corpus_dir, name)
+                yield path, estimated_uncompressed_size(path, size)
+
+    def iter_sorted_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        return self.iter_paths_and_sizes_for_corpus_files(corpus_dir, header_file)
+
+
+@functools.lru_cache(maxsize=64)
+def _is_archive_cached(path: str) -> bool:
+    return is_archive(path)
+
+
+class _ZipReader:
+    # members are read with random access
+    def __init__(self, archive_path: str) -> None:
+        self._archive = zipfile.ZipFile(archive_path)
+        self._lock = threading.Lock()
+
+    def open(self, name: str) -> IO[bytes]:
+        # the members opened share the file of the archive, ZipFile keeps
+        # track of the position of each member
+        with self._lock:
+            try:
+                return self._archive.open(name)
+            except KeyError:
+                raise FileNotFoundError(
+                    f"No member {name} in archive: {self._archive.filename}"
+                )
+
+    def size(self, name: str) -> int:
+        try:
+            return self._archive.getinfo(name).file_size
+        except KeyError:
+            return 0
+
+
+class _TarReader:
+    # the members are indexed by name once, when the first member is read,
+    # and read at their offset in the archive (compressed archives are
+    # decompressed from the start again only to read a preceding member)
+    def __init__(self, archive_path: str) -> None:
+        self._archive_path = archive_path
+        self._archive: Optional[tarfile.TarFile] = None
+        self._members: Optional[Dict[str, tarfile.TarInfo]] = None
+        self._lock = threading.Lock()
+
+    def open(self, name: str) -> IO[bytes]:
+        with self._lock:
+            tarinfo = self._index().get(name)
+            if tarinfo is None:
+                raise FileNotFoundError(
+                    f"No member {name} in archive: {self._archive_path}"
+                )
+            assert self._archive is not None
+            member = self._archive.extractfile(tarinfo)
+            assert member is not None
+        return io.BufferedReader(_TarMember(member, self._lock))
+
+    def size(self, name: str) -> int:
+        with self._lock:
+            tarinfo = self._index().get(name)
+        return 0 if tarinfo is None else tarinfo.size
+
+    def _index(self) -> Dict[str, tarfile.TarInfo]:
+        if self._members is None:
+            self._archive = tarfile.open(self._archive_path, "r:*")
+            self._members = {}
+            while (tarinfo := self._archive.next()) is not None:
+                # the members are only kept in the index
+                self._archive.members = []  # type: ignore[attr-defined]
+                if tarinfo.isfile():
+                    self._members[tarinfo.name] = tarinfo
+        return self._members
+
+
+class _TarMember(io.RawIOBase):
+    # the members opened share the file of the archive, each read seeks to
+    # the position of the member while holding the lock of the reader
+    def __init__(self, member: IO[bytes], lock: threading.Lock) -> None:
+        self._member = member
+        self._lock = lock
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        with self._lock:
+            return self._member.readinto(buffer)  # type: ignore[attr-defined]
+
+    def close(self) -> None:
+        self._member.close()
+        super().close()
+
+
+# open archives of the current process (archives are not shared with
+# forked worker processes, as they would share the file position)
+_readers: Dict[Tuple[int, str], Union[_ZipReader, _TarReader]] = {}
+_readers_lock = threading.Lock()
+
+
+def _archive_reader(archive_path: str) -> Union[_ZipReader, _TarReader]:
+    key = (os.getpid(), archive_path)
+    with _readers_lock:
+        if key not in _readers:
+            if archive_path.lower().endswith(".zip"):
+                _readers[key] = _ZipReader(archive_path)
+            else:
+                _readers[key] = _TarReader(archive_path)
+        return _readers[key]
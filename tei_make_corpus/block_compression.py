@@ -0,0 +1,185 @@
+import abc
+import collections
+import lzma
+import struct
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Deque, Optional
+
+# size of the window of deflate, the end of the preceding block is used as
+# dictionary for the next block
+_DEFLATE_WINDOW = 32 * 1024
+
+# gzip header without file name and timestamp (compression method deflate,
+# operating system unknown)
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+class BlockCompressor(abc.ABC):
+    """
+    File-like object that splits the content written to it into blocks of
+    block_size bytes, compresses the blocks concurrently in a thread pool
+    (the compression libraries release the GIL) and writes them to fileobj
+    in order. Subclasses define how a block is compressed.
+
+    At most two blocks per worker are compressed or waiting to be written,
+    which limits the memory used. The output doesn't depend on the number
+    of workers, as the blocks only depend on the content. fileobj is not
+    closed by close().
+
+    fileobj:    binary file object the compressed content is written to
+    workers:    number of threads compressing blocks
+    block_size: number of bytes (of the uncompressed content) per block
+    """
+
+    def __init__(self, fileobj: BinaryIO, workers: int, block_size: int) -> None:
+        self._fileobj = fileobj
+        self._workers = workers
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._previous_block = b""
+        self._pending: Deque["Future[bytes]"] = collections.deque()
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(workers)
+        self._fileobj.write(self._header())
+
+    def write(self, data: Any) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            block = bytes(self._buffer[: self._block_size])
+            del self._buffer[: self._block_size]
+            self._submit(block, last=False)
+        return len(data)
+
+    def flush(self) -> None:
+        # blocks are only completed when they are full, to keep the output
+        # independent of the calls of flush
+        pass
+
+    def close(self) -> None:
+        if self._executor is None:
+            return
+        try:
+            self._submit(bytes(self._buffer), last=True)
+            self._buffer = bytearray()
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+            self._fileobj.write(self._trailer())
+        finally:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def closed(self) -> bool:
+        return self._executor is None
+
+    def __enter__(self) -> "BlockCompressor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _submit(self, block: bytes, last: bool) -> None:
+        assert self._executor is not None
+        self._update(block)
+        self._pending.append(
+            self._executor.submit(
+                self._compress_block, block, self._previous_block, last
+            )
+        )
+        self._previous_block = block
+        while len(self._pending) > 2 * self._workers:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def _header(self) -> bytes:
+        return b""
+
+    def _update(self, block: bytes) -> None:
+        # called with the blocks in order before they are compressed
+        pass
+
+    @abc.abstractmethod
+    def _compress_block(self, block: bytes, previous_block: bytes, last: bool) -> bytes:
+        """
+        Compress a block, previous_block is the block before it (empty for
+        the first block) and last is True for the final block.
+        """
+        ...
+
+    def _trailer(self) -> bytes:
+        return b""
+
+
+class GzipBlockCompressor(BlockCompressor):
+    """
+    BlockCompressor writing a single gzip member, like pigz: each block is
+    compressed to raw deflate data with the end of the preceding block as
+    dictionary and ends on a byte boundary (sync flush), so the compressed
+    blocks can be concatenated. The checksum and size in the trailer are
+    computed over the whole content, as for a gzip file compressed in one
+    pass.
+    """
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        workers: int,
+        block_size: int = 128 * 1024,
+        compresslevel: int = 6,
+    ) -> None:
+        self._compresslevel = compresslevel
+        self._crc = 0
+        self._size = 0
+        super().__init__(fileobj, workers, block_size)
+
+    def _header(self) -> bytes:
+        return _GZIP_HEADER
+
+    def _update(self, block: bytes) -> None:
+        self._crc = zlib.crc32(block, self._crc)
+        self._size += len(block)
+
+    def _compress_block(self, block: bytes, previous_block: bytes, last: bool) -> bytes:
+        if previous_block:
+            compressor = zlib.compressobj(
+                self._compresslevel,
+                zlib.DEFLATED,
+                -zlib.MAX_WBITS,
+                zdict=previous_block[-_DEFLATE_WINDOW:],
+            )
+        else:
+            compressor = zlib.compressobj(
+                self._compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS
+            )
+        return compressor.compress(block) + compressor.flush(
+            zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        )
+
+    def _trailer(self) -> bytes:
+        return struct.pack("<II", self._crc, self._size & 0xFFFFFFFF)
+
+
+class XzBlockCompressor(BlockCompressor):
+    """
+    BlockCompressor writing each block as an xz stream; concatenated xz
+    streams are decompressed as a single file. Blocks are large (8 MB by
+    default), as each stream starts without dictionary.
+    """
+
+    def __init__(
+        self, fileobj: BinaryIO, workers: int, block_size: int = 8 * 1024 * 1024
+    ) -> None:
+        self._submitted_blocks = 0
+        super().__init__(fileobj, workers, block_size)
+
+    def _update(self, block: bytes) -> None:
+        self._submitted_blocks += 1
+
+    def _submit(self, block: bytes, last: bool) -> None:
+        # the last block is empty if the content fills complete blocks, it
+        # is only needed if there is no block at all
+        if last and not block and self._submitted_blocks:
+            return
+        super()._submit(block, last)
+
+    def _compress_block(self, block: bytes, previous_block: bytes, last: bool) -> bytes:
+        return lzma.compress(block)
@@ -2,7 +2,7 @@ import argparse
 import json
 import re
 import sys
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 if sys.version_info < (3, 11):
     import tomli as toml
@@ -11,6 +11,10 @@ else:
 
 from tei_make_corpus.cli.docid_pattern_map import PATTERN_MAP
 from tei_make_corpus.cli.make_corpus_usecase import CliRequest, TeiMakeCorpusUseCase
+from tei_make_corpus.compression import (
+    OUTPUT_COMPRESSIONS,
+    is_output_compression_available,
+)
 
 
 class TeiMakeCorpusController:
@@ -44,7 +48,11 @@ class TeiMakeCorpusController:
         )
         parser.add_argument(
             "corpus_dir",
-            help="Directory containing the TEI files. Only files with the extension '.xml' are processed.",
+            help="""Directory containing the TEI files. Only files with the extension '.xml' are processed,
+            or compressed files with the extensions '.xml.gz', '.xml.bz2', '.xml.xz' and '.xml.zst'
+            (zstandard requires the optional dependency 'zstandard'), which are decompressed while
+            they are read. This can also be a zip or tar archive (.zip, .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz),
+            whose members are read without extracting the archive.""",
             type=str,
         )
         parser.add_argument(
@@ -109,7 +117,8 @@ class TeiMakeCorpusController:
             with the original value of the @xml:id attribute (separated by '-'). For
             each @xml:id attribute, the prefix is also added to attributes referencing
             the @xml:id, i.e. attributes with the same value as @xml:id but with a
-            prepended '#'.""",
+            prepended '#' (or with such a value in a whitespace-separated list, e.g.
+            corresp="#a #b").""",
         )
         parser.add_argument(
             "--processing-instructions",
@@ -137,6 +146,261 @@ class TeiMakeCorpusController:
             {self._doc_id_pattern_mapping}
             """,
         )
+        parser.add_argument(
+            "--workers",
+            default=1,
+            type=int,
+            metavar="N",
+            help="""Number of workers used to parse and transform the TEI documents (see
+            '--backend'). The output is identical to the output produced with a single process.
+            Default is 1, i.e. all documents are processed in the main process.""",
+        )
+        parser.add_argument(
+            "--backend",
+            default="process",
+            choices=["process", "thread", "pipeline"],
+            help="""Kind of workers used with '--workers'. With 'process' (default), the TEI
+            documents are parsed and transformed in worker processes. With 'thread', the next
+            documents are read and parsed ahead in threads, while they are transformed and written
+            in the main process. Threads are useful if reading the files is slow, e.g. on network
+            file systems. With 'pipeline', the documents are read, parsed and transformed, serialized
+            and written in separate stages connected by queues, each stage with its own threads (see
+            '--stage-workers'). The depths of the queues are written to the log file, so the slowest
+            stage can be identified.""",
+        )
+        parser.add_argument(
+            "--stage-workers",
+            default=None,
+            type=self.valid_stage_workers,
+            metavar="STAGE=N[,STAGE=N...]",
+            help="""Number of threads per stage of '--backend pipeline', e.g. 'read=8,transform=4'.
+            Stages are 'read', 'transform' and 'serialize'. Stages that are not given use the value of
+            '--workers'.""",
+        )
+        parser.add_argument(
+            "--queue-size",
+            default=64,
+            type=int,
+            metavar="N",
+            help="""Maximal number of documents waiting in each queue of '--backend pipeline'.
+            Default is 64.""",
+        )
+        parser.add_argument(
+            "--schedule",
+            default="order",
+            choices=["order", "size"],
+            help="""Order in which the TEI documents are dispatched to the worker processes of
+            '--backend process'. With 'order' (default), the documents are dispatched in the order of
+            the files. With 'size', the largest documents of the upcoming documents (see
+            '--reorder-buffer') are dispatched first, so a large document that comes late doesn't delay
+            the end of the output file. The output is the same in both cases.""",
+        )
+        parser.add_argument(
+            "--reorder-buffer",
+            default=500_000_000,
+            type=self.valid_dimension,
+            metavar="BYTES",
+            help="""Intended maximal size of the upcoming TEI files with '--schedule size' (e.g.
+            '200M'). The processed documents are held until all previous documents are written, so this
+            limits the memory used for them. Default is 500 000 000 (bytes, 500 MB).""",
+        )
+        parser.add_argument(
+            "--stream-threshold",
+            default=None,
+            nargs="?",
+            const=100_000_000,
+            type=self.valid_dimension,
+            metavar="BYTES",
+            help="""Transform TEI documents whose files are at least BYTES large while they are
+            parsed, without holding the whole document in memory (only the teiHeader is kept in
+            memory). The files are parsed twice, the first time to check that they contain a valid TEI
+            document. This option only applies if the documents are processed in the main process, i.e.
+            with a single worker ('--workers 1'). The output is the same as without this option. This
+            option can also be used without passing a value, the default is 100 000 000 (bytes, 100 MB).""",
+        )
+        parser.add_argument(
+            "--passthrough",
+            action="store_true",
+            help="""Copy TEI documents that don't contain @xml:id attributes to the output without
+            parsing them, if they wouldn't be changed otherwise (i.e. not with '--deduplicate-header'
+            or '--add-docid'). The XML declaration and the document type declaration are stripped,
+            the TEI element is copied as it is. The documents are checked for well-formedness without
+            building a tree; documents that are not well-formed are parsed as without this option, so
+            the error is logged and they are omitted. This option has no effect with '--backend thread'
+            or '--backend pipeline'.""",
+        )
+        parser.add_argument(
+            "--fragment-cache",
+            default=None,
+            metavar="DIRECTORY",
+            help="""Cache the transformed TEI documents in DIRECTORY, so that other builds (e.g. of
+            other subsets of the same TEI files) with the same settings write them from the cache
+            instead of parsing them again. The documents are identified by the content of their files
+            and the settings that change them (the common header with '--deduplicate-header', the
+            prefix of @xml:id and the document identifier). This option has no effect with '--backend
+            thread' or '--backend pipeline' and for documents transformed with
+            '--stream-threshold'.""",
+        )
+        parser.add_argument(
+            "--fragment-cache-size",
+            default=1_000_000_000,
+            type=self.valid_dimension,
+            metavar="BYTES",
+            help="""Maximal size of the documents in the directory of '--fragment-cache' (e.g. '5G'). If
+            the cache is larger, the least recently used documents are removed. Default is
+            1 000 000 000 (bytes, 1 GB).""",
+        )
+        parser.add_argument(
+            "--compress",
+            default=None,
+            choices=OUTPUT_COMPRESSIONS,
+            help="""Compress the output while it is written, with gzip, xz or zstd ('zstd' requires the
+            optional dependency 'zstandard'). The extension of the compression format ('.gz', '.xz' or
+            '.zst') is added to the name of the output file, if it is missing, and to the names of the
+            output files of a split corpus (e.g. 'part0001.xml.gz').""",
+        )
+        parser.add_argument(
+            "--compress-workers",
+            default=1,
+            type=int,
+            metavar="N",
+            help="""Number of threads compressing the output with '--compress'. With more than one
+            thread, the output is split into blocks that are compressed concurrently: for gzip, the blocks
+            form a single gzip member (as with pigz), for xz, each block of 8 MB is a separate xz stream
+            (which slightly increases the size), zstd uses its own threads. With '--partition-workers',
+            each output file is compressed with N threads. Default is 1.""",
+        )
+        parser.add_argument(
+            "--split-compressed",
+            action="store_true",
+            help="""Use the value of '--split-size' as intended size of the compressed output files
+            instead of the uncompressed output files. This option requires '--compress'. The corpus is
+            split by the sizes of the TEI files, which are scaled with the compression ratio of the first
+            TEI files (up to 16 MB), so the sizes of the output files are estimated.""",
+        )
+        parser.add_argument(
+            "--partition-workers",
+            default=1,
+            type=int,
+            metavar="N",
+            help="""Number of output files that are written concurrently, each in its own worker
+            process. This option requires '--split-documents' or '--split-size'. The output files are
+            the same as when they are written one after another. If this option is used, the TEI
+            documents of each output file are processed in a single process.""",
+        )
+        parser.add_argument(
+            "--discovery",
+            default="sort",
+            choices=["sort", "walk", "external-sort"],
+            help="""How the TEI files in corpus_dir are collected. With 'sort' (default), all file paths
+            are collected and sorted before the first document is written. With 'walk', the files are
+            processed while the directory tree is walked, in sorted order per directory. With
+            'external-sort', the files are processed in the same order as with 'sort', but the paths are
+            sorted in chunks on disk to limit memory usage. If '--split-documents' is used with 'walk' or
+            'external-sort', a last part that would contain less than 30%% of the intended number of TEI
+            documents is added to the previous part instead of distributing all files evenly.""",
+        )
+        parser.add_argument(
+            "--walk-threads",
+            default=1,
+            type=int,
+            metavar="N",
+            help="""Number of directories in corpus_dir that are listed concurrently. The files are
+            collected in the same order as with a single thread. The number of directories and entries
+            listed per second is written to the log file. Default is 1.""",
+        )
+        parser.add_argument(
+            "--listing-cache",
+            default=None,
+            metavar="FILENAME",
+            help="""Keep the listings of the directories in corpus_dir in a database (FILENAME, created
+            if it doesn't exist) between runs. Each listing is stored with the modification time of its
+            directory; only directories whose modification time changed since the previous run are
+            listed again. The sizes of files that are rewritten in place (without changing their
+            directory) are only updated when their directory is listed again. The directories are
+            listed with a single thread.""",
+        )
+        parser.add_argument(
+            "--shard",
+            default=None,
+            type=self.valid_shard,
+            metavar="I/N",
+            help="""Write only the I-th of N shards of the split corpus, e.g. '--shard 2/4'. This option
+            requires '--split-documents' or '--split-size'. All parts of the corpus are determined first
+            and assigned to the shards in turns. The output files are numbered as without this option,
+            i.e. running all N shards (e.g. on several machines) results in the same output files as a
+            single run. If '--prefix-xmlid' is used, the prefixes are only identical if all TEI files of
+            the corpus contain valid TEI documents.""",
+        )
+        parser.add_argument(
+            "--export-plan",
+            default=None,
+            metavar="FILENAME",
+            help="""Write the parts of the split corpus (output file, shard and TEI files of each part)
+            and a digest of this plan as JSON to FILENAME. This option requires '--split-documents' or
+            '--split-size'. The digest is also written to the log file and can be used to check that
+            all shards work with the same files.""",
+        )
+        queue_group = parser.add_mutually_exclusive_group()
+        queue_group.add_argument(
+            "--create-queue",
+            default=None,
+            metavar="FILENAME",
+            help="""Write the parts of the split corpus to a work queue (an SQLite database) at FILENAME
+            instead of writing the output files. This option requires '--split-documents' or '--split-size'.
+            The parts are then written by any number of processes started with '--worker FILENAME' (e.g. on
+            several machines that share a file system). The database must not exist yet.""",
+        )
+        queue_group.add_argument(
+            "--worker",
+            default=None,
+            metavar="FILENAME",
+            help="""Claim parts of the split corpus from the work queue at FILENAME (see '--create-queue')
+            and write them to their output files until all parts are claimed. The other options that change
+            the output (e.g. '--deduplicate-header') should be the same as for '--create-queue'; the TEI files
+            and output files are taken from the work queue. If '--prefix-xmlid' was used to create the queue,
+            the prefixes are only identical to those of a single run if all TEI files of the corpus contain
+            valid TEI documents.""",
+        )
+        parser.add_argument(
+            "--lease-timeout",
+            default=600,
+            type=float,
+            metavar="SECONDS",
+            help="""Number of seconds a part claimed with '--worker' stays assigned to the worker without
+            being renewed. The lease is renewed while the part is written, so the part of a worker that
+            crashed is claimed again by another worker after this time. Default is 600.""",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="""Only write the output files whose TEI files or settings changed since the previous
+            build with this option. This option requires '--to-file'. A manifest of the output files,
+            their TEI files (with modification time, size and a hash of the content) and the settings
+            that change the output is written next to the output files ('FILENAME.manifest.jsonl').
+            An output file is kept if its TEI files are the same as in the previous build (files that
+            were only touched are identified by their hash), the settings are unchanged and the output
+            file exists. If files are added or removed, the following parts of a split corpus usually
+            get other TEI files and are written again. With '--prefix-xmlid', the output files are written
+            one after another and an output file is also written again if the prefixes of the preceding
+            parts it depends on changed.""",
+        )
+        parser.add_argument(
+            "--resplit",
+            default=None,
+            const="copy",
+            nargs="?",
+            choices=["copy", "stream"],
+            help="""Merge and split again teiCorpus files. With this option, corpus_dir is a teiCorpus
+            file or a directory containing teiCorpus files. With 'copy' (default), the teiCorpus files must
+            be written by tei-make-corpus and must not be compressed; the TEI documents are copied to the new
+            output files without parsing them. With 'stream', any teiCorpus files (also compressed files) can
+            be used. They are parsed incrementally,
+            so only one TEI document is held in memory (with '--split-documents', the documents are counted
+            in a first pass). Options that change the TEI documents (e.g. '--deduplicate-header') can't
+            be used. Each output file gets the common header passed with '--common-header'. The output files
+            must not be one of the teiCorpus files.""",
+        )
 
         parser.set_defaults(**defaults)
         args = parser.parse_args(remaining_argv)
@@ -155,6 +419,128 @@ class TeiMakeCorpusController:
             and args.add_docid not in self._doc_id_pattern_mapping
         ):
             parser.error(f"Invalid value for --add-docid: {args.add_docid}")
+        if args.backend not in ("process", "thread", "pipeline"):
+            parser.error(f"Invalid value for --backend: {args.backend}")
+        if args.discovery not in ("sort", "walk", "external-sort"):
+            parser.error(f"Invalid value for --discovery: {args.discovery}")
+        if isinstance(args.stage_workers, str):
+            # set in config file
+            try:
+                args.stage_workers = self.valid_stage_workers(args.stage_workers)
+            except TypeError:
+                parser.error(f"Invalid value for --stage-workers: {args.stage_workers}")
+        if args.schedule not in ("order", "size"):
+            parser.error(f"Invalid value for --schedule: {args.schedule}")
+        if isinstance(args.reorder_buffer, str):
+            # set in config file
+            try:
+                args.reorder_buffer = self.valid_dimension(args.reorder_buffer)
+            except TypeError:
+                parser.error(
+                    f"Invalid value for --reorder-buffer: {args.reorder_buffer}"
+                )
+        if args.reorder_buffer < 1:
+            parser.error("Reorder buffer should be greater 0")
+        if isinstance(args.stream_threshold, str):
+            # set in config file
+            try:
+                args.stream_threshold = self.valid_dimension(args.stream_threshold)
+            except TypeError:
+                parser.error(
+                    f"Invalid value for --stream-threshold: {args.stream_threshold}"
+                )
+        if args.stream_threshold is not None and args.stream_threshold < 1:
+            parser.error("Stream threshold should be greater 0")
+        if isinstance(args.fragment_cache_size, str):
+            # set in config file
+            try:
+                args.fragment_cache_size = self.valid_dimension(
+                    args.fragment_cache_size
+                )
+            except TypeError:
+                parser.error(
+                    f"Invalid value for --fragment-cache-size: {args.fragment_cache_size}"
+                )
+        if args.fragment_cache_size < 1:
+            parser.error("Fragment cache size should be greater 0")
+        if args.queue_size < 1:
+            parser.error("Queue size should be greater 0")
+        if (
+            args.workers < 1
+            or args.partition_workers < 1
+            or args.walk_threads < 1
+            or args.compress_workers < 1
+        ):
+            parser.error("Number of workers should be greater 0")
+        if (
+            args.partition_workers > 1
+            and args.split_documents is None
+            and args.split_size is None
+        ):
+            parser.error(
+                "--partition-workers requires --split-documents or --split-size"
+            )
+        if (
+            (args.shard is not None or args.export_plan is not None)
+            and args.split_documents is None
+            and args.split_size is None
+        ):
+            parser.error(
+                "--shard and --export-plan require --split-documents or --split-size"
+            )
+        if (
+            args.create_queue is not None
+            and args.split_documents is None
+            and args.split_size is None
+        ):
+            parser.error("--create-queue requires --split-documents or --split-size")
+        if args.create_queue is not None and args.shard is not None:
+            parser.error("--create-queue can't be used with --shard")
+        if args.worker is not None and (
+            args.shard is not None or args.export_plan is not None
+        ):
+            parser.error("--worker can't be used with --shard or --export-plan")
+        if isinstance(args.resplit, bool):
+            # set as flag in config file
+            args.resplit = "copy" if args.resplit else None
+        if args.resplit not in (None, "copy", "stream"):
+            parser.error(f"Invalid value for --resplit: {args.resplit}")
+        if args.resplit is not None and (
+            args.deduplicate_header
+            or args.prefix_xmlid
+            or args.add_docid is not None
+            or args.create_queue is not None
+            or args.worker is not None
+            or args.shard is not None
+        ):
+            parser.error(
+                "--resplit can't be used with options that change the TEI documents"
+                " or distribute the parts of the corpus"
+            )
+        if args.incremental and args.to_file is None:
+            parser.error("--incremental requires --to-file FILENAME")
+        if args.incremental and (
+            args.shard is not None
+            or args.export_plan is not None
+            or args.create_queue is not None
+            or args.worker is not None
+            or args.resplit is not None
+        ):
+            parser.error(
+                "--incremental can't be used with --shard, --export-plan, --create-queue,"
+                " --worker or --resplit"
+            )
+        if args.lease_timeout <= 0:
+            parser.error("Lease timeout should be greater 0")
+        if args.compress is not None:
+            if args.compress not in OUTPUT_COMPRESSIONS:
+                parser.error(f"Invalid value for --compress: {args.compress}")
+            if not is_output_compression_available(args.compress):
+                parser.error(
+                    f"--compress {args.compress} requires the package 'zstandard'"
+                )
+        if args.split_compressed and (args.compress is None or args.split_size is None):
+            parser.error("--split-compressed requires --compress and --split-size")
         self.use_case.process(
             CliRequest(
                 header_file=args.common_header,
@@ -166,6 +552,30 @@ class TeiMakeCorpusController:
                 prefix_xmlid=args.prefix_xmlid,
                 processing_instructions=args.processing_instructions,
                 docid_pattern_index=args.add_docid,
+                workers=args.workers,
+                backend=args.backend,
+                stage_workers=args.stage_workers,
+                queue_size=args.queue_size,
+                schedule=args.schedule,
+                reorder_buffer=args.reorder_buffer,
+                stream_threshold=args.stream_threshold,
+                passthrough=args.passthrough,
+                fragment_cache=args.fragment_cache,
+                fragment_cache_size=args.fragment_cache_size,
+                compression=args.compress,
+                compress_workers=args.compress_workers,
+                split_compressed=args.split_compressed,
+                partition_workers=args.partition_workers,
+                discovery=args.discovery,
+                walk_threads=args.walk_threads,
+                listing_cache=args.listing_cache,
+                shard=args.shard,
+                plan_file=args.export_plan,
+                create_queue=args.create_queue,
+                worker_queue=args.worker,
+                lease_timeout=args.lease_timeout,
+                incremental=args.incremental,
+                resplit=args.resplit,
             )
         )
 
@@ -206,6 +616,33 @@ class TeiMakeCorpusController:
             raise TypeError
         return int(split_val)
 
+    def valid_shard(self, input_string: str) -> Tuple[int, int]:
+        """
+        Check if input string has the form 'I/N' with 1 <= I <= N and
+        convert it to a tuple (I, N), else a TypeError is thrown.
+        """
+        match = re.match(r"(\d+)/(\d+)$", input_string)
+        if not match:
+            raise TypeError
+        shard, shards = int(match.group(1)), int(match.group(2))
+        if not 1 <= shard <= shards:
+            raise TypeError
+        return shard, shards
+
+    def valid_stage_workers(self, input_string: str) -> Dict[str, int]:
+        """
+        Check if input string is a comma-separated list of 'STAGE=N' with
+        a stage of the pipeline and N >= 1 and convert it to a dictionary,
+        else a TypeError is thrown.
+        """
+        stage_workers = {}
+        for item in input_string.split(","):
+            match = re.match(r"\s*(read|transform|serialize)=(\d+)\s*$", item)
+            if not match or int(match.group(2)) < 1:
+                raise TypeError
+            stage_workers[match.group(1)] = int(match.group(2))
+        return stage_workers
+
     def parse_config_file(
         self, filepath: Optional[str], parser: argparse.ArgumentParser
     ) -> Dict[str, Union[str, int, bool]]:
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from lxml import etree
 
@@ -10,3 +10,23 @@ class CorpusConfig:
     split_docs: int = -1
     split_size: int = -1
     processing_instructions: Optional[List[etree.PI]] = None
+    workers: int = 1
+    backend: str = "process"
+    stage_workers: Optional[Dict[str, int]] = None
+    queue_size: int = 64
+    schedule: str = "order"
+    reorder_buffer: int = 500_000_000
+    stream_threshold: Optional[int] = None
+    passthrough: bool = False
+    compression: Optional[str] = None
+    compress_workers: int = 1
+    partition_workers: int = 1
+    discovery: str = "sort"
+    shard: Optional[Tuple[int, int]] = None
+    plan_file: Optional[str] = None
+    create_queue: Optional[str] = None
+    worker_queue: Optional[str] = None
+    lease_timeout: float = 600
+    manifest_file: Optional[str] = None
+    fragment_cache: Optional[str] = None
+    fragment_cache_size: int = 1_000_000_000
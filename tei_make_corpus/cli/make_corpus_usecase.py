@@ -1,20 +1,30 @@
+import logging
+import os
 from dataclasses import dataclass
-from typing import Dict, Optional, Protocol
+from typing import Dict, Iterable, Optional, Protocol, Tuple
 
+from tei_make_corpus.archive import ArchivePathFinder, is_archive, read_corpus_file
 from tei_make_corpus.cli.corpus_config import CorpusConfig
 from tei_make_corpus.cli.docid_pattern_map import PATTERN_MAP
+from tei_make_corpus.compression import compression_ratio
 from tei_make_corpus.construct_processing_instructions import (
     construct_processing_instructions,
 )
 from tei_make_corpus.corpus_maker import TeiCorpusMaker
+from tei_make_corpus.corpus_resplitter import TeiCorpusResplitter
 from tei_make_corpus.corpus_stream import CorpusStream
 from tei_make_corpus.doc_id_handler import DocIdToIdnoHandler
-from tei_make_corpus.file_size_estimator import FileSizeEstimatorImpl
 from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
 from tei_make_corpus.partitioner import Partitioner
-from tei_make_corpus.path_finder import PathFinderImpl
+from tei_make_corpus.path_finder import PathFinder, PathFinderImpl
 from tei_make_corpus.xmlid_handler import create_xmlid_handler
 
+logger = logging.getLogger(__name__)
+
+# number of bytes of the corpus files used to estimate the compression
+# ratio of the output
+_COMPRESSION_SAMPLE_SIZE = 16_000_000
+
 
 @dataclass
 class CliRequest:
@@ -27,6 +37,30 @@ class CliRequest:
     prefix_xmlid: bool = False
     processing_instructions: Optional[Dict[str, str]] = None
     docid_pattern_index: Optional[int] = None
+    workers: int = 1
+    backend: str = "process"
+    stage_workers: Optional[Dict[str, int]] = None
+    queue_size: int = 64
+    schedule: str = "order"
+    reorder_buffer: int = 500_000_000
+    stream_threshold: Optional[int] = None
+    passthrough: bool = False
+    fragment_cache: Optional[str] = None
+    fragment_cache_size: int = 1_000_000_000
+    compression: Optional[str] = None
+    compress_workers: int = 1
+    split_compressed: bool = False
+    partition_workers: int = 1
+    discovery: str = "sort"
+    walk_threads: int = 1
+    listing_cache: Optional[str] = None
+    shard: Optional[Tuple[int, int]] = None
+    plan_file: Optional[str] = None
+    create_queue: Optional[str] = None
+    worker_queue: Optional[str] = None
+    lease_timeout: float = 600
+    incremental: bool = False
+    resplit: Optional[str] = None
 
 
 class TeiMakeCorpusUseCase(Protocol):
@@ -52,9 +86,15 @@ class TeiMakeCorpusUseCaseImpl:
         The output is written to CorpusStream.
         """
         self.out_stream.set_output_file(request.output_file)
+        self.out_stream.set_compression(request.compression)
         header_handler = TeiHeaderHandlerImpl(request.header_file)
-        path_finder = PathFinderImpl()
-        size_estimator = FileSizeEstimatorImpl()
+        path_finder: PathFinder
+        if is_archive(request.corpus_dir):
+            path_finder = ArchivePathFinder()
+        else:
+            path_finder = PathFinderImpl(
+                walk_threads=request.walk_threads, listing_cache=request.listing_cache
+            )
         xmlid_handler = create_xmlid_handler(request.prefix_xmlid)
         docid_handler = None
         if request.docid_pattern_index is not None:
@@ -69,17 +109,97 @@ class TeiMakeCorpusUseCaseImpl:
         partitioner = Partitioner(
             header_handler=header_handler,
             path_finder=path_finder,
-            size_estimator=size_estimator,
             xmlid_handler=xmlid_handler,
             docid_handler=docid_handler,
         )
+        split_size = request.split_size
+        if (
+            request.split_compressed
+            and request.compression is not None
+            and split_size != -1
+        ):
+            split_size = self._uncompressed_split_size(
+                request, path_finder, request.compression
+            )
+        manifest_file = None
+        if request.incremental and request.output_file is not None:
+            manifest_file = f"{request.output_file}.manifest.jsonl"
         config = CorpusConfig(
             clean_header=request.clean_header,
             split_docs=request.split_docs,
-            split_size=request.split_size,
+            split_size=split_size,
             processing_instructions=processing_instructions,
+            workers=request.workers,
+            backend=request.backend,
+            stage_workers=request.stage_workers,
+            queue_size=request.queue_size,
+            schedule=request.schedule,
+            reorder_buffer=request.reorder_buffer,
+            stream_threshold=request.stream_threshold,
+            passthrough=request.passthrough,
+            fragment_cache=request.fragment_cache,
+            fragment_cache_size=request.fragment_cache_size,
+            compression=request.compression,
+            compress_workers=request.compress_workers,
+            partition_workers=request.partition_workers,
+            discovery=request.discovery,
+            shard=request.shard,
+            plan_file=request.plan_file,
+            create_queue=request.create_queue,
+            worker_queue=request.worker_queue,
+            lease_timeout=request.lease_timeout,
+            manifest_file=manifest_file,
         )
+        if request.resplit is not None:
+            resplitter = TeiCorpusResplitter(
+                outstream=self.out_stream,
+                header_handler=header_handler,
+                path_finder=path_finder,
+                config=config,
+                mode=request.resplit,
+            )
+            resplitter.resplit_corpus(request.corpus_dir, request.header_file)
+            return
         corpus_maker = TeiCorpusMaker(
             outstream=self.out_stream, partitioner=partitioner, config=config
         )
         corpus_maker.build_corpus(request.corpus_dir, request.header_file)
+
+    def _uncompressed_split_size(
+        self, request: CliRequest, path_finder: PathFinder, compression: str
+    ) -> int:
+        # the split size is given for the compressed output files, the
+        # corpus is split by the uncompressed sizes of the TEI files, so the
+        # split size is scaled by the compression ratio of the first files
+        corpus_files: Iterable[str]
+        if os.path.isfile(request.corpus_dir) and not is_archive(request.corpus_dir):
+            # teiCorpus file that is resplit
+            corpus_files = [request.corpus_dir]
+        else:
+            corpus_files = path_finder.iter_paths_for_corpus_files(
+                request.corpus_dir, request.header_file
+            )
+        ratio = compression_ratio(
+            _read_samples(corpus_files, _COMPRESSION_SAMPLE_SIZE), compression
+        )
+        split_size = round(request.split_size * ratio)
+        logger.info(
+            "Estimated compression ratio: %.2f, split size of uncompressed output: %d",
+            ratio,
+            split_size,
+        )
+        return split_size
+
+
+def _read_samples(corpus_files: Iterable[str], sample_size: int) -> Iterable[bytes]:
+    # the contents of the first corpus files, up to sample_size bytes
+    remaining = sample_size
+    for corpus_file in corpus_files:
+        if remaining <= 0:
+            return
+        try:
+            sample = read_corpus_file(corpus_file, remaining)
+        except OSError:
+            continue
+        remaining -= len(sample)
+        yield sample
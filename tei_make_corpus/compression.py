@@ -0,0 +1,296 @@
+import bz2
+import contextlib
+import gzip
+import lzma
+import os
+import struct
+from typing import (
+    IO,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+from tei_make_corpus.block_compression import GzipBlockCompressor, XzBlockCompressor
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None  # type: ignore[assignment]
+
+# the compression formats of corpus files, by file extension: a function
+# that wraps a file object of the compressed file, so the decompressed
+# content is read as a stream
+_DECOMPRESSORS: Dict[str, Callable[[IO[bytes]], Any]] = {
+    ".gz": lambda fileobj: gzip.GzipFile(fileobj=fileobj, mode="rb"),
+    ".bz2": lambda fileobj: bz2.BZ2File(fileobj, mode="rb"),
+    ".xz": lambda fileobj: lzma.LZMAFile(fileobj, mode="rb"),
+}
+if zstandard is not None:
+    _DECOMPRESSORS[".zst"] = lambda fileobj: zstandard.ZstdDecompressor().stream_reader(
+        fileobj
+    )
+
+COMPRESSION_EXTENSIONS = tuple(_DECOMPRESSORS)
+
+_CORPUS_FILE_EXTENSIONS = (".xml",) + tuple(
+    ".xml" + extension for extension in COMPRESSION_EXTENSIONS
+)
+
+# the compression formats of output files: the file extension and a
+# function that wraps the file object of the output file, so the written
+# content is compressed (without closing the file object) by the given
+# number of threads; gzip uses the default level of the gzip tool and no
+# timestamp, so the output only depends on its content
+_COMPRESSORS: Dict[str, Tuple[str, Callable[[BinaryIO, int], Any]]] = {
+    "gzip": (
+        ".gz",
+        lambda fileobj, workers: (
+            gzip.GzipFile(
+                filename="", mode="wb", compresslevel=6, fileobj=fileobj, mtime=0
+            )
+            if workers == 1
+            else GzipBlockCompressor(fileobj, workers)
+        ),
+    ),
+    "xz": (
+        ".xz",
+        lambda fileobj, workers: (
+            lzma.LZMAFile(fileobj, mode="wb")
+            if workers == 1
+            else XzBlockCompressor(fileobj, workers)
+        ),
+    ),
+}
+if zstandard is not None:
+    # zstandard compresses with multiple threads itself
+    _COMPRESSORS["zstd"] = (
+        ".zst",
+        lambda fileobj, workers: zstandard.ZstdCompressor(
+            threads=workers if workers > 1 else 0
+        ).stream_writer(fileobj, closefd=False),
+    )
+
+OUTPUT_COMPRESSIONS = ("gzip", "xz", "zstd")
+
+# ratio used to estimate the uncompressed size of files whose compression
+# format doesn't record it
+ESTIMATED_COMPRESSION_RATIO = 5
+
+
+def is_corpus_file_name(file_name: str) -> bool:
+    """
+    Return True if file_name has the extension of a corpus file, i.e.
+    '.xml', optionally followed by the extension of a supported compression
+    format ('.gz', '.bz2', '.xz' and, if the package zstandard is
+    installed, '.zst').
+    """
+    return file_name.endswith(_CORPUS_FILE_EXTENSIONS)
+
+
+def compression_extension(path: str) -> Optional[str]:
+    """
+    Return the extension of the compression format of path or None if the
+    file is not compressed.
+    """
+    for extension in COMPRESSION_EXTENSIONS:
+        if path.endswith(extension):
+            return extension
+    return None
+
+
+def strip_compression_extension(path: str) -> str:
+    """
+    Return path without the extension of its compression format.
+    """
+    extension = compression_extension(path)
+    if extension is None:
+        return path
+    return path[: -len(extension)]
+
+
+def open_decompressed(fileobj: IO[bytes], extension: str) -> IO[bytes]:
+    """
+    Return a file object reading the decompressed content of fileobj,
+    compressed in the format of extension.
+    """
+    return _DECOMPRESSORS[extension](fileobj)
+
+
+def uncompressed_size(path: str, size: int) -> int:
+    """
+    Return the uncompressed size in bytes of the file path of size bytes.
+
+    The size recorded by the compression format is used (the trailer of
+    gzip, the index of xz and the frame header of zstandard files), for
+    other formats (bzip2) or if the size isn't recorded, the size is
+    estimated with ESTIMATED_COMPRESSION_RATIO.
+    """
+    extension = compression_extension(path)
+    if extension is None:
+        return size
+    recorded_size = None
+    try:
+        with open(path, "rb") as fileobj:
+            if extension == ".gz":
+                recorded_size = _gzip_size(fileobj, size)
+            elif extension == ".xz":
+                recorded_size = _xz_size(fileobj, size)
+            elif extension == ".zst":
+                recorded_size = _zstandard_size(fileobj)
+    except (OSError, struct.error, IndexError):
+        recorded_size = None
+    if recorded_size is None:
+        return estimated_uncompressed_size(path, size)
+    return recorded_size
+
+
+def estimated_uncompressed_size(path: str, size: int) -> int:
+    """
+    Return the estimated uncompressed size in bytes of the file path of
+    size bytes, without reading it.
+    """
+    if compression_extension(path) is None:
+        return size
+    return size * ESTIMATED_COMPRESSION_RATIO
+
+
+def is_output_compression_available(compression: str) -> bool:
+    """
+    Return True if output files can be compressed with compression (one of
+    OUTPUT_COMPRESSIONS; 'zstd' requires the package zstandard).
+    """
+    return compression in _COMPRESSORS
+
+
+def output_extension(compression: Optional[str]) -> str:
+    """
+    Return the file extension of output files compressed with compression
+    or an empty string if compression is None.
+    """
+    if compression is None:
+        return ""
+    return _COMPRESSORS[compression][0]
+
+
+@contextlib.contextmanager
+def open_compressed(
+    fileobj: BinaryIO, compression: str, workers: int = 1
+) -> Iterator[BinaryIO]:
+    """
+    Provide a file object that writes the content compressed with
+    compression to fileobj. The compressed stream is completed on exit,
+    fileobj is not closed.
+
+    With more than one worker, blocks of the content are compressed
+    concurrently by workers threads (see block_compression). The output is
+    a single gzip member or zstandard frame, or concatenated xz streams.
+    """
+    with _COMPRESSORS[compression][1](fileobj, workers) as compressed:
+        yield compressed
+
+
+def compression_ratio(samples: Iterable[bytes], compression: str) -> float:
+    """
+    Return the ratio of the size of samples to their size if they are
+    compressed with compression (as a single stream). Returns 1.0 if there
+    are no samples.
+    """
+    counter = _ByteCounter()
+    size = 0
+    with open_compressed(counter, compression) as compressed:  # type: ignore[arg-type]
+        for sample in samples:
+            compressed.write(sample)
+            size += len(sample)
+    if size == 0 or counter.size == 0:
+        return 1.0
+    return size / counter.size
+
+
+class _ByteCounter:
+    # file-like object that only counts the bytes written to it
+    def __init__(self) -> None:
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def _gzip_size(fileobj: IO[bytes], size: int) -> Optional[int]:
+    # the trailer contains the size modulo 2**32 (of the last member)
+    if size < 18:
+        return None
+    fileobj.seek(-4, os.SEEK_END)
+    (recorded_size,) = struct.unpack("<I", fileobj.read(4))
+    while recorded_size < size:
+        recorded_size += 2**32
+    return recorded_size
+
+
+def _xz_size(fileobj: IO[bytes], size: int) -> Optional[int]:
+    # the index at the end of each stream lists the sizes of its blocks and
+    # precedes the stream footer; the streams (of concatenated files) are
+    # read from the last to the first
+    recorded_size = 0
+    end = size
+    while end > 0:
+        if end < 32:
+            return None
+        fileobj.seek(end - 12)
+        footer = fileobj.read(12)
+        if footer[8:] == bytes(4):
+            # stream padding
+            end -= 4
+            continue
+        if footer[10:] != b"YZ":
+            return None
+        index_size = (struct.unpack("<I", footer[4:8])[0] + 1) * 4
+        if index_size > end - 24:
+            return None
+        fileobj.seek(end - 12 - index_size)
+        index = fileobj.read(index_size)
+        if index[0] != 0:
+            return None
+        records, position = _read_multibyte_integer(index, 1)
+        blocks_size = 0
+        for _ in range(records):
+            unpadded_size, position = _read_multibyte_integer(index, position)
+            block_size, position = _read_multibyte_integer(index, position)
+            blocks_size += (unpadded_size + 3) // 4 * 4
+            recorded_size += block_size
+        end -= 12 + blocks_size + index_size + 12
+    if end < 0:
+        return None
+    return recorded_size
+
+
+def _read_multibyte_integer(data: bytes, position: int) -> Tuple[int, int]:
+    # returns the integer and the position after it
+    value = 0
+    for shift in range(0, 63, 7):
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+    raise IndexError("Invalid multibyte integer")
+
+
+def _zstandard_size(fileobj: IO[bytes]) -> Optional[int]:
+    # the content size is optional in the frame header (of the first frame)
+    try:
+        recorded_size = zstandard.frame_content_size(fileobj.read(18))
+    except zstandard.ZstdError:
+        return None
+    if recorded_size < 0:
+        return None
+    return recorded_size
@@ -1,12 +1,34 @@
+import dataclasses
 import logging
+import os
+import socket
+import uuid
 from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
 
 from tei_make_corpus.cli.corpus_config import CorpusConfig
 from tei_make_corpus.corpus_stream import CorpusStream
+from tei_make_corpus.manifest import (
+    FileState,
+    Manifest,
+    ManifestPart,
+    ManifestWriter,
+    current_file_states,
+    settings_digest,
+)
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.partition_plan import PartitionPlan
+from tei_make_corpus.partition_pool import PartitionPool
 from tei_make_corpus.partitioner import Partitioner
+from tei_make_corpus.work_queue import WorkQueue
+from tei_make_corpus.xmlid_handler import XmlIdPrefixer, reserve_prefixes_for_parts
 
 logger = logging.getLogger(__name__)
 
+# a part of an incremental build: the partition, its output file, the states
+# of its files and the part of the previous build if the part is unchanged
+_IncrementalPart = Tuple[Partition, str, List[FileState], Optional[ManifestPart]]
+
 
 @dataclass
 class TeiCorpusMaker:
@@ -23,10 +45,231 @@ class TeiCorpusMaker:
         Iterate over TEI files in the directory and combined them with
         the common header into a single teiCorpus-tree.
         The output is printed stdout as default.
+        If the corpus is split and multiple partition workers are
+        configured, the parts are written concurrently.
+        If a shard is configured (or the partition plan is exported), the
+        complete partition plan is determined first and only the parts of
+        the shard are written.
+        If a work queue is created, the partition plan is written to the
+        queue instead of writing the parts. A worker writes the parts it
+        claims from the queue, without walking the corpus directory.
+        If a manifest is configured, only the output files whose TEI files
+        or settings changed since the previous build are written.
         """
-        for partition in self.partitioner.get_partitions(
+        if self.config.worker_queue is not None:
+            self._work_from_queue(self.config.worker_queue)
+            return
+        partitions = self.partitioner.get_partitions(
             corpus_dir, header_file, config=self.config
+        )
+        if self._split_corpus() and self.config.create_queue is not None:
+            self._create_queue(self.config.create_queue, partitions)
+            return
+        if self.config.manifest_file is not None:
+            self._build_incremental_corpus(partitions, self.config.manifest_file)
+            return
+        if self._split_corpus() and (
+            self.config.shard is not None or self.config.plan_file is not None
         ):
-            if self.config.split_docs != -1 or self.config.split_size != -1:
+            self._build_planned_corpus(partitions)
+            return
+        if self._split_corpus() and self.config.partition_workers > 1:
+            PartitionPool(self.config.partition_workers).write_partitions(
+                self._assign_output_files(partitions)
+            )
+            return
+        for partition in partitions:
+            if self._split_corpus():
                 self.outstream.update_output_file_name()
             partition.write_partition(self.outstream.path())
+
+    def _build_planned_corpus(self, partitions: Iterable[Partition]) -> None:
+        shard, shards = self.config.shard or (1, 1)
+        plan = self._create_plan(partitions, shards)
+        assigned: List[Tuple[Partition, Optional[str]]] = [
+            (partition, path if plan.shard_of(i) == shard else None)
+            for i, (partition, path) in enumerate(plan.partitions)
+        ]
+        self._write_assigned_partitions(assigned)
+
+    def _build_incremental_corpus(
+        self, partitions: Iterable[Partition], manifest_file: str
+    ) -> None:
+        # the parts are compared with the parts of the previous build at the
+        # same position, i.e. a part is only kept if the partition
+        # boundaries are unchanged
+        manifest = Manifest(manifest_file)
+        digest = settings_digest(self.partitioner, self.config)
+        settings_changed = manifest.read_settings_digest() != digest
+        if self._split_corpus():
+            output_files = self._assign_output_files(partitions)
+        else:
+            output_file = self.outstream.path()
+            assert isinstance(output_file, str)
+            output_files = [(partition, output_file) for partition in partitions]
+        previous_parts = manifest.iter_parts()
+        parts: List[_IncrementalPart] = []
+        for partition, output_file in output_files:
+            files = list(partition.files)
+            previous = next(previous_parts, None)
+            states = current_file_states(
+                files, {} if previous is None else previous.file_states()
+            )
+            unchanged = (
+                not settings_changed
+                and previous is not None
+                and previous.output_file == output_file
+                and previous.has_same_contents(states)
+                and os.path.exists(output_file)
+            )
+            parts.append(
+                (
+                    dataclasses.replace(partition, files=files),
+                    output_file,
+                    states,
+                    previous if unchanged else None,
+                )
+            )
+        xmlid_handler = self.partitioner.xmlid_handler
+        with manifest.writer(digest) as writer:
+            if isinstance(xmlid_handler, XmlIdPrefixer):
+                written = self._write_prefixed_parts(parts, xmlid_handler, writer)
+            else:
+                for _, output_file, states, _ in parts:
+                    writer.add_part(ManifestPart(output_file, states))
+                assigned = [
+                    (partition, None if previous is not None else output_file)
+                    for partition, output_file, _, previous in parts
+                ]
+                self._write_assigned_partitions(assigned)
+                written = sum(1 for _, path in assigned if path is not None)
+        logger.info(
+            "Incremental build: %d of %d output files written", written, len(parts)
+        )
+
+    def _write_prefixed_parts(
+        self,
+        parts: List[_IncrementalPart],
+        xmlid_handler: XmlIdPrefixer,
+        writer: ManifestWriter,
+    ) -> int:
+        # the prefixes of a part depend on the prefixes generated for the
+        # preceding parts (and on which of their documents were valid), so
+        # the parts are written one after another and an unchanged part is
+        # written again if the prefixes it depends on changed
+        written = 0
+        for partition, output_file, states, previous in parts:
+            reserved = self._part_prefixes(partition, xmlid_handler)
+            if previous is not None and previous.reserved_prefixes == reserved:
+                prefixes = previous.prefixes
+                xmlid_handler.add_reserved_prefixes(prefixes)
+            else:
+                partition.write_partition(output_file)
+                written += 1
+                prefixes = [
+                    prefix
+                    for prefix in self._part_prefixes(partition, xmlid_handler)
+                    if prefix not in reserved
+                ]
+            writer.add_part(ManifestPart(output_file, states, reserved, prefixes))
+        return written
+
+    def _part_prefixes(
+        self, partition: Partition, xmlid_handler: XmlIdPrefixer
+    ) -> List[str]:
+        # the prefixes in use that the prefixes of the files of partition
+        # depend on; after the partition is written, these include the
+        # prefixes generated for its documents
+        return sorted(
+            {
+                prefix
+                for file_path in partition.files
+                for prefix in xmlid_handler.reserved_prefixes(file_path)
+            }
+        )
+
+    def _write_assigned_partitions(
+        self, assigned: List[Tuple[Partition, Optional[str]]]
+    ) -> None:
+        # partitions paired with None are skipped
+        if self.config.partition_workers > 1:
+            PartitionPool(self.config.partition_workers).write_partitions(assigned)
+            return
+        for partition, output_file in assigned:
+            if output_file is None:
+                partition.skip_partition()
+            else:
+                partition.write_partition(output_file)
+
+    def _create_plan(
+        self, partitions: Iterable[Partition], shards: int = 1
+    ) -> PartitionPlan:
+        plan = PartitionPlan(
+            [
+                (dataclasses.replace(partition, files=list(partition.files)), path)
+                for partition, path in self._assign_output_files(partitions)
+            ],
+            shards,
+        )
+        logger.info(
+            "Partition plan with %d parts, digest: %s",
+            len(plan.partitions),
+            plan.digest(),
+        )
+        if self.config.plan_file is not None:
+            plan.export(self.config.plan_file)
+        return plan
+
+    def _create_queue(self, queue_file: str, partitions: Iterable[Partition]) -> None:
+        plan = self._create_plan(partitions)
+        reserved_prefixes = None
+        if isinstance(self.partitioner.xmlid_handler, XmlIdPrefixer):
+            reserved_prefixes = reserve_prefixes_for_parts(
+                self.partitioner.xmlid_handler,
+                (partition.files for partition, _ in plan.partitions),
+            )
+        WorkQueue(queue_file).create(plan, reserved_prefixes)
+        logger.info("Work queue created: %s", queue_file)
+
+    def _work_from_queue(self, queue_file: str) -> None:
+        queue = WorkQueue(queue_file)
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        lease_timeout = self.config.lease_timeout
+        logger.info("Worker %s uses work queue with digest: %s", worker, queue.digest())
+        written = 0
+        while (part := queue.claim(worker, lease_timeout)) is not None:
+            partition = self.partitioner.partition_for_files(part.files, self.config)
+            if part.reserved_prefixes is not None:
+                partition.xmlid_handler = XmlIdPrefixer(part.reserved_prefixes)
+            # if the lease expires, another worker may write the same part,
+            # so the output file is only replaced once it is complete
+            tmp_file = f"{part.output_file}.{uuid.uuid4().hex}.tmp"
+            try:
+                with queue.keep_lease(part.index, worker, lease_timeout):
+                    partition.write_partition(tmp_file)
+                os.replace(tmp_file, part.output_file)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            queue.complete(part.index)
+            written += 1
+        logger.info(
+            "Worker %s wrote %d parts, work queue status: %s",
+            worker,
+            written,
+            queue.status(),
+        )
+
+    def _split_corpus(self) -> bool:
+        return self.config.split_docs != -1 or self.config.split_size != -1
+
+    def _assign_output_files(
+        self, partitions: Iterable[Partition]
+    ) -> List[Tuple[Partition, str]]:
+        assigned = []
+        for partition in partitions:
+            self.outstream.update_output_file_name()
+            output_file = self.outstream.path()
+            assert isinstance(output_file, str)
+            assigned.append((partition, output_file))
+        return assigned
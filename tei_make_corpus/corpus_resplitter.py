@@ -0,0 +1,362 @@
+import io
+import itertools
+import logging
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Union,
+)
+
+from lxml import etree
+
+from tei_make_corpus.archive import iterparse_corpus_file, split_member_path
+from tei_make_corpus.cli.corpus_config import CorpusConfig
+from tei_make_corpus.compression import compression_extension
+from tei_make_corpus.corpus_stream import CorpusStream
+from tei_make_corpus.header_handler import TeiHeaderHandler
+from tei_make_corpus.partition import Partition, _open_binary
+from tei_make_corpus.partitioner import (
+    determine_chunk_indices_file_size,
+    determine_chunk_indices_num_docs,
+)
+from tei_make_corpus.path_finder import PathFinder
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+
+logger = logging.getLogger(__name__)
+
+# file path, start and end offset (in bytes) of a TEI document in the file
+DocumentRange = Tuple[str, int, int]
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+# markup that may contain '<' or '>' without being a tag
+_NON_TAG_MARKUP = rb"<!--.*?-->|<\?.*?\?>|<!\[CDATA\[.*?\]\]>|<!DOCTYPE[^>]*>"
+
+# the rest of a tag after its name, up to the closing '>' ('>' may occur in
+# quoted attribute values)
+_TAG_REST = rb"""[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>"""
+
+_MARKUP = re.compile(_NON_TAG_MARKUP + rb"|<(/?)([^\s/>!?]+)" + _TAG_REST, re.S)
+
+
+@dataclass
+class TeiCorpusResplitter:
+    """
+    Merge teiCorpus files and split them again into new parts.
+
+    With mode 'copy', the teiCorpus files must be written by
+    tei-make-corpus and must not be compressed. The files are scanned for
+    the byte ranges of the TEI documents, which are copied to the new
+    output files without parsing them. The TEI documents are copied as
+    they were serialized by tei-make-corpus. If every original TEI file
+    was a valid TEI document, the output is identical to the output of
+    tei-make-corpus for the original TEI files (with the same header);
+    otherwise the documents are grouped differently, because a build from
+    the TEI files counts the omitted files when it splits the corpus.
+
+    With mode 'stream', any teiCorpus files (also compressed files) can be
+    resplit. The files are parsed incrementally and each TEI document is
+    cleared after it is written, so only one TEI document is held in
+    memory. If the corpus is split by number of documents, the documents
+    are counted in a first pass to distribute them as with a build from
+    TEI files (that were all valid TEI documents). If it is split by size,
+    a new output file is started when the serialized documents reach the
+    intended size.
+
+    Each output file gets the common header and processing instructions
+    as configured.
+
+    outstream:      CorpusStream providing the output files
+    header_handler: implementation of TeiHeaderHandler interface, provides
+                    the common corpus header
+    path_finder:    implementation of PathFinder protocol, provides the
+                    teiCorpus files if a directory is resplit
+    config:         configurations for splitting the corpus
+    mode:           'copy' (default) or 'stream', see above
+    """
+
+    outstream: CorpusStream
+    header_handler: TeiHeaderHandler
+    path_finder: PathFinder
+    config: CorpusConfig
+    mode: str = "copy"
+
+    def resplit_corpus(self, corpus_path: str, header_file: str) -> None:
+        """
+        Write the TEI documents of the teiCorpus file or the directory of
+        teiCorpus files at corpus_path to new output files, split according
+        to the configuration. Raises ValueError if an output file is one of
+        the teiCorpus files or, with mode 'copy', if a teiCorpus file is
+        compressed.
+        """
+        if os.path.isfile(corpus_path):
+            corpus_files = [corpus_path]
+        else:
+            corpus_files = self.path_finder.get_paths_for_corpus_files(
+                corpus_path, header_file
+            )
+        if self.mode == "stream":
+            self._stream_corpus(corpus_files)
+        else:
+            self._copy_corpus(corpus_files)
+
+    def _copy_corpus(self, corpus_files: List[str]) -> None:
+        for corpus_file in corpus_files:
+            if (
+                compression_extension(corpus_file) is not None
+                or split_member_path(corpus_file) is not None
+            ):
+                raise ValueError(
+                    "Compressed teiCorpus files and members of archives can only"
+                    f" be resplit with mode 'stream': {corpus_file}"
+                )
+        documents: List[DocumentRange] = []
+        for corpus_file in corpus_files:
+            try:
+                documents.extend(scan_tei_documents(corpus_file))
+            except ValueError:
+                logger.exception("File ommitted: %s" % corpus_file)
+        logger.info(
+            "Found %d TEI documents in %d teiCorpus files",
+            len(documents),
+            len(corpus_files),
+        )
+        head, tail = self._corpus_envelope()
+        if self.config.split_size != -1:
+            index_pairs = determine_chunk_indices_file_size(
+                [end - start for _, start, end in documents], self.config.split_size
+            )
+        else:
+            index_pairs = determine_chunk_indices_num_docs(
+                len(documents), self.config.split_docs
+            )
+        parts = []
+        for start_index, end_index in index_pairs:
+            parts.append((self._next_output_file(), documents[start_index:end_index]))
+        # the input files are read while the output files are written
+        input_files = _absolute_paths(corpus_files)
+        for path, _ in parts:
+            _check_output_file(path, input_files)
+        for path, part_documents in parts:
+            self._copy_part(path, head, tail, part_documents)
+
+    def _stream_corpus(self, corpus_files: List[str]) -> None:
+        head, tail = self._corpus_envelope()
+        input_files = _absolute_paths(corpus_files)
+        docs_per_part: Iterator[int] = itertools.repeat(-1)
+        if self.config.split_docs != -1:
+            num_docs = sum(1 for _ in iter_tei_documents(corpus_files))
+            docs_per_part = iter(
+                end - start
+                for start, end in determine_chunk_indices_num_docs(
+                    num_docs, self.config.split_docs
+                )
+            )
+        documents = iter_tei_documents(corpus_files)
+        document = next(documents, None)
+        while document is not None:
+            path = self._next_output_file()
+            _check_output_file(path, input_files)
+            max_docs = next(docs_per_part)
+            with _open_binary(
+                path, self.config.compression, self.config.compress_workers
+            ) as output:
+                output.write(head)
+                written_docs = 0
+                written_size = 0
+                while document is not None:
+                    serialized = etree.tostring(
+                        document, encoding="UTF-8", with_tail=False
+                    )
+                    output.write(serialized)
+                    output.write(b"\n")
+                    written_docs += 1
+                    written_size += len(serialized)
+                    # the next document is parsed after the current one is
+                    # cleared
+                    document = next(documents, None)
+                    if written_docs == max_docs or (
+                        self.config.split_size != -1
+                        and written_size >= self.config.split_size
+                    ):
+                        break
+                output.write(tail)
+
+    def _next_output_file(self) -> Union[str, BinaryIO]:
+        if self.config.split_docs != -1 or self.config.split_size != -1:
+            self.outstream.update_output_file_name()
+        return self.outstream.path()
+
+    def _corpus_envelope(self) -> Tuple[bytes, bytes]:
+        # the teiCorpus without TEI documents, as written by Partition,
+        # split before the end tag of teiCorpus
+        empty_corpus = io.BytesIO()
+        Partition(
+            self.header_handler,
+            [],
+            XmlIdRemover(),
+            processing_instructions=self.config.processing_instructions,
+        ).write_partition(empty_corpus)
+        serialized = empty_corpus.getvalue()
+        end_tag_start = serialized.rindex(b"</teiCorpus>")
+        return serialized[:end_tag_start], serialized[end_tag_start:]
+
+    def _copy_part(
+        self,
+        path: Union[str, BinaryIO],
+        head: bytes,
+        tail: bytes,
+        documents: List[DocumentRange],
+    ) -> None:
+        with _open_binary(
+            path, self.config.compression, self.config.compress_workers
+        ) as output:
+            output.write(head)
+            input_file: Optional[BinaryIO] = None
+            input_path = None
+            for file_path, start, end in documents:
+                if file_path != input_path:
+                    if input_file is not None:
+                        input_file.close()
+                    input_file = open(file_path, "rb")
+                    input_path = file_path
+                assert input_file is not None
+                input_file.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = input_file.read(min(remaining, _COPY_BUFFER_SIZE))
+                    output.write(chunk)
+                    remaining -= len(chunk)
+                output.write(b"\n")
+            if input_file is not None:
+                input_file.close()
+            output.write(tail)
+
+
+def iter_tei_documents(corpus_files: Iterable[str]) -> Iterator[etree._Element]:
+    """
+    Yield the TEI documents (i.e. all children of the teiCorpus root except
+    the common teiHeader) of the teiCorpus files, parsing the files
+    incrementally.
+
+    Each document is cleared and removed from the tree when the next one is
+    requested, so it has to be processed before. If a file can't be parsed,
+    the error is logged and the remaining documents of the file are
+    omitted.
+    """
+    for corpus_file in corpus_files:
+        depth = 0
+        first_child = True
+        try:
+            for event, element in iterparse_corpus_file(
+                corpus_file, events=("start", "end"), huge_tree=True
+            ):
+                if event == "start":
+                    if depth == 0 and etree.QName(element).localname != "teiCorpus":
+                        logger.info(
+                            "No <teiCorpus> root element found. Ignoring file: %s",
+                            corpus_file,
+                        )
+                        break
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if not (first_child and etree.QName(element).localname == "teiHeader"):
+                    yield element
+                first_child = False
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+        except etree.XMLSyntaxError:
+            logger.exception("Remaining documents ommitted: %s" % corpus_file)
+
+
+def scan_tei_documents(corpus_file: str) -> Iterator[DocumentRange]:
+    """
+    Yield the byte ranges of the TEI documents (i.e. of all children of the
+    teiCorpus root except the common teiHeader) in corpus_file.
+
+    The file is scanned for tags without parsing it, assuming it is a
+    well-formed, uncompressed teiCorpus. Raises ValueError if corpus_file
+    doesn't contain a complete teiCorpus.
+    """
+    if os.path.getsize(corpus_file) == 0:
+        raise ValueError(f"Empty file: {corpus_file}")
+    with open(corpus_file, "rb") as fp, mmap.mmap(
+        fp.fileno(), 0, access=mmap.ACCESS_READ
+    ) as content:
+        root = _next_tag(content, 0)
+        if root is None or _localname(root.group(2)) != b"teiCorpus":
+            raise ValueError(f"No teiCorpus root element: {corpus_file}")
+        position = root.end()
+        first_child = True
+        while (tag := _next_tag(content, position)) is not None:
+            if tag.group(1):
+                # end tag of teiCorpus
+                return
+            end = _end_of_element(content, tag)
+            if not (first_child and _localname(tag.group(2)) == b"teiHeader"):
+                yield corpus_file, tag.start(), end
+            first_child = False
+            position = end
+    raise ValueError(f"Incomplete teiCorpus: {corpus_file}")
+
+
+def _next_tag(content: mmap.mmap, position: int) -> Optional["re.Match[bytes]"]:
+    for match in _MARKUP.finditer(content, position):
+        if match.group(2) is not None:
+            return match
+    return None
+
+
+_element_patterns: Dict[bytes, Pattern[bytes]] = {}
+
+
+def _end_of_element(content: mmap.mmap, start_tag: "re.Match[bytes]") -> int:
+    if start_tag.group(0).endswith(b"/>"):
+        return start_tag.end()
+    qname = start_tag.group(2)
+    if qname not in _element_patterns:
+        _element_patterns[qname] = re.compile(
+            _NON_TAG_MARKUP
+            + rb"|<(/?)"
+            + re.escape(qname)
+            + rb"(?=[\s/>])"
+            + _TAG_REST,
+            re.S,
+        )
+    depth = 1
+    for match in _element_patterns[qname].finditer(content, start_tag.end()):
+        if match.group(1) is None or match.group(0).endswith(b"/>"):
+            continue
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return match.end()
+    raise ValueError("Unclosed element: %s" % qname.decode())
+
+
+def _localname(qname: bytes) -> bytes:
+    return qname.rpartition(b":")[2]
+
+
+def _absolute_paths(file_paths: Iterable[str]) -> Set[str]:
+    return {os.path.abspath(file_path) for file_path in file_paths}
+
+
+def _check_output_file(path: Union[str, BinaryIO], input_files: Set[str]) -> None:
+    if isinstance(path, str) and os.path.abspath(path) in input_files:
+        raise ValueError(f"Output file is also an input file: {path}")
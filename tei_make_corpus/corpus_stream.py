@@ -2,6 +2,8 @@ import itertools
 import sys
 from typing import BinaryIO, Optional, Protocol, Union
 
+from tei_make_corpus.compression import output_extension
+
 
 class CorpusStream(Protocol):
     """Interface for a corpus stream"""
@@ -14,6 +16,10 @@ class CorpusStream(Protocol):
         """Change path of output file"""
         ...
 
+    def set_compression(self, compression: Optional[str]) -> None:
+        """Change compression format of output files"""
+        ...
+
     def update_output_file_name(self) -> None:
         """
         Defines how to update file path of output file if input corpus is
@@ -26,19 +32,28 @@ class CorpusStreamImpl:
     """
     Provides output stream where teiCorpus is written to.
     As default, stdout is used.
+    If the output is compressed, the file extension of the compression
+    format is added to the file paths.
     """
 
-    def __init__(self, output_file: Optional[str] = None) -> None:
+    def __init__(
+        self, output_file: Optional[str] = None, compression: Optional[str] = None
+    ) -> None:
         self.output_file = output_file
+        self.compression = compression
         self._file_name_template: Optional[str] = None
         self._counter: itertools.count = itertools.count(1)
 
     def path(self) -> Union[str, BinaryIO]:
         """
         Return path where output is written. Default path is stdout.
-        If an output file is set, its path is returned.
+        If an output file is set, its path is returned (with the extension
+        of the compression format, if it is missing).
         """
         if self.output_file is not None:
+            extension = output_extension(self.compression)
+            if not self.output_file.endswith(extension):
+                return self.output_file + extension
             return self.output_file
         return sys.stdout.buffer
 
@@ -46,21 +61,31 @@ class CorpusStreamImpl:
         if file is not None:
             self.output_file = file
 
+    def set_compression(self, compression: Optional[str]) -> None:
+        self.compression = compression
+
     def update_output_file_name(self) -> None:
         """
         Update path of output file if output is split into multiple parts
         by adding consecutive numbering to the output file path.
         If no file path was set, 'part0001.xml' is used as template.
+        If the output is compressed, the extension of the compression format
+        follows '.xml', e.g. 'part0001.xml.gz'.
         """
         if self._file_name_template is None:
             self._file_name_template = self._find_template_name()
         i = next(self._counter)
-        self.output_file = f"{self._file_name_template}{i:04}.xml"
+        extension = output_extension(self.compression)
+        self.output_file = f"{self._file_name_template}{i:04}.xml{extension}"
 
     def _find_template_name(self) -> str:
         if self.output_file is None:
             return "part"
+        template = self.output_file
+        extension = output_extension(self.compression)
+        if extension and template.endswith(extension):
+            template = template[: -len(extension)]
         xml_file_extension = ".xml"
-        if self.output_file.endswith(xml_file_extension):
-            return self.output_file[: -len(xml_file_extension)]
-        return self.output_file
+        if template.endswith(xml_file_extension):
+            return template[: -len(xml_file_extension)]
+        return template
@@ -0,0 +1,272 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# entries that aren't directories, futures of the listings of the
+# subdirectories and number of entries in the directory
+Listing = Tuple[List[os.DirEntry], List[Future], int]
+
+_LISTING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    directory TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    walk INTEGER NOT NULL,
+    files TEXT NOT NULL,
+    subdirs TEXT NOT NULL
+);
+"""
+
+# a directory changed within this time (in nanoseconds) before it was
+# listed could change again without a new modification time, so its
+# listing isn't trusted on the next walk
+_MTIME_GRANULARITY = 2_000_000_000
+
+
+def walk_directory_tree(top: str) -> Iterator[os.DirEntry]:
+    """
+    Yield the entries of all files under top, one directory after another.
+
+    The entries of a directory are yielded in sorted order, followed by the
+    entries of its subdirectories (in sorted order of the subdirectories).
+    As with os.walk, symbolic links to directories aren't followed and
+    directories that can't be read are skipped.
+    """
+    files, subdirs = _list_directory(top)
+    yield from files
+    for subdir in subdirs:
+        yield from walk_directory_tree(subdir)
+
+
+class ParallelDirectoryWalker:
+    """
+    Walk a directory tree with directories listed concurrently in a pool of
+    threads.
+
+    The entries are yielded in the same order as by walk_directory_tree.
+    Listing a directory submits the listings of its subdirectories right
+    away, so the directories are listed ahead of the entries that are
+    consumed. When the walk is complete, the number of directories and
+    entries listed per second is logged.
+
+    threads:    number of directories that are listed concurrently
+    stat:       if True, the file status of the entries is retrieved in the
+                threads as well, i.e. DirEntry.stat() doesn't block
+    """
+
+    def __init__(self, threads: int, stat: bool = False) -> None:
+        self._threads = threads
+        self._stat = stat
+
+    def walk(self, top: str) -> Iterator[os.DirEntry]:
+        """
+        Yield the entries of all files under top in the order of
+        walk_directory_tree.
+        """
+        num_directories = 0
+        num_entries = 0
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self._threads)
+        # all submitted listings, which are cancelled if the walk is stopped
+        # early; once stopped, running listings don't submit further listings
+        submitted: List[Future] = []
+        stopped = threading.Event()
+
+        def submit(directory: str) -> Future:
+            future = executor.submit(self._list_directory, submit, stopped, directory)
+            submitted.append(future)
+            return future
+
+        try:
+            stack = [submit(top)]
+            while stack:
+                files, subdirs, listed_entries = stack.pop().result()
+                num_directories += 1
+                num_entries += listed_entries
+                yield from files
+                stack.extend(reversed(subdirs))
+        finally:
+            stopped.set()
+            for future in submitted:
+                future.cancel()
+            executor.shutdown(wait=True)
+        self._report(num_directories, num_entries, time.perf_counter() - start)
+
+    def _list_directory(
+        self,
+        submit: Callable[[str], Future],
+        stopped: threading.Event,
+        directory: str,
+    ) -> Listing:
+        files, subdirs = _list_directory(directory)
+        if self._stat:
+            for entry in files:
+                _prefetch_stat(entry)
+        if stopped.is_set():
+            return files, [], len(files) + len(subdirs)
+        return (
+            files,
+            [submit(subdir) for subdir in subdirs],
+            len(files) + len(subdirs),
+        )
+
+    def _report(self, num_directories: int, num_entries: int, seconds: float) -> None:
+        seconds = max(seconds, 1e-9)
+        logger.info(
+            "Walked %d directories (%.1f dirs/s) and %d entries (%.1f entries/s) "
+            "with %d threads",
+            num_directories,
+            num_directories / seconds,
+            num_entries,
+            num_entries / seconds,
+            self._threads,
+        )
+
+
+class CachedDirectoryWalker:
+    """
+    Walk a directory tree in the order of walk_directory_tree, with the
+    listings of the directories kept in a persistent cache (an SQLite
+    database).
+
+    The listing of a directory (the names and sizes of its files and the
+    names of its subdirectories) is stored with the modification time of
+    the directory. On the next walk, the listing of a directory whose
+    modification time is unchanged is taken from the cache, so only a
+    single stat call is needed per directory; directories whose entries
+    were added, removed or renamed are listed again. As the modification
+    time of a directory doesn't change if a file is rewritten in place, the
+    size of such a file is only updated when its directory is listed again.
+    Listings of directories that no longer exist are removed from the cache
+    when a walk is complete. When the walk is complete, the number of
+    directories listed and taken from the cache is logged.
+
+    cache_file:     path of the SQLite database, created if it doesn't exist
+    file_size:      function returning the size stored for the entry of a
+                    file
+    file_filter:    function deciding by the name of a file if it is stored,
+                    default is None, i.e. all files are stored
+    """
+
+    def __init__(
+        self,
+        cache_file: str,
+        file_size: Callable[[os.DirEntry], int],
+        file_filter: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self._cache_file = cache_file
+        self._file_size = file_size
+        self._file_filter = file_filter
+
+    def walk(self, top: str) -> Iterator[Tuple[str, int]]:
+        """
+        Yield the paths and sizes of all (stored) files under top in the
+        order of walk_directory_tree.
+        """
+        walk_id = time.time_ns()
+        num_directories = 0
+        num_listed = 0
+        with contextlib.closing(
+            sqlite3.connect(self._cache_file, timeout=60)
+        ) as connection:
+            connection.executescript(_LISTING_SCHEMA)
+            stack = [top]
+            while stack:
+                directory = stack.pop()
+                files, subdirs, listed = self._listing(connection, directory, walk_id)
+                num_directories += 1
+                num_listed += listed
+                for name, size in files:
+                    yield os.path.join(directory, name), size
+                stack.extend(
+                    os.path.join(directory, subdir) for subdir in reversed(subdirs)
+                )
+            key = os.path.abspath(top)
+            prefix = os.path.join(key, "")
+            connection.execute(
+                "DELETE FROM listings WHERE walk != ? "
+                "AND (directory = ? OR substr(directory, 1, ?) = ?)",
+                (walk_id, key, len(prefix), prefix),
+            )
+            connection.commit()
+        logger.info(
+            "Listed %d of %d directories, the others were taken from the "
+            "listing cache",
+            num_listed,
+            num_directories,
+        )
+
+    def _listing(
+        self, connection: sqlite3.Connection, directory: str, walk_id: int
+    ) -> Tuple[List[Tuple[str, int]], List[str], bool]:
+        # files, names of the subdirectories and whether the directory was
+        # listed (i.e. not taken from the cache)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return [], [], True
+        key = os.path.abspath(directory)
+        row = connection.execute(
+            "SELECT mtime, files, subdirs FROM listings WHERE directory = ?", (key,)
+        ).fetchone()
+        if row is not None and row[0] == mtime:
+            connection.execute(
+                "UPDATE listings SET walk = ? WHERE directory = ?", (walk_id, key)
+            )
+            files = [(name, size) for name, size in json.loads(row[1])]
+            return files, json.loads(row[2]), False
+        # the modification time is retrieved before the directory is listed,
+        # so a change during the listing results in a new listing next time
+        entries, subdir_paths = _list_directory(directory)
+        files = [
+            (entry.name, self._file_size(entry))
+            for entry in entries
+            if self._file_filter is None or self._file_filter(entry.name)
+        ]
+        subdirs = [os.path.basename(subdir) for subdir in subdir_paths]
+        if time.time_ns() - mtime < _MTIME_GRANULARITY:
+            mtime = -1
+        connection.execute(
+            "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?)",
+            (key, mtime, walk_id, json.dumps(files), json.dumps(subdirs)),
+        )
+        return files, subdirs, True
+
+
+def _list_directory(directory: str) -> Tuple[List[os.DirEntry], List[str]]:
+    try:
+        with os.scandir(directory) as scanned:
+            entries = sorted(scanned, key=lambda entry: entry.name)
+    except OSError:
+        return [], []
+    files = []
+    subdirs = []
+    for entry in entries:
+        if _is_dir(entry):
+            if not entry.is_symlink():
+                subdirs.append(entry.path)
+        else:
+            files.append(entry)
+    return files, subdirs
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _prefetch_stat(entry: os.DirEntry) -> None:
+    # DirEntry caches the result
+    try:
+        entry.stat()
+    except OSError:
+        pass
@@ -5,6 +5,8 @@ from typing import Optional, Protocol
 
 from lxml import etree
 
+from tei_make_corpus.compression import strip_compression_extension
+
 logger = logging.getLogger(__name__)
 
 
@@ -101,6 +103,8 @@ class DocIdToIdnoHandler:
         return None
 
     def _extract_doc_id(self, file_path: str) -> str:
+        # compressed files get the identifier of the uncompressed file
+        file_path = strip_compression_extension(file_path)
         if self._doc_id_pattern is not None:
             doc_id = self._doc_id_pattern.search(file_path)
             if doc_id:
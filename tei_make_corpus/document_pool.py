@@ -0,0 +1,220 @@
+import collections
+import copy
+import dataclasses
+import itertools
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from tei_make_corpus.archive import corpus_file_size
+from tei_make_corpus.size_scheduler import SizeScheduler
+from tei_make_corpus.xmlid_handler import PresetXmlIdPrefixer, XmlIdPrefixer
+
+if TYPE_CHECKING:
+    from tei_make_corpus.partition import Partition
+
+# number of documents sent to a worker process in one task
+BATCH_SIZE = 16
+
+# with scheduling by size, a batch is completed when its files reach this
+# size in bytes, so large documents are dispatched on their own
+BATCH_BYTES = 1_000_000
+
+# the configured Partition of the worker process, set by _init_worker
+_worker_partition: Optional["Partition"] = None
+
+DocumentTask = Tuple[str, Optional[str]]
+
+
+def serialize_tei_document(root: Optional[etree._Element]) -> bytes:
+    """
+    Serialize a prepared TEI document the way etree.xmlfile writes it.
+    Documents that were omitted (None) result in an empty byte string.
+    """
+    if root is None:
+        return b""
+    return etree.tostring(root, encoding="UTF-8", xml_declaration=False)
+
+
+def _init_worker(partition: "Partition") -> None:
+    global _worker_partition
+    _worker_partition = partition
+
+
+def _prepare_batch(tasks: List[DocumentTask]) -> List[Optional[bytes]]:
+    assert _worker_partition is not None
+    return [_prepare_document(_worker_partition, task) for task in tasks]
+
+
+def _prepare_document(partition: "Partition", task: DocumentTask) -> Optional[bytes]:
+    file_path, prefix = task
+    if prefix is not None:
+        # prefixes are assigned by the parent process
+        partition.xmlid_handler = PresetXmlIdPrefixer([prefix])
+    document = partition._read_unchanged_document(file_path)
+    if document is not None:
+        return document
+    if partition.fragment_cache is not None:
+        return partition._prepare_cached_document(file_path) or None
+    root = partition._prepare_single_tei_file(file_path)
+    if root is None:
+        return None
+    return serialize_tei_document(root)
+
+
+def reconcile_document(
+    partition: "Partition", task: DocumentTask, serialized: Optional[bytes]
+) -> bytes:
+    """
+    Return the serialized document of a task that was prepared with a
+    speculatively assigned prefix, in the order of the files of partition.
+
+    The prefixes are tracked by the xmlid_handler of partition; if an
+    omitted document shifted the prefixes, the document is prepared again
+    with the prefix actually assigned.
+    """
+    if serialized is None:
+        return b""
+    file_path, prefix = task
+    xmlid_handler = partition.xmlid_handler
+    if prefix is None or not isinstance(xmlid_handler, XmlIdPrefixer):
+        return serialized
+    assigned_prefix = xmlid_handler.generate_prefix(file_path)
+    if assigned_prefix == prefix:
+        return serialized
+    return (
+        _prepare_document(
+            dataclasses.replace(
+                partition, xmlid_handler=PresetXmlIdPrefixer([assigned_prefix])
+            ),
+            (file_path, None),
+        )
+        or b""
+    )
+
+
+class DocumentPool:
+    """
+    Prepare the TEI documents of a Partition in a pool of worker processes.
+
+    Each worker process receives a copy of the Partition (without its
+    list of files) once on start-up, i.e. the handlers are constructed
+    once per worker. The documents are parsed and transformed by the
+    workers and returned serialized; the results are yielded in the
+    original order of the files, so the output is identical to the output
+    of processing the documents one after another.
+
+    With schedule 'size', the documents are not dispatched in the order
+    of the files, but the largest documents of a window of upcoming
+    documents first (see SizeScheduler). The results are held in a reorder
+    buffer until they can be yielded in order; the window, and with it the
+    reorder buffer, is bounded by the size of the files in bytes. The sizes
+    are taken from the file_sizes of the Partition if they were collected
+    while the files were discovered.
+
+    partition:      the Partition whose documents are prepared
+    workers:        number of worker processes
+    schedule:       'order' (default) to dispatch the documents in the
+                    order of the files or 'size' to dispatch large
+                    documents first
+    reorder_buffer: intended maximal size in bytes of the files in the
+                    window of upcoming documents with schedule 'size'
+    """
+
+    def __init__(
+        self,
+        partition: "Partition",
+        workers: int,
+        schedule: str = "order",
+        reorder_buffer: int = 500_000_000,
+    ) -> None:
+        self._partition = partition
+        self._workers = workers
+        self._schedule = schedule
+        self._reorder_buffer = reorder_buffer
+
+    def serialized_documents(self) -> Iterator[bytes]:
+        """
+        Yield the serialized TEI documents of the partition in order.
+        Files that can't be parsed or don't contain a TEI document result
+        in an empty byte string.
+        """
+        worker_partition = dataclasses.replace(
+            self._partition, files=[], file_sizes=None, processing_instructions=None
+        )
+        with ProcessPoolExecutor(
+            max_workers=self._workers,
+            initializer=_init_worker,
+            initargs=(worker_partition,),
+        ) as executor:
+            if self._schedule == "size":
+                yield from self._documents_by_size(executor)
+            else:
+                yield from self._documents_in_order(executor)
+
+    def _documents_in_order(self, executor: ProcessPoolExecutor) -> Iterator[bytes]:
+        batches = self._batches()
+        pending: Deque[Tuple[List[DocumentTask], Future]] = collections.deque()
+        for batch in itertools.islice(batches, self._workers * 2):
+            pending.append((batch, executor.submit(_prepare_batch, batch)))
+        while pending:
+            batch, future = pending.popleft()
+            results = future.result()
+            next_batch = next(batches, None)
+            if next_batch is not None:
+                pending.append(
+                    (next_batch, executor.submit(_prepare_batch, next_batch))
+                )
+            for task, serialized in zip(batch, results):
+                yield reconcile_document(self._partition, task, serialized)
+
+    def _documents_by_size(self, executor: ProcessPoolExecutor) -> Iterator[bytes]:
+        scheduler = SizeScheduler(self._sized_tasks(), self._reorder_buffer)
+        pending: Dict[Future, List[Tuple[int, DocumentTask]]] = {}
+        reorder_buffer: Dict[int, Tuple[DocumentTask, Optional[bytes]]] = {}
+        next_index = 0
+        while True:
+            while len(pending) < self._workers * 2:
+                batch = scheduler.next_batch(BATCH_SIZE, BATCH_BYTES)
+                if not batch:
+                    break
+                future = executor.submit(_prepare_batch, [task for _, task in batch])
+                pending[future] = batch
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results = future.result()
+                for (index, task), serialized in zip(pending.pop(future), results):
+                    reorder_buffer[index] = (task, serialized)
+            while next_index in reorder_buffer:
+                task, serialized = reorder_buffer.pop(next_index)
+                yield reconcile_document(self._partition, task, serialized)
+                scheduler.release(next_index)
+                next_index += 1
+
+    def _batches(self) -> Iterator[List[DocumentTask]]:
+        tasks = self._tasks()
+        while batch := list(itertools.islice(tasks, BATCH_SIZE)):
+            yield batch
+
+    def _sized_tasks(self) -> Iterator[Tuple[DocumentTask, int]]:
+        # the sizes collected during the discovery of the files are used,
+        # only without them (e.g. for parts of a partition plan) the sizes
+        # are determined from the files
+        tasks = self._tasks()
+        if self._partition.file_sizes is None:
+            return ((task, corpus_file_size(task[0])) for task in tasks)
+        return zip(tasks, self._partition.file_sizes)
+
+    def _tasks(self) -> Iterator[DocumentTask]:
+        # assign prefixes in file order, assuming all documents are valid
+        speculative_prefixer = None
+        if isinstance(self._partition.xmlid_handler, XmlIdPrefixer):
+            speculative_prefixer = copy.deepcopy(self._partition.xmlid_handler)
+        for file_path in self._partition.files:
+            prefix = None
+            if speculative_prefixer is not None:
+                prefix = speculative_prefixer.generate_prefix(file_path)
+            yield file_path, prefix
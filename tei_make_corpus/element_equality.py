@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 from lxml import etree
 
 
@@ -48,3 +50,56 @@ def elements_equal(
         elements_equal(child1, child2, ignore_ns=ignore_ns)
         for child1, child2 in zip(elem1, elem2)
     )
+
+
+def subtree_fingerprint(
+    element: etree._Element, cache: Optional[Dict[etree._Element, int]] = None
+) -> int:
+    """
+    Return a hash of element and its descendants that is the same for
+    all elements that are equal by elements_equal with 'ignore_ns', i.e.
+    it is computed from the localnames, the stripped texts and tails (with
+    whitespace-only and missing text being the same) and the attributes
+    regardless of their order.
+
+    Elements with different fingerprints are never equal, so a comparison
+    can be rejected without walking the subtrees pairwise. Elements with
+    the same fingerprint are equal unless the hashes collide. As the hashes
+    of strings are randomized, fingerprints are only comparable within a
+    process.
+
+    If cache is given, the fingerprints of element and its descendants are
+    stored in it and taken from it on later calls. They must be removed
+    from the cache when a subtree is modified.
+    """
+    if cache is not None:
+        fingerprint = cache.get(element)
+        if fingerprint is not None:
+            return fingerprint
+    fingerprint = hash(
+        (
+            node_fingerprint(element),
+            tuple(subtree_fingerprint(child, cache) for child in element),
+        )
+    )
+    if cache is not None:
+        cache[element] = fingerprint
+    return fingerprint
+
+
+def node_fingerprint(element: etree._Element) -> int:
+    """
+    Return a hash of element without its descendants (but with the number
+    of its children), i.e. the part of subtree_fingerprint that can be
+    computed without walking the subtree.
+    """
+    tag = element.tag
+    return hash(
+        (
+            tag.rpartition("}")[2] if isinstance(tag, str) else tag,
+            (element.text or "").strip(),
+            (element.tail or "").strip(),
+            frozenset(element.attrib.items()),
+            len(element),
+        )
+    )
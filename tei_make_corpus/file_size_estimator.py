@@ -1,6 +1,7 @@
-import os
 from typing import List, Protocol
 
+from tei_make_corpus.archive import corpus_file_size
+
 
 class FileSizeEstimator(Protocol):
     """Interface used by Partitioner for splitting corpus by size"""
@@ -13,10 +14,8 @@ class FileSizeEstimatorImpl:
     def determine_file_sizes(self, list_of_file_paths: List[str]) -> List[int]:
         """
         Returns list of files sizes in bytes for file paths in input.
+        For members of archives, the size in the member header is used.
 
         list_of_file_paths:     list of corpus files
         """
-        return [
-            os.stat(file).st_size if os.path.exists(file) else 0
-            for file in list_of_file_paths
-        ]
+        return [corpus_file_size(file) for file in list_of_file_paths]
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+# incremented when the transformation of documents changes, so fragments
+# transformed by previous versions aren't used
+_FRAGMENT_VERSION = 2
+
+# when the cache exceeds its maximal size, the least recently used
+# fragments are removed until it is reduced to this share of the maximal
+# size, so the cache isn't scanned again for each new fragment
+_EVICTION_TARGET = 0.9
+
+_TMP_PREFIX = ".tmp"
+
+
+def fragment_key(content: bytes, settings: Dict[str, Any]) -> str:
+    """
+    Return the key of the transformed TEI document of a file with the given
+    content, transformed with settings (the values that change the
+    transformed document, e.g. the prefix of @xml:id).
+    """
+    key = hashlib.sha256(hashlib.sha256(content).digest())
+    key.update(
+        json.dumps(
+            [_FRAGMENT_VERSION, settings], ensure_ascii=False, sort_keys=True
+        ).encode()
+    )
+    return key.hexdigest()
+
+
+class FragmentCache:
+    """
+    Content-addressed cache of serialized, transformed TEI documents in a
+    directory, shared by all builds (and processes) that use the directory.
+
+    A fragment is stored in a file named by its key (see fragment_key) and
+    written to a temporary file first, so concurrent builds never read
+    incomplete fragments. The modification time of a fragment is updated
+    when it is read; if the fragments exceed max_size bytes, the least
+    recently used fragments are removed.
+
+    directory:  directory of the cache, created if it doesn't exist
+    max_size:   maximal size in bytes of the fragments in the cache
+    """
+
+    def __init__(self, directory: str, max_size: int = 1_000_000_000) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        # size of the fragments, determined when the first fragment is
+        # stored and then updated by this instance only
+        self._size: Optional[int] = None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the fragment stored for key or None if it isn't cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as ptr:
+                fragment = ptr.read()
+            os.utime(path)
+        except OSError:
+            # not cached or removed by another build
+            return None
+        return fragment
+
+    def put(self, key: str, fragment: bytes) -> None:
+        """
+        Store fragment for key. Fragments larger than the cache are not
+        stored.
+        """
+        if len(fragment) > self.max_size:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=_TMP_PREFIX, dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as ptr:
+                ptr.write(fragment)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._fragments())
+        else:
+            self._size += len(fragment)
+        if self._size > self.max_size:
+            self._evict()
+
+    def _evict(self) -> None:
+        fragments = sorted(self._fragments())
+        size = sum(size for _, _, size in fragments)
+        target = self.max_size * _EVICTION_TARGET
+        for _, path, fragment_size in fragments:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another build
+                pass
+            size -= fragment_size
+        self._size = size
+
+    def _fragments(self) -> List[Tuple[int, str, int]]:
+        # modification time, path and size of the stored fragments
+        fragments = []
+        with os.scandir(self.directory) as subdirs:
+            for subdir in subdirs:
+                if not subdir.is_dir():
+                    continue
+                with os.scandir(subdir.path) as entries:
+                    for entry in entries:
+                        if entry.name.startswith(_TMP_PREFIX):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        fragments.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return fragments
+
+    def _path(self, key: str) -> str:
+        # the fragments are distributed over subdirectories by the first
+        # two characters of the key, to keep the directories small
+        return os.path.join(self.directory, key[:2], key[2:])
@@ -1,9 +1,20 @@
-import re
-from typing import List, Protocol
+from typing import Dict, Iterable, List, Protocol, Tuple
 
 from lxml import etree
 
-from tei_make_corpus.element_equality import elements_equal
+from tei_make_corpus.element_equality import (
+    elements_equal,
+    node_fingerprint,
+    subtree_fingerprint,
+)
+
+_TEI_NAMESPACE = "http://www.tei-c.org/ns/1.0"
+
+# qualified tags of an element and its ancestors below the root of a header
+TagPath = Tuple[str, ...]
+
+# maximal number of verdicts of full comparisons that are memoised
+_VERDICT_MEMO_SIZE = 10_000
 
 
 class TeiHeaderHandler(Protocol):
@@ -37,6 +48,14 @@ class TeiHeaderHandlerImpl:
         """
         self._header_file = header_file_path
         self._common_header = self._construct_common_header(header_file_path)
+        self._plan = DeduplicationPlan(
+            self._common_header, self.tags_no_leftover_sibling
+        )
+        self._verdicts: Dict[Tuple[etree._Element, int], bool] = {}
+
+    def __reduce__(self) -> Tuple[type, Tuple[str]]:
+        # lxml elements can't be pickled, the common header is parsed again
+        return self.__class__, (self._header_file,)
 
     def common_header(self) -> etree._Element:
         return self._common_header
@@ -54,22 +73,26 @@ class TeiHeaderHandlerImpl:
         equal to 'None'.
         For attribute comparision, the order of attributes may differ as long
         as each @key='value' pair is present on both elements.
-
+        Elements are compared by their fingerprints first (see
+        subtree_fingerprint), only elements with the same fingerprint are
+        compared in full.
         """
-        for element in self._common_header.iterdescendants():
-            if etree.QName(element.tag).localname in self.tags_no_leftover_sibling:
-                continue
-            matching = self._element_equivalent_in_individual_header(element, iheader)
-            for struct_match in matching:
-                if elements_equal(element, struct_match, ignore_ns=True):
+        index = self._plan.index(iheader)
+        fingerprints = _Fingerprints()
+        for element, path in self._plan.removals:
+            for struct_match in index.get(path, []):
+                if self._is_duplicate(
+                    element, struct_match, fingerprints
+                ) and _is_attached(struct_match, iheader):
+                    fingerprints.forget_ancestors(struct_match)
                     struct_match.getparent().remove(struct_match)
-        for element in self._common_header.iterdescendants(
-            self.tags_no_leftover_sibling
-        ):
-            matching = self._element_equivalent_in_individual_header(element, iheader)
-            for struct_match in matching:
-                if elements_equal(element, struct_match, ignore_ns=True):
+        for element, path in self._plan.replacements:
+            for struct_match in index.get(path, []):
+                if self._is_duplicate(
+                    element, struct_match, fingerprints
+                ) and _is_attached(struct_match, iheader):
                     if struct_match.getnext() is None:
+                        fingerprints.forget_ancestors(struct_match)
                         struct_match.getparent().replace(
                             struct_match, etree.Element("p")
                         )
@@ -77,19 +100,140 @@ class TeiHeaderHandlerImpl:
     def _construct_common_header(self, header_file: str) -> etree._Element:
         return etree.parse(header_file).getroot()
 
-    def _element_equivalent_in_individual_header(
-        self, element: etree._Element, iheader: etree._Element
-    ) -> List[etree._Element]:
-        cheader_tree = self._common_header.getroottree()
-        elem_xpath = cheader_tree.getelementpath(element)
-        return iheader.findall(
-            self._adjust_xpath(elem_xpath),
-            namespaces={None: "http://www.tei-c.org/ns/1.0"},
-        )
-
-    def _adjust_xpath(self, xpath: str) -> str:
-        return f"./{self._clean_position_indices_from_path(xpath)}"
+    def _is_duplicate(
+        self,
+        element: etree._Element,
+        candidate: etree._Element,
+        fingerprints: "_Fingerprints",
+    ) -> bool:
+        # candidates are rejected by the fingerprint of their root first, so
+        # only subtrees that are likely equal are walked; the verdicts of
+        # the full comparison are memoised by fingerprint, as the same
+        # subtrees recur in the headers of many documents
+        if fingerprints.node(candidate) != self._plan.node_fingerprints[element]:
+            return False
+        fingerprint = fingerprints.subtree(candidate)
+        if fingerprint != self._plan.fingerprints[element]:
+            return False
+        key = (element, fingerprint)
+        verdict = self._verdicts.get(key)
+        if verdict is None:
+            if len(self._verdicts) >= _VERDICT_MEMO_SIZE:
+                self._verdicts.clear()
+            verdict = elements_equal(element, candidate, ignore_ns=True)
+            self._verdicts[key] = verdict
+        return verdict
+
+
+class DeduplicationPlan:
+    """
+    The elements of a common header that are looked up in individual
+    headers by TeiHeaderHandlerImpl.declutter_individual_header, compiled
+    once per common header.
+
+    Each element is stored with the path of tags leading to it from the
+    root of the common header, which is the element path without position
+    indices; tags without namespace stand for tags in the TEI namespace.
+    The paths are kept in a trie as well, so all elements of an individual
+    header that can match an element of the common header are found in a
+    single traversal, which skips subtrees that match no path. The
+    fingerprints (see subtree_fingerprint) of the elements are computed
+    once as well.
+
+    common_header:              root element of the common header
+    tags_no_leftover_sibling:   local names of the elements that are
+                                replaced instead of removed
+    """
 
-    def _clean_position_indices_from_path(self, xpath: str) -> str:
-        pattern = r"\[\d+\]"
-        return re.sub(pattern, "", xpath)
+    def __init__(
+        self, common_header: etree._Element, tags_no_leftover_sibling: Iterable[str]
+    ) -> None:
+        # elements removed from individual headers, in document order
+        self.removals: List[Tuple[etree._Element, TagPath]] = []
+        # elements replaced in individual headers; as with
+        # iterdescendants(tags), only elements without namespace are replaced
+        self.replacements: List[Tuple[etree._Element, TagPath]] = []
+        self.fingerprints: Dict[etree._Element, int] = {}
+        self.node_fingerprints: Dict[etree._Element, int] = {}
+        self._trie: Dict[str, dict] = {}
+        tags = set(tags_no_leftover_sibling)
+        for element in common_header.iterdescendants(etree.Element):
+            if etree.QName(element.tag).localname in tags:
+                continue
+            self.removals.append((element, self._add_path(element, common_header)))
+        for element in common_header.iterdescendants(tags):
+            self.replacements.append((element, self._add_path(element, common_header)))
+        for element, _ in self.removals + self.replacements:
+            subtree_fingerprint(element, self.fingerprints)
+            self.node_fingerprints[element] = node_fingerprint(element)
+
+    def index(self, iheader: etree._Element) -> Dict[TagPath, List[etree._Element]]:
+        """
+        Return the elements of iheader whose paths are (prefixes of) paths
+        of the plan, grouped by path in document order.
+        """
+        index: Dict[TagPath, List[etree._Element]] = {}
+        self._index_children(iheader, (), self._trie, index)
+        return index
+
+    def _index_children(
+        self,
+        parent: etree._Element,
+        path: TagPath,
+        trie: Dict[str, dict],
+        index: Dict[TagPath, List[etree._Element]],
+    ) -> None:
+        for child in parent.iterchildren(etree.Element):
+            subtrie = trie.get(child.tag)
+            if subtrie is None:
+                continue
+            child_path = path + (child.tag,)
+            index.setdefault(child_path, []).append(child)
+            if subtrie:
+                self._index_children(child, child_path, subtrie, index)
+
+    def _add_path(self, element: etree._Element, root: etree._Element) -> TagPath:
+        tags: List[str] = []
+        while element is not root:
+            tag = element.tag
+            tags.append(tag if tag.startswith("{") else f"{{{_TEI_NAMESPACE}}}{tag}")
+            element = element.getparent()
+        path = tuple(reversed(tags))
+        trie = self._trie
+        for tag in path:
+            trie = trie.setdefault(tag, {})
+        return path
+
+
+def _is_attached(element: etree._Element, root: etree._Element) -> bool:
+    # False if element or one of its ancestors was removed from root
+    while element is not None:
+        if element is root:
+            return True
+        element = element.getparent()
+    return False
+
+
+class _Fingerprints:
+    # fingerprints of the elements of an individual header, the
+    # fingerprints of the ancestors of a modified element are removed
+
+    def __init__(self) -> None:
+        self._nodes: Dict[etree._Element, int] = {}
+        self._subtrees: Dict[etree._Element, int] = {}
+
+    def node(self, element: etree._Element) -> int:
+        fingerprint = self._nodes.get(element)
+        if fingerprint is None:
+            fingerprint = self._nodes[element] = node_fingerprint(element)
+        return fingerprint
+
+    def subtree(self, element: etree._Element) -> int:
+        return subtree_fingerprint(element, self._subtrees)
+
+    def forget_ancestors(self, element: etree._Element) -> None:
+        ancestor = element.getparent()
+        while ancestor is not None:
+            self._nodes.pop(ancestor, None)
+            self._subtrees.pop(ancestor, None)
+            ancestor = ancestor.getparent()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from tei_make_corpus.archive import read_corpus_file, split_member_path
+from tei_make_corpus.cli.corpus_config import CorpusConfig
+from tei_make_corpus.partitioner import Partitioner
+
+logger = logging.getLogger(__name__)
+
+# incremented when the format of the manifest or the transformation of
+# documents changes, so all output files of previous versions are rewritten
+_MANIFEST_VERSION = 3
+
+_HASH_BUFFER_SIZE = 1024 * 1024
+
+# path, modification time (in nanoseconds), size and SHA-256 hex digest of
+# the content of a TEI file
+FileState = Tuple[str, int, int, str]
+
+
+@dataclass
+class ManifestPart:
+    """
+    A part of the corpus as recorded in the Manifest.
+
+    output_file:        path of the output file of the part
+    files:              states of the TEI files of the part, in order
+    reserved_prefixes:  @xml:id prefixes of the preceding parts the
+                        prefixes of the part depend on (see
+                        XmlIdPrefixer.reserved_prefixes)
+    prefixes:           @xml:id prefixes generated for the documents of
+                        the part
+    """
+
+    output_file: str
+    files: List[FileState]
+    reserved_prefixes: List[str] = field(default_factory=list)
+    prefixes: List[str] = field(default_factory=list)
+
+    def file_states(self) -> Dict[str, FileState]:
+        """
+        Return the states of the files of the part by path.
+        """
+        return {state[0]: state for state in self.files}
+
+    def has_same_contents(self, states: List[FileState]) -> bool:
+        """
+        Return True if states contains the same files (in the same order)
+        with the same contents as the part, regardless of the modification
+        times.
+        """
+        return [(state[0], state[3]) for state in self.files] == [
+            (state[0], state[3]) for state in states
+        ]
+
+
+class Manifest:
+    """
+    Record of the output files of a build and the TEI files they were
+    written from, used to rebuild only the output files whose TEI files or
+    settings changed.
+
+    The manifest is a JSON Lines file: the first line contains the digest
+    of the settings that affect the output (see settings_digest), each
+    following line a part of the corpus, in the order of the parts. The
+    parts of the previous build are read one after another while the new
+    parts are compared and recorded, so the manifest is never held in
+    memory as a whole.
+
+    A file whose modification time and size are unchanged is assumed to be
+    unchanged; otherwise its content hash is compared, so files that were
+    only touched don't cause a rebuild.
+
+    path:   path of the manifest file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def read_settings_digest(self) -> Optional[str]:
+        """
+        Return the settings digest of the previous build or None if there is
+        no (valid) manifest.
+        """
+        try:
+            with open(self.path, encoding="utf-8") as fp:
+                header = json.loads(fp.readline())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get("version") != _MANIFEST_VERSION:
+            return None
+        return header.get("settings_digest")
+
+    def iter_parts(self) -> Iterator[ManifestPart]:
+        """
+        Yield the parts of the previous build. Nothing is yielded if there is
+        no (valid) manifest.
+        """
+        if self.read_settings_digest() is None:
+            return
+        with open(self.path, encoding="utf-8") as fp:
+            fp.readline()
+            for line in fp:
+                part = json.loads(line)
+                yield ManifestPart(
+                    part["output_file"],
+                    [tuple(state) for state in part["files"]],  # type: ignore[misc]
+                    part["reserved_prefixes"],
+                    part["prefixes"],
+                )
+
+    def writer(self, settings_digest: str) -> "ManifestWriter":
+        """
+        Return a ManifestWriter for the parts of a new build, which replaces
+        the manifest once it is closed.
+        """
+        return ManifestWriter(self.path, settings_digest)
+
+
+class ManifestWriter:
+    """
+    Write the parts of a build to a temporary file next to the manifest,
+    which replaces the manifest when the writer is closed without error.
+    """
+
+    def __init__(self, path: str, settings_digest: str) -> None:
+        self._path = path
+        self._tmp_path = f"{path}.tmp"
+        self._fp: IO[str] = open(self._tmp_path, "w", encoding="utf-8")
+        self._write_line(
+            {"version": _MANIFEST_VERSION, "settings_digest": settings_digest}
+        )
+
+    def add_part(self, part: ManifestPart) -> None:
+        self._write_line(
+            {
+                "output_file": part.output_file,
+                "files": part.files,
+                "reserved_prefixes": part.reserved_prefixes,
+                "prefixes": part.prefixes,
+            }
+        )
+
+    def close(self) -> None:
+        self._fp.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self) -> None:
+        self._fp.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self) -> "ManifestWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _write_line(self, record: Dict[str, Any]) -> None:
+        self._fp.write(json.dumps(record, ensure_ascii=False))
+        self._fp.write("\n")
+
+
+def current_file_states(
+    files: Iterable[str], previous_states: Dict[str, FileState]
+) -> List[FileState]:
+    """
+    Return the states of files. The content hash of a file is taken from
+    previous_states if its modification time and size are unchanged, else
+    the file is read to compute the hash.
+
+    Archive members get the modification time and size of the archive, so
+    all members are hashed again if the archive changed.
+    """
+    states = []
+    for file_path in files:
+        member = split_member_path(file_path)
+        try:
+            stat = os.stat(file_path if member is None else member[0])
+        except OSError:
+            states.append((file_path, -1, -1, ""))
+            continue
+        mtime, size = stat.st_mtime_ns, stat.st_size
+        previous = previous_states.get(file_path)
+        if previous is not None and previous[1:3] == (mtime, size):
+            states.append(previous)
+            continue
+        try:
+            content_hash = _content_hash(file_path, member is not None)
+        except OSError:
+            states.append((file_path, -1, -1, ""))
+            continue
+        states.append((file_path, mtime, size, content_hash))
+    return states
+
+
+def settings_digest(partitioner: Partitioner, config: CorpusConfig) -> str:
+    """
+    Return a SHA-256 hex digest of the settings that affect the content of
+    the output files: the common header, the handling of @xml:id and
+    document identifiers, the cleaning of individual headers, processing
+    instructions and output compression. Settings that only change how the
+    output is produced (e.g. the number of workers) are not included.
+    """
+    docid_handler = partitioner.docid_handler
+    settings = {
+        "common_header": etree.tostring(
+            partitioner.header_handler.common_header(), encoding="unicode"
+        ),
+        "xmlid_handler": type(partitioner.xmlid_handler).__name__,
+        "docid_handler": (
+            None
+            if docid_handler is None
+            else f"{type(docid_handler).__name__}{sorted(vars(docid_handler).items())!r}"
+        ),
+        "clean_header": config.clean_header,
+        "processing_instructions": [
+            (pi.target, pi.text) for pi in config.processing_instructions or []
+        ],
+        "passthrough": config.passthrough,
+        "compression": config.compression,
+        "compress_workers": config.compress_workers > 1,
+    }
+    serialized = json.dumps(settings, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _content_hash(file_path: str, is_member: bool) -> str:
+    content_hash = hashlib.sha256()
+    if is_member:
+        content_hash.update(read_corpus_file(file_path))
+        return content_hash.hexdigest()
+    with open(file_path, "rb") as fp:
+        while chunk := fp.read(_HASH_BUFFER_SIZE):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
@@ -0,0 +1,87 @@
+import collections
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, Optional, Tuple
+
+from lxml import etree
+
+from tei_make_corpus.archive import parse_corpus_file
+
+
+class ParseAheadPool:
+    """
+    Parse TEI documents in a pool of threads ahead of the writer.
+
+    lxml releases the GIL while parsing, so the next documents can be read
+    and parsed while the main thread transforms and writes the current
+    one. Each thread uses its own parser. If the platform supports it, the
+    operating system is advised to read files into the page cache before
+    they are parsed.
+
+    threads:    number of threads used for parsing
+    lookahead:  maximal number of documents that are parsed ahead,
+                default is twice the number of threads
+    """
+
+    def __init__(self, threads: int, lookahead: Optional[int] = None) -> None:
+        self._threads = threads
+        self._lookahead = lookahead or 2 * threads
+        self._local = threading.local()
+
+    def parsed_documents(
+        self, files: Iterable[str]
+    ) -> Iterator[Tuple[str, Callable[[], etree._ElementTree]]]:
+        """
+        Yield pairs of file path and a function returning the parsed
+        document (or raising the parsing error) in the order of files.
+        """
+        # files that are prefetched, but not yet submitted for parsing
+        upcoming: Deque[str] = collections.deque()
+        pending: Deque[Tuple[str, Future]] = collections.deque()
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            for prefetch in files:
+                upcoming.append(prefetch)
+                if len(upcoming) <= self._lookahead:
+                    continue
+                file_path = upcoming.popleft()
+                pending.append(
+                    (file_path, executor.submit(self._parse, file_path, prefetch))
+                )
+                if len(pending) > self._lookahead:
+                    yield self._next_document(pending)
+            for file_path in upcoming:
+                pending.append(
+                    (file_path, executor.submit(self._parse, file_path, None))
+                )
+            while pending:
+                yield self._next_document(pending)
+
+    def _next_document(
+        self, pending: Deque[Tuple[str, Future]]
+    ) -> Tuple[str, Callable[[], etree._ElementTree]]:
+        file_path, future = pending.popleft()
+        return file_path, future.result
+
+    def _parse(self, file_path: str, prefetch: Optional[str]) -> etree._ElementTree:
+        if prefetch is not None:
+            _advise_will_need(prefetch)
+        parser = getattr(self._local, "parser", None)
+        if parser is None:
+            parser = self._local.parser = etree.XMLParser()
+        return parse_corpus_file(file_path, parser)
+
+
+def _advise_will_need(file_path: str) -> None:
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,12 +1,35 @@
+import contextlib
+import hashlib
+import io
 import logging
 from dataclasses import dataclass
-from typing import BinaryIO, List, Optional, Union
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Sized,
+    Union,
+)
 
 from lxml import etree
 
+from tei_make_corpus.archive import parse_corpus_file, read_corpus_file
+from tei_make_corpus.compression import open_compressed
 from tei_make_corpus.doc_id_handler import DocIdHandler
+from tei_make_corpus.document_pool import DocumentPool, serialize_tei_document
+from tei_make_corpus.fragment_cache import FragmentCache, fragment_key
 from tei_make_corpus.header_handler import TeiHeaderHandler
-from tei_make_corpus.xmlid_handler import XmlIdHandler
+from tei_make_corpus.parse_ahead import ParseAheadPool
+from tei_make_corpus.passthrough import read_unchanged_document
+from tei_make_corpus.pipeline import STAGES, DocumentPipeline
+from tei_make_corpus.streaming_transform import StreamingTransformer
+from tei_make_corpus.xmlid_handler import XmlIdHandler, XmlIdPrefixer, XmlIdRemover
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +46,9 @@ class Partition:
                         provides common corpus header and removes elements
                         in individual headers that are repeated in the
                         common header
-    files:              list of files paths
+    files:              file paths, either as sequence (e.g. list or range
+                        of a PathStore) or, if the files are streamed, as
+                        iterable
     xmlid_handler:      subclass of XmlIdHandler, handles @xml:id in
                         individual TEI documents
     clean_files:        flag determining if individual headers should be
@@ -35,20 +60,80 @@ class Partition:
     docid_handler:      implementation of DocIdHandler interface, allows
                         adding a document identifier to individual TEI
                         documents
+    workers:            number of workers used to prepare the TEI
+                        documents. Default is 1, i.e. the documents are
+                        processed in the main process.
+    backend:            kind of workers, 'process' (default) to parse and
+                        transform documents in worker processes, 'thread'
+                        to parse documents ahead in threads or 'pipeline'
+                        to process documents in a staged pipeline
+    stage_workers:      number of workers per stage of the pipeline
+                        ('read', 'transform', 'serialize'), stages that
+                        are not given use the number of workers
+    queue_size:         maximal number of documents in each queue of the
+                        pipeline, default is 64
+    schedule:           order in which documents are dispatched to worker
+                        processes, 'order' (default) for the order of the
+                        files or 'size' for large documents first
+    reorder_buffer:     intended maximal size in bytes of the files that
+                        are dispatched or held for writing with schedule
+                        'size', default is 500 MB
+    stream_threshold:   minimal size in bytes of files whose documents are
+                        transformed while they are parsed, without building
+                        the element tree of the whole document (only with
+                        a single worker). Default is None, i.e. no document
+                        is streamed.
+    passthrough:        flag determining if documents that wouldn't be
+                        changed (no @xml:id, no cleaning of headers and no
+                        document identifier) are copied to the output
+                        without parsing them (not with the 'thread' and
+                        'pipeline' backends). Default is false.
+    compression:        compression format of the output ('gzip', 'xz' or
+                        'zstd'), the output is compressed while it is
+                        written. Default is None, i.e. the output is not
+                        compressed.
+    compress_workers:   number of threads compressing blocks of the
+                        output concurrently, default is 1 (i.e. the output
+                        is compressed as a stream)
+    fragment_cache:     FragmentCache of transformed TEI documents, which
+                        are written from the cache instead of parsing the
+                        files again if the content of the file and the
+                        settings are unchanged (not with the 'thread' and
+                        'pipeline' backends and for streamed documents).
+                        Default is None, i.e. no cache is used.
+    file_sizes:         sizes in bytes of the files (in the order of files)
+                        as collected while the files were discovered, used
+                        to dispatch large documents first with schedule
+                        'size'. Default is None, i.e. the sizes are
+                        determined from the files if needed.
     """
 
     header_handler: TeiHeaderHandler
-    files: List[str]
+    files: Iterable[str]
     xmlid_handler: XmlIdHandler
     clean_files: bool = False
     processing_instructions: Optional[List[etree.PI]] = None
     docid_handler: Optional[DocIdHandler] = None
+    workers: int = 1
+    backend: str = "process"
+    stage_workers: Optional[Dict[str, int]] = None
+    queue_size: int = 64
+    schedule: str = "order"
+    reorder_buffer: int = 500_000_000
+    stream_threshold: Optional[int] = None
+    passthrough: bool = False
+    compression: Optional[str] = None
+    compress_workers: int = 1
+    fragment_cache: Optional[FragmentCache] = None
+    file_sizes: Optional[Sequence[int]] = None
 
     def write_partition(self, path: Union[str, BinaryIO]) -> None:
         """
         Write teiCorpus according to chosen settings to output stream.
         """
-        with etree.xmlfile(path, encoding="UTF-8") as xf:
+        with _open_binary(
+            path, self.compression, self.compress_workers
+        ) as output, etree.xmlfile(output, encoding="UTF-8") as xf:
             xf.write_declaration()
             if self.processing_instructions is not None:
                 for pi in self.processing_instructions:
@@ -57,16 +142,134 @@ class Partition:
                 xf.write("\n")
                 xf.write(self.header_handler.common_header())
                 xf.write("\n")
-                for tei_file in self.files:
-                    # clean individual header
-                    # remove xmlns from individual TEI node?
-                    # handle recurring id attributes
-                    xf.write(self._prepare_single_tei_file(tei_file))
-                    xf.write("\n")
+                if self.backend == "pipeline":
+                    stage_workers = {stage: self.workers for stage in STAGES}
+                    stage_workers.update(self.stage_workers or {})
+                    pipeline = DocumentPipeline(self, stage_workers, self.queue_size)
+
+                    def write_serialized(serialized: bytes) -> None:
+                        xf.flush()
+                        output.write(serialized)
+                        xf.write("\n")
+
+                    pipeline.write_documents(write_serialized)
+                elif self.workers > 1 and self.backend == "thread":
+                    parse_ahead = ParseAheadPool(self.workers)
+                    for tei_file, parse in parse_ahead.parsed_documents(self.files):
+                        xf.write(self._prepare_tei_document(tei_file, parse))
+                        xf.write("\n")
+                elif self.workers > 1:
+                    pool = DocumentPool(
+                        self, self.workers, self.schedule, self.reorder_buffer
+                    )
+                    for serialized in pool.serialized_documents():
+                        xf.flush()
+                        output.write(serialized)
+                        xf.write("\n")
+                else:
+                    streamer = None
+                    if self.stream_threshold is not None:
+                        streamer = StreamingTransformer(self, self.stream_threshold)
+                    for tei_file in self.files:
+                        document = self._read_unchanged_document(tei_file)
+                        if document is not None:
+                            xf.flush()
+                            output.write(document)
+                            xf.write("\n")
+                            continue
+                        if streamer is not None and streamer.streams(tei_file):
+                            xf.flush()
+                            streamer.write_document(tei_file, output.write)
+                            xf.write("\n")
+                            continue
+                        if self.fragment_cache is not None:
+                            xf.flush()
+                            output.write(self._prepare_cached_document(tei_file))
+                            xf.write("\n")
+                            continue
+                        # clean individual header
+                        # remove xmlns from individual TEI node?
+                        # handle recurring id attributes
+                        xf.write(self._prepare_single_tei_file(tei_file))
+                        xf.write("\n")
+
+    def skip_partition(self) -> None:
+        """
+        Account for the TEI documents of the partition without writing it.
+
+        If @xml:id attributes are prefixed, the prefixes of the documents are
+        generated (assuming all files contain valid TEI documents), so the
+        following partitions get the same prefixes as if this partition had
+        been written.
+        """
+        if isinstance(self.xmlid_handler, XmlIdPrefixer):
+            for file_path in self.files:
+                self.xmlid_handler.generate_prefix(file_path)
+
+    def _read_unchanged_document(self, file_path: str) -> Optional[bytes]:
+        # documents that wouldn't be changed are copied without parsing
+        if (
+            not self.passthrough
+            or self.clean_files
+            or self.docid_handler is not None
+            or not isinstance(self.xmlid_handler, (XmlIdRemover, XmlIdPrefixer))
+        ):
+            return None
+        document = read_unchanged_document(file_path)
+        if document is not None and isinstance(self.xmlid_handler, XmlIdPrefixer):
+            # the prefix is generated as for a parsed document, so the
+            # following documents get the same prefixes
+            self.xmlid_handler.generate_prefix(file_path)
+        return document
 
     def _prepare_single_tei_file(self, file_path: str) -> etree._Element:
+        return self._prepare_tei_document(
+            file_path, lambda: parse_corpus_file(file_path)
+        )
+
+    def _prepare_cached_document(self, file_path: str) -> bytes:
+        # the serialized document is taken from the fragment cache if a file
+        # with the same content was transformed with the same settings
+        assert self.fragment_cache is not None
+        content = read_corpus_file(file_path)
+        key = fragment_key(content, self._fragment_settings(file_path))
+        fragment = self.fragment_cache.get(key)
+        if fragment is not None:
+            if isinstance(self.xmlid_handler, XmlIdPrefixer):
+                self.xmlid_handler.generate_prefix(file_path)
+            return fragment
+        root = self._prepare_tei_document(
+            file_path, lambda: etree.parse(io.BytesIO(content))
+        )
+        if root is None:
+            return b""
+        fragment = serialize_tei_document(root)
+        self.fragment_cache.put(key, fragment)
+        return fragment
+
+    def _fragment_settings(self, file_path: str) -> Dict[str, Any]:
+        # the values that change the transformed document of file_path
+        settings: Dict[str, Any] = {"xmlid": type(self.xmlid_handler).__name__}
+        if isinstance(self.xmlid_handler, XmlIdPrefixer):
+            settings["xmlid"] = self.xmlid_handler.next_prefix(file_path)
+        if self.clean_files:
+            settings["common_header"] = hashlib.sha256(
+                etree.tostring(self.header_handler.common_header())
+            ).hexdigest()
+        if self.docid_handler is not None:
+            # the document identifier is derived from the file path
+            settings["docid"] = [
+                type(self.docid_handler).__name__,
+                repr(sorted(vars(self.docid_handler).items())),
+                file_path,
+            ]
+        return settings
+
+    def _prepare_tei_document(
+        self, file_path: str, parse: Callable[[], etree._ElementTree]
+    ) -> etree._Element:
         try:
-            doc = etree.parse(file_path)
+            doc = parse()
         except etree.XMLSyntaxError:
             logger.exception("File ommitted: %s" % file_path)
             return None
@@ -82,5 +285,25 @@ class Partition:
             self.docid_handler.add_doc_id(root, file_path)
         return root
 
-    def __len__(self):
+    def __len__(self) -> int:
+        if not isinstance(self.files, Sized):
+            raise TypeError("Number of streamed files is unknown")
         return len(self.files)
+
+
+@contextlib.contextmanager
+def _open_binary(
+    path: Union[str, BinaryIO],
+    compression: Optional[str] = None,
+    compress_workers: int = 1,
+) -> Iterator[BinaryIO]:
+    with contextlib.ExitStack() as stack:
+        if isinstance(path, str):
+            output: BinaryIO = stack.enter_context(open(path, "wb"))
+        else:
+            output = path
+        if compression is not None:
+            output = stack.enter_context(
+                open_compressed(output, compression, compress_workers)
+            )
+        yield output
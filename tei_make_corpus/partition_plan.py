@@ -0,0 +1,64 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from tei_make_corpus.partition import Partition
+
+
+@dataclass
+class PartitionPlan:
+    """
+    The Partitions of a split corpus, paired with their output files and
+    assigned to shards.
+
+    The plan is built from the Partitions in the order they are yielded by
+    the Partitioner, so it is the same on every node that builds the same
+    corpus with the same configuration. The output files are numbered
+    across all shards, i.e. the output files of all shards together are the
+    same as the output files of a build without shards. The Partitions are
+    assigned to the shards round-robin.
+
+    partitions: pairs of Partition (with a list of files) and the path of
+                its output file
+    shards:     number of shards
+    """
+
+    partitions: List[Tuple[Partition, str]]
+    shards: int = 1
+
+    def shard_of(self, index: int) -> int:
+        """
+        Return the shard (counting from 1) of the Partition at index.
+        """
+        return index % self.shards + 1
+
+    def digest(self) -> str:
+        """
+        Return a SHA-256 hex digest of the plan. Nodes that work from the
+        same list of files and configuration have the same digest.
+        """
+        serialized = json.dumps(self._as_dict(), ensure_ascii=False)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def export(self, file_path: str) -> None:
+        """
+        Write the plan and its digest as JSON to file_path.
+        """
+        plan = self._as_dict()
+        plan["digest"] = self.digest()
+        with open(file_path, "w", encoding="utf-8") as fp:
+            json.dump(plan, fp, ensure_ascii=False, indent=1)
+
+    def _as_dict(self) -> Dict[str, Any]:
+        return {
+            "shards": self.shards,
+            "partitions": [
+                {
+                    "output_file": output_file,
+                    "shard": self.shard_of(i),
+                    "files": list(partition.files),
+                }
+                for i, (partition, output_file) in enumerate(self.partitions)
+            ],
+        }
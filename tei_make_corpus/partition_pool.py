@@ -0,0 +1,161 @@
+import collections
+import dataclasses
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, List, Optional, Sequence, Set, Tuple
+
+from lxml import etree
+
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.xmlid_handler import (
+    PresetXmlIdPrefixer,
+    XmlIdHandler,
+    XmlIdPrefixer,
+    reserve_prefixes_for_parts,
+)
+
+# the Partition without files the worker process uses as template, set by
+# _init_worker
+_worker_template: Optional[Partition] = None
+
+# file paths and the prefixes that were used for them
+UsedPrefixes = List[Tuple[str, str]]
+
+
+class _RecordingPrefixer(XmlIdPrefixer):
+    """
+    XmlIdPrefixer that keeps track of the prefixes it generated.
+    """
+
+    def __init__(self, reserved_prefixes: Iterable[str] = ()) -> None:
+        super().__init__(reserved_prefixes)
+        self.used_prefixes: UsedPrefixes = []
+
+    def generate_prefix(self, file_path: str) -> str:
+        prefix = super().generate_prefix(file_path)
+        self.used_prefixes.append((file_path, prefix))
+        return prefix
+
+
+def _init_worker(template: Partition, pis: List[Tuple[str, Optional[str]]]) -> None:
+    global _worker_template
+    # processing instructions can't be pickled
+    _worker_template = dataclasses.replace(
+        template,
+        processing_instructions=[etree.PI(target, text) for target, text in pis]
+        or None,
+    )
+
+
+def _write_partition(
+    files: List[str], path: str, reserved_prefixes: Optional[Set[str]]
+) -> Optional[UsedPrefixes]:
+    assert _worker_template is not None
+    partition = dataclasses.replace(_worker_template, files=files)
+    if reserved_prefixes is None:
+        partition.write_partition(path)
+        return None
+    prefixer = _RecordingPrefixer(reserved_prefixes)
+    partition.xmlid_handler = prefixer
+    partition.write_partition(path)
+    return prefixer.used_prefixes
+
+
+class PartitionPool:
+    """
+    Write Partitions to their output files concurrently, each in a worker
+    process.
+
+    The Partitions share their configuration (handlers, processing
+    instructions and flags), which is sent to each worker process once.
+    If @xml:id prefixes are added, each worker is assigned the prefixes
+    already in use under the assumption that all preceding documents are
+    valid TEI documents. The prefixes actually used are verified in the
+    order of the partitions and a partition is written again in the main
+    process if an omitted document shifted its prefixes, so the output is
+    identical to writing the partitions one after another.
+
+    Partitions paired with None instead of a file path are not written,
+    but the prefixes of their documents are accounted for (see
+    Partition.skip_partition).
+
+    workers:    number of partitions that are written concurrently
+    """
+
+    def __init__(self, workers: int) -> None:
+        self._workers = workers
+
+    def write_partitions(
+        self, partitions: Sequence[Tuple[Partition, Optional[str]]]
+    ) -> None:
+        """
+        Write each Partition to the file path it is paired with.
+        """
+        if not partitions:
+            return
+        template = partitions[0][0]
+        xmlid_handler = template.xmlid_handler
+        pis = [(pi.target, pi.text) for pi in template.processing_instructions or []]
+        worker_template = dataclasses.replace(
+            template,
+            files=[],
+            file_sizes=None,
+            processing_instructions=None,
+            workers=1,
+        )
+        reserved = self._reserved_prefixes(
+            [partition for partition, _ in partitions], xmlid_handler
+        )
+        pending: Deque[
+            Tuple[Partition, Optional[str], Optional[Future]]
+        ] = collections.deque()
+        with ProcessPoolExecutor(
+            max_workers=self._workers,
+            initializer=_init_worker,
+            initargs=(worker_template, pis),
+        ) as executor:
+            for (partition, path), reserved_prefixes in zip(partitions, reserved):
+                future = None
+                if path is not None:
+                    future = executor.submit(
+                        _write_partition, list(partition.files), path, reserved_prefixes
+                    )
+                pending.append((partition, path, future))
+            while pending:
+                partition, path, future = pending.popleft()
+                if path is None or future is None:
+                    partition.skip_partition()
+                    continue
+                used_prefixes = future.result()
+                if used_prefixes is not None and isinstance(
+                    xmlid_handler, XmlIdPrefixer
+                ):
+                    self._verify_prefixes(partition, path, xmlid_handler, used_prefixes)
+
+    def _reserved_prefixes(
+        self, partitions: List[Partition], xmlid_handler: XmlIdHandler
+    ) -> List[Optional[Set[str]]]:
+        if not isinstance(xmlid_handler, XmlIdPrefixer):
+            return [None for _ in partitions]
+        return list(
+            reserve_prefixes_for_parts(
+                xmlid_handler, (partition.files for partition in partitions)
+            )
+        )
+
+    def _verify_prefixes(
+        self,
+        partition: Partition,
+        path: str,
+        xmlid_handler: XmlIdPrefixer,
+        used_prefixes: UsedPrefixes,
+    ) -> None:
+        assigned_prefixes = [
+            xmlid_handler.generate_prefix(file_path) for file_path, _ in used_prefixes
+        ]
+        if assigned_prefixes == [prefix for _, prefix in used_prefixes]:
+            return
+        dataclasses.replace(
+            partition,
+            xmlid_handler=PresetXmlIdPrefixer(assigned_prefixes),
+            workers=1,
+        ).write_partition(path)
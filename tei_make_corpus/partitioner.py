@@ -1,16 +1,34 @@
+import array
+import itertools
 from dataclasses import dataclass
-from typing import Generator, List, Optional, Tuple
+from typing import (
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
 from lxml import etree
 
 from tei_make_corpus.cli.corpus_config import CorpusConfig
 from tei_make_corpus.doc_id_handler import DocIdHandler
-from tei_make_corpus.file_size_estimator import FileSizeEstimator
+from tei_make_corpus.fragment_cache import FragmentCache
 from tei_make_corpus.header_handler import TeiHeaderHandler
 from tei_make_corpus.partition import Partition
-from tei_make_corpus.path_finder import PathFinder
+from tei_make_corpus.path_finder import FileRecord, PathFinder
+from tei_make_corpus.path_store import PathStore
 from tei_make_corpus.xmlid_handler import XmlIdHandler
 
+T = TypeVar("T")
+
+# file paths of a part and their sizes, if they were collected
+FileChunk = Tuple[Iterable[str], Optional[Sequence[int]]]
+
 
 @dataclass
 class Partitioner:
@@ -23,9 +41,7 @@ class Partitioner:
                         in individual headers that are repeated in the
                         common header
     path_finder:        implementation of PathFinder protocol, provides
-                        list of file paths for the corpus
-    size_estimator:     implementation of FileSizeEstimator protocol,
-                        provides file sizes of corpus files
+                        list of file paths (and their sizes) for the corpus
     xmlid_handler:      subclass of XmlIdHandler, handles @xml:id in
                         individual TEI documents
     docid_handler:      implementation of DocIdHandler interface, allows
@@ -35,7 +51,6 @@ class Partitioner:
 
     header_handler: TeiHeaderHandler
     path_finder: PathFinder
-    size_estimator: FileSizeEstimator
     xmlid_handler: XmlIdHandler
     docid_handler: Optional[DocIdHandler] = None
 
@@ -55,11 +70,35 @@ class Partitioner:
         docs_per_file = -1
         doc_size = -1
         processing_instructions = None
+        workers = 1
+        backend = "process"
+        stage_workers = None
+        queue_size = 64
+        schedule = "order"
+        reorder_buffer = 500_000_000
+        stream_threshold = None
+        passthrough = False
+        compression = None
+        compress_workers = 1
+        fragment_cache = None
+        discovery = "sort"
         if config is not None:
             clean = config.clean_header
             docs_per_file = config.split_docs
             doc_size = config.split_size
             processing_instructions = config.processing_instructions
+            workers = config.workers
+            backend = config.backend
+            stage_workers = config.stage_workers
+            queue_size = config.queue_size
+            schedule = config.schedule
+            reorder_buffer = config.reorder_buffer
+            stream_threshold = config.stream_threshold
+            passthrough = config.passthrough
+            compression = config.compression
+            compress_workers = config.compress_workers
+            fragment_cache = _create_fragment_cache(config)
+            discovery = config.discovery
         return self._determine_partitions(
             corpus_dir,
             header_file,
@@ -67,6 +106,47 @@ class Partitioner:
             docs_per_file=docs_per_file,
             doc_size=doc_size,
             xml_processing_instructions=processing_instructions,
+            workers=workers,
+            backend=backend,
+            stage_workers=stage_workers,
+            queue_size=queue_size,
+            schedule=schedule,
+            reorder_buffer=reorder_buffer,
+            stream_threshold=stream_threshold,
+            passthrough=passthrough,
+            compression=compression,
+            compress_workers=compress_workers,
+            fragment_cache=fragment_cache,
+            discovery=discovery,
+        )
+
+    def partition_for_files(
+        self, files: Iterable[str], config: Optional[CorpusConfig] = None
+    ) -> Partition:
+        """
+        Create a Partition for files, configured like the Partitions
+        returned by get_partitions.
+        """
+        if config is None:
+            config = CorpusConfig(clean_header=False)
+        return Partition(
+            self.header_handler,
+            files,
+            self.xmlid_handler,
+            clean_files=config.clean_header,
+            processing_instructions=config.processing_instructions,
+            docid_handler=self.docid_handler,
+            workers=config.workers,
+            backend=config.backend,
+            stage_workers=config.stage_workers,
+            queue_size=config.queue_size,
+            schedule=config.schedule,
+            reorder_buffer=config.reorder_buffer,
+            stream_threshold=config.stream_threshold,
+            passthrough=config.passthrough,
+            compression=config.compression,
+            compress_workers=config.compress_workers,
+            fragment_cache=_create_fragment_cache(config),
         )
 
     def _determine_partitions(
@@ -77,72 +157,249 @@ class Partitioner:
         docs_per_file: int = -1,
         doc_size: int = -1,
         xml_processing_instructions: Optional[List[etree.PI]] = None,
+        workers: int = 1,
+        backend: str = "process",
+        stage_workers: Optional[Dict[str, int]] = None,
+        queue_size: int = 64,
+        schedule: str = "order",
+        reorder_buffer: int = 500_000_000,
+        stream_threshold: Optional[int] = None,
+        passthrough: bool = False,
+        compression: Optional[str] = None,
+        compress_workers: int = 1,
+        fragment_cache: Optional[FragmentCache] = None,
+        discovery: str = "sort",
     ) -> Generator[Partition, None, None]:
-        all_files = self.path_finder.get_paths_for_corpus_files(corpus_dir, header_file)
-        total_number_files = len(all_files)
-        if doc_size != -1:
-            index_pairs = self._determine_chunk_indices_file_size(all_files, doc_size)
+        # the sizes of the files are kept if they are collected anyway or
+        # needed to dispatch large documents first
+        with_sizes = doc_size != -1 or schedule == "size"
+        file_chunks: Iterator[FileChunk]
+        if discovery == "sort":
+            file_chunks = self._sorted_file_chunks(
+                corpus_dir, header_file, docs_per_file, doc_size, with_sizes
+            )
         else:
-            index_pairs = self._determine_chunk_indices_num_docs(
-                total_number_files, docs_per_file
+            file_chunks = self._streamed_file_chunks(
+                corpus_dir, header_file, docs_per_file, doc_size, discovery, with_sizes
             )
-        for start_index, end_index in index_pairs:
+        for files, file_sizes in file_chunks:
             yield Partition(
                 self.header_handler,
-                all_files[start_index:end_index],
+                files,
                 self.xmlid_handler,
                 clean_files=clean_files,
                 processing_instructions=xml_processing_instructions,
                 docid_handler=self.docid_handler,
+                workers=workers,
+                backend=backend,
+                stage_workers=stage_workers,
+                queue_size=queue_size,
+                schedule=schedule,
+                reorder_buffer=reorder_buffer,
+                stream_threshold=stream_threshold,
+                passthrough=passthrough,
+                compression=compression,
+                compress_workers=compress_workers,
+                fragment_cache=fragment_cache,
+                file_sizes=file_sizes,
             )
 
-    def _determine_chunk_indices_num_docs(
-        self, total_num_of_files: int, intended_chunk_size: int
-    ) -> List[Tuple[int, int]]:
-        if total_num_of_files == 0:
-            return []
-        if intended_chunk_size == -1 or total_num_of_files < intended_chunk_size:
-            return [(0, total_num_of_files)]
-        num_chunks = total_num_of_files // intended_chunk_size
-        # check if last chunk would be smaller than 30% of intended chunk size
-        # if yes, distribute files evenly
-        if (
-            0
-            < total_num_of_files - (num_chunks * intended_chunk_size)
-            < intended_chunk_size * 0.3
-        ):
-            indices = []
-            start = 0
-            for i in range(1, num_chunks + 1):
-                end = int(round(i * (total_num_of_files / num_chunks)))
-                indices.append((start, end))
-                start = end
-            return indices
-        return [
-            (i, i + intended_chunk_size)
-            for i in range(0, total_num_of_files, intended_chunk_size)
-        ]
-
-    def _determine_chunk_indices_file_size(
-        self, all_files: List[str], intended_doc_size: int
-    ) -> List[Tuple[int, int]]:
-        file_sizes = self.size_estimator.determine_file_sizes(all_files)
-        if not file_sizes:
-            return []
-        if sum(file_sizes) <= intended_doc_size:
-            return [(0, len(all_files))]
-        indices = []
+    def _sorted_file_chunks(
+        self,
+        corpus_dir: str,
+        header_file: str,
+        docs_per_file: int,
+        doc_size: int,
+        with_sizes: bool = False,
+    ) -> Iterator[FileChunk]:
+        # the file paths are kept in a compact PathStore (and the sizes in an
+        # array), the parts are ranges of the store; the sorted paths are
+        # added to the store while they are discovered, so a list of all
+        # paths isn't built
+        all_sizes = None
+        if with_sizes:
+            all_sizes = array.array("q")
+            file_records = (
+                self.path_finder.iter_sorted_paths_and_sizes_for_corpus_files(
+                    corpus_dir, header_file
+                )
+            )
+            all_files = PathStore(_collect_sizes(file_records, all_sizes))
+        else:
+            all_files = PathStore(
+                self.path_finder.iter_sorted_paths_for_corpus_files(
+                    corpus_dir, header_file
+                )
+            )
+        if doc_size != -1:
+            assert all_sizes is not None
+            index_pairs = determine_chunk_indices_file_size(all_sizes, doc_size)
+        else:
+            index_pairs = determine_chunk_indices_num_docs(
+                len(all_files), docs_per_file
+            )
+        for start_index, end_index in index_pairs:
+            yield (
+                all_files[start_index:end_index],
+                None if all_sizes is None else all_sizes[start_index:end_index],
+            )
+
+    def _streamed_file_chunks(
+        self,
+        corpus_dir: str,
+        header_file: str,
+        docs_per_file: int,
+        doc_size: int,
+        discovery: str,
+        with_sizes: bool = False,
+    ) -> Iterator[FileChunk]:
+        # partitions are determined while the files are discovered, without
+        # collecting all file paths first
+        if with_sizes and (doc_size != -1 or docs_per_file != -1):
+            if discovery == "external-sort":
+                file_records = (
+                    self.path_finder.iter_sorted_paths_and_sizes_for_corpus_files(
+                        corpus_dir, header_file
+                    )
+                )
+            else:
+                file_records = self.path_finder.iter_paths_and_sizes_for_corpus_files(
+                    corpus_dir, header_file
+                )
+            if doc_size != -1:
+                return self._stream_chunks_file_size(file_records, doc_size)
+            return (
+                ([path for path, _ in records], [size for _, size in records])
+                for records in self._stream_chunks_num_docs(file_records, docs_per_file)
+            )
+        if discovery == "external-sort":
+            paths = self.path_finder.iter_sorted_paths_for_corpus_files(
+                corpus_dir, header_file
+            )
+        else:
+            paths = self.path_finder.iter_paths_for_corpus_files(
+                corpus_dir, header_file
+            )
+        if docs_per_file != -1:
+            return (
+                (files, None)
+                for files in self._stream_chunks_num_docs(paths, docs_per_file)
+            )
+        # a single streamed part isn't held in memory, so the sizes of its
+        # files are determined from the files if needed
+        return self._stream_single_chunk(paths)
+
+    def _stream_single_chunk(self, paths: Iterator[str]) -> Iterator[FileChunk]:
+        first_path = next(paths, None)
+        if first_path is not None:
+            yield itertools.chain([first_path], paths), None
+
+    def _stream_chunks_num_docs(
+        self, items: Iterator[T], intended_chunk_size: int
+    ) -> Iterator[List[T]]:
+        chunk = list(itertools.islice(items, intended_chunk_size))
+        while chunk:
+            next_chunk = list(itertools.islice(items, intended_chunk_size))
+            # the total number of files is unknown, so instead of distributing
+            # all files evenly, a small last chunk is added to the previous one
+            if 0 < len(next_chunk) < intended_chunk_size * 0.3:
+                chunk.extend(next_chunk)
+                next_chunk = []
+            yield chunk
+            chunk = next_chunk
+
+    def _stream_chunks_file_size(
+        self, file_records: Iterator[FileRecord], intended_doc_size: int
+    ) -> Iterator[FileChunk]:
+        chunk: List[str] = []
+        sizes: List[int] = []
         summed_size = 0
-        start = 0
-        i = 0
-        for i, size in enumerate(file_sizes):
+        for path, size in file_records:
+            chunk.append(path)
+            sizes.append(size)
             summed_size += size
             if summed_size >= intended_doc_size:
-                end = i + 1
-                indices.append((start, end))
-                start = end
+                yield chunk, sizes
+                chunk = []
+                sizes = []
                 summed_size = 0
-        else:
-            if start < i + 1:
-                indices.append((start, i + 1))
+        if chunk:
+            yield chunk, sizes
+
+
+def determine_chunk_indices_num_docs(
+    total_num_of_files: int, intended_chunk_size: int
+) -> List[Tuple[int, int]]:
+    """
+    Return pairs of start and end index of the chunks if total_num_of_files
+    are split into chunks of intended_chunk_size (-1: a single chunk). If
+    the last chunk would contain less than 30% of intended_chunk_size, the
+    files are distributed evenly instead.
+    """
+    if total_num_of_files == 0:
+        return []
+    if intended_chunk_size == -1 or total_num_of_files < intended_chunk_size:
+        return [(0, total_num_of_files)]
+    num_chunks = total_num_of_files // intended_chunk_size
+    # check if last chunk would be smaller than 30% of intended chunk size
+    # if yes, distribute files evenly
+    if (
+        0
+        < total_num_of_files - (num_chunks * intended_chunk_size)
+        < intended_chunk_size * 0.3
+    ):
+        indices = []
+        start = 0
+        for i in range(1, num_chunks + 1):
+            end = int(round(i * (total_num_of_files / num_chunks)))
+            indices.append((start, end))
+            start = end
         return indices
+    return [
+        (i, i + intended_chunk_size)
+        for i in range(0, total_num_of_files, intended_chunk_size)
+    ]
+
+
+def determine_chunk_indices_file_size(
+    sizes: Sequence[int], intended_doc_size: int
+) -> List[Tuple[int, int]]:
+    """
+    Return pairs of start and end index of the chunks if files with sizes
+    are split into chunks of intended_doc_size bytes. A chunk is completed
+    with the file that reaches intended_doc_size.
+    """
+    if not sizes:
+        return []
+    if sum(sizes) <= intended_doc_size:
+        return [(0, len(sizes))]
+    indices = []
+    summed_size = 0
+    start = 0
+    i = 0
+    for i, size in enumerate(sizes):
+        summed_size += size
+        if summed_size >= intended_doc_size:
+            end = i + 1
+            indices.append((start, end))
+            start = end
+            summed_size = 0
+    else:
+        if start < i + 1:
+            indices.append((start, i + 1))
+    return indices
+
+
+def _create_fragment_cache(config: CorpusConfig) -> Optional[FragmentCache]:
+    if config.fragment_cache is None:
+        return None
+    return FragmentCache(config.fragment_cache, config.fragment_cache_size)
+
+
+def _collect_sizes(
+    file_records: Iterable[FileRecord], sizes: "array.array[int]"
+) -> Iterator[str]:
+    # yield the file paths of file_records, appending their sizes to sizes
+    for file_path, size in file_records:
+        sizes.append(size)
+        yield file_path
@@ -0,0 +1,75 @@
+import re
+from typing import Optional
+
+from lxml import etree
+
+from tei_make_corpus.archive import read_corpus_file
+
+# XML declaration, document type declaration without internal subset,
+# comments and processing instructions before the root element
+_PROLOG = re.compile(
+    rb"(?:\xef\xbb\xbf)?(?:<\?xml\s(?P<declaration>[^>]*)\?>)?"
+    rb"(?:\s+|<!--.*?-->|<\?.*?\?>|<!DOCTYPE\s[^[>]*>)*",
+    re.DOTALL,
+)
+
+_ENCODING = re.compile(rb"""encoding\s*=\s*["']([^"']*)["']""")
+
+_ROOT_START_TAG = re.compile(rb"<(?:[^\s/>:]+:)?TEI[\s/>]")
+
+_ROOT_END_TAG = re.compile(rb"</(?:[^\s/>:]+:)?TEI\s*>\Z")
+
+# the end tag of the root element is looked for at the end of the file
+_MAX_END_TAG_LENGTH = 256
+
+_UTF8_ENCODINGS = {b"utf-8", b"utf8", b"us-ascii", b"ascii"}
+
+
+def read_unchanged_document(file_path: str) -> Optional[bytes]:
+    """
+    Return the TEI document in file_path as it is written to the corpus
+    if it can be copied without parsing it, i.e. the document doesn't
+    contain @xml:id attributes, or None otherwise.
+
+    The XML declaration, the document type declaration and comments or
+    processing instructions before the root element are stripped, the
+    root element is copied as it is. Documents that are not encoded in
+    UTF-8, declare entities in an internal subset of the document type
+    declaration, have no <TEI> root element or content after the root
+    element are not copied. Neither are documents that are not
+    well-formed; they are checked by parsing them without building a
+    tree, so the error is logged when they are parsed to be written.
+    """
+    content = read_corpus_file(file_path)
+    if b"xml:id" in content:
+        return None
+    prolog = _PROLOG.match(content)
+    assert prolog is not None
+    declaration = prolog.group("declaration")
+    if declaration is not None:
+        encoding = _ENCODING.search(declaration)
+        if encoding is not None and encoding.group(1).lower() not in _UTF8_ENCODINGS:
+            return None
+    if not _ROOT_START_TAG.match(content, prolog.end()):
+        return None
+    content = content.rstrip()
+    end_tag = _ROOT_END_TAG.search(
+        content, max(prolog.end(), len(content) - _MAX_END_TAG_LENGTH)
+    )
+    if end_tag is None or not _is_well_formed(content):
+        return None
+    return content[prolog.end():]
+
+
+class _DiscardingTarget:
+    # parser target that doesn't build a tree
+    def close(self) -> None:
+        return None
+
+
+def _is_well_formed(content: bytes) -> bool:
+    try:
+        etree.fromstring(content, etree.XMLParser(target=_DiscardingTarget()))
+    except etree.XMLSyntaxError:
+        return False
+    return True
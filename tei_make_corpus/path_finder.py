@@ -1,5 +1,19 @@
+import heapq
+import itertools
 import os
-from typing import List, Protocol
+import pickle
+import tempfile
+from typing import IO, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from tei_make_corpus.compression import is_corpus_file_name, uncompressed_size
+from tei_make_corpus.directory_walker import (
+    CachedDirectoryWalker,
+    ParallelDirectoryWalker,
+    walk_directory_tree,
+)
+
+# file path and file size in bytes
+FileRecord = Tuple[str, int]
 
 
 class PathFinder(Protocol):
@@ -16,23 +30,236 @@ class PathFinder(Protocol):
         """
         ...
 
+    def iter_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[str]:
+        """
+        Yields the file paths in corpus_dir while they are discovered.
+        """
+        ...
+
+    def iter_sorted_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[str]:
+        """
+        Yields the file paths in corpus_dir in the order of
+        get_paths_for_corpus_files without holding all of them in memory.
+        """
+        ...
+
+    def get_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> List[FileRecord]:
+        """
+        Returns a list of pairs of file path and file size (in bytes) of all
+        files in corpus_dir, in the order of get_paths_for_corpus_files.
+        """
+        ...
+
+    def iter_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        """
+        Yields pairs of file path and file size in the order of
+        iter_paths_for_corpus_files.
+        """
+        ...
+
+    def iter_sorted_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        """
+        Yields pairs of file path and file size in the order of
+        iter_sorted_paths_for_corpus_files.
+        """
+        ...
+
 
 class PathFinderImpl:
+    def __init__(
+        self,
+        sort_buffer_size: int = 1_000_000,
+        walk_threads: int = 1,
+        listing_cache: Optional[str] = None,
+    ) -> None:
+        """
+        sort_buffer_size:   maximal number of file paths that are held in
+                            memory by iter_sorted_paths_for_corpus_files and
+                            iter_sorted_paths_and_sizes_for_corpus_files
+        walk_threads:       number of directories that are listed
+                            concurrently, see ParallelDirectoryWalker;
+                            the order of the file paths is the same for any
+                            number of threads
+        listing_cache:      path of a database in which the listings of the
+                            directories are kept between runs, see
+                            CachedDirectoryWalker; only directories that
+                            changed since the previous run are listed (with
+                            a single thread). The file sizes are taken from
+                            the cache as well.
+        """
+        self._sort_buffer_size = sort_buffer_size
+        self._walk_threads = walk_threads
+        self._listing_cache = listing_cache
+
     def get_paths_for_corpus_files(
         self, corpus_dir: str, header_file: str
     ) -> List[str]:
         """
         Return a sorted list of all xml file paths in corpus_dir.
 
-        Files that don't end in '.xml' are excluded. If the file containing
+        Files that don't end in '.xml' (or '.xml' followed by the extension
+        of a supported compression format, e.g. '.xml.gz') are excluded. If the file containing
         the common header is located on a path under corpus_dir, it is
         ignored as well.
         """
+        if self._walk_threads > 1 or self._listing_cache is not None:
+            return sorted(self.iter_paths_for_corpus_files(corpus_dir, header_file))
         return sorted(
             (
                 os.path.join(root, file)
                 for root, dirs, files in os.walk(corpus_dir)
                 for file in files
-                if file != os.path.basename(header_file) and file.endswith(".xml")
+                if file != os.path.basename(header_file) and is_corpus_file_name(file)
             )
         )
+
+    def iter_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[str]:
+        """
+        Yield all xml file paths in corpus_dir while the directory tree
+        is walked.
+
+        The order is deterministic, but not globally sorted: the files of
+        a directory are yielded in sorted order, followed by the files of
+        its subdirectories (in sorted order of the subdirectories).
+        The same files as in get_paths_for_corpus_files are excluded.
+        """
+        if self._listing_cache is not None:
+            for file_path, _ in self._cached_corpus_files(corpus_dir, header_file):
+                yield file_path
+            return
+        for entry in self._scan_corpus_files(corpus_dir, header_file):
+            yield entry.path
+
+    def iter_sorted_paths_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[str]:
+        """
+        Yield all xml file paths in corpus_dir in sorted order, i.e. in the
+        same order as get_paths_for_corpus_files.
+
+        The paths are sorted with an external merge sort: sorted runs of
+        at most sort_buffer_size paths are written to temporary files and
+        merged afterwards.
+        """
+        return self._external_sort(
+            self.iter_paths_for_corpus_files(corpus_dir, header_file)
+        )
+
+    def get_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> List[FileRecord]:
+        """
+        Return a list of pairs of file path and file size in bytes of all
+        xml files in corpus_dir, sorted by file path.
+
+        The sizes are taken from the directory entries while the directory
+        tree is scanned, so no separate pass over the files is needed.
+        """
+        return sorted(
+            self.iter_paths_and_sizes_for_corpus_files(corpus_dir, header_file)
+        )
+
+    def iter_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        """
+        Yield pairs of file path and file size in bytes of all xml files in
+        corpus_dir in the order of iter_paths_for_corpus_files.
+        """
+        if self._listing_cache is not None:
+            yield from self._cached_corpus_files(corpus_dir, header_file)
+            return
+        for entry in self._scan_corpus_files(corpus_dir, header_file, stat=True):
+            yield entry.path, _entry_size(entry)
+
+    def iter_sorted_paths_and_sizes_for_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        """
+        Yield pairs of file path and file size in bytes of all xml files in
+        corpus_dir, sorted by file path with an external merge sort (see
+        iter_sorted_paths_for_corpus_files).
+        """
+        return self._external_sort(
+            self.iter_paths_and_sizes_for_corpus_files(corpus_dir, header_file)
+        )
+
+    def _scan_corpus_files(
+        self, corpus_dir: str, header_file: str, stat: bool = False
+    ) -> Iterator[os.DirEntry]:
+        # same traversal as os.walk, but with sorted entries
+        if self._walk_threads > 1:
+            entries = ParallelDirectoryWalker(self._walk_threads, stat=stat).walk(
+                corpus_dir
+            )
+        else:
+            entries = walk_directory_tree(corpus_dir)
+        header_file_name = os.path.basename(header_file)
+        for entry in entries:
+            if entry.name != header_file_name and is_corpus_file_name(entry.name):
+                yield entry
+
+    def _cached_corpus_files(
+        self, corpus_dir: str, header_file: str
+    ) -> Iterator[FileRecord]:
+        # the sizes of the files are stored in the listing cache
+        assert self._listing_cache is not None
+        walker = CachedDirectoryWalker(
+            self._listing_cache, _entry_size, is_corpus_file_name
+        )
+        header_file_name = os.path.basename(header_file)
+        for file_path, size in walker.walk(corpus_dir):
+            if os.path.basename(file_path) != header_file_name:
+                yield file_path, size
+
+    def _external_sort(self, items: Iterator) -> Iterator:
+        chunk = sorted(itertools.islice(items, self._sort_buffer_size))
+        if len(chunk) < self._sort_buffer_size:
+            yield from chunk
+            return
+        runs: List[IO[bytes]] = []
+        try:
+            while chunk:
+                run = tempfile.TemporaryFile()
+                runs.append(run)
+                _write_run(run, chunk)
+                chunk = sorted(itertools.islice(items, self._sort_buffer_size))
+            yield from heapq.merge(*(_read_run(sorted_run) for sorted_run in runs))
+        finally:
+            for sorted_run in runs:
+                sorted_run.close()
+
+
+def _entry_size(entry: os.DirEntry) -> int:
+    # a broken symbolic link has no size; for compressed files, the
+    # uncompressed size is used
+    try:
+        return uncompressed_size(entry.path, entry.stat().st_size)
+    except OSError:
+        return 0
+
+
+def _write_run(run: IO[bytes], items: Iterable) -> None:
+    for item in items:
+        pickle.dump(item, run)
+    run.seek(0)
+
+
+def _read_run(run: IO[bytes]) -> Iterator:
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
@@ -0,0 +1,168 @@
+import itertools
+import os
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Union, overload
+
+# number of paths that are added to the store at once
+_CHUNK_SIZE = 100_000
+
+
+def _last_separator(path: str) -> int:
+    # index of the last path separator or -1
+    if os.altsep is None:
+        return path.rfind(os.sep)
+    return max(path.rfind(os.sep), path.rfind(os.altsep))
+
+
+class PathStore(Sequence[str]):
+    """
+    Compact sequence of file paths.
+
+    The directories of the paths are interned, i.e. each directory is
+    stored once, and the file names are stored encoded in a single buffer.
+    For each path only the index of its directory and the end of its file
+    name in the buffer are kept, in arrays. Slices are PathRanges, i.e.
+    views of the store that don't copy the paths.
+
+    paths:  file paths in the order they are stored
+    """
+
+    def __init__(self, paths: Iterable[str] = ()) -> None:
+        self._directories: List[str] = []
+        self._directory_indices: Dict[str, int] = {}
+        self._path_directories = array("I")
+        self._names = bytearray()
+        self._name_ends = array("Q")
+        self.extend(paths)
+
+    def append(self, path: str) -> None:
+        """
+        Add path to the end of the store.
+        """
+        self.extend([path])
+
+    def extend(self, paths: Iterable[str]) -> None:
+        """
+        Add paths to the end of the store.
+        """
+        paths = iter(paths)
+        while chunk := list(itertools.islice(paths, _CHUNK_SIZE)):
+            directory_indices = []
+            names = []
+            for path in chunk:
+                separator = _last_separator(path) + 1
+                directory = path[:separator]
+                directory_index = self._directory_indices.get(directory)
+                if directory_index is None:
+                    directory_index = len(self._directories)
+                    self._directories.append(directory)
+                    self._directory_indices[directory] = directory_index
+                directory_indices.append(directory_index)
+                names.append(path[separator:].encode("UTF-8", "surrogatepass"))
+            self._path_directories.extend(directory_indices)
+            name_ends = itertools.accumulate(map(len, names), initial=len(self._names))
+            # skip the end of the preceding name
+            next(name_ends)
+            self._name_ends.extend(name_ends)
+            self._names += b"".join(names)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "PathRange": ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, "PathRange"]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("PathStore only supports contiguous slices")
+            return PathRange(self, start, max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PathStore index out of range")
+        name_start = self._name_ends[index - 1] if index else 0
+        name = self._names[name_start:self._name_ends[index]]
+        return self._directories[self._path_directories[index]] + name.decode(
+            "UTF-8", "surrogatepass"
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_range(0, len(self))
+
+    def __len__(self) -> int:
+        return len(self._path_directories)
+
+    def iter_range(self, start: int, stop: int) -> Iterator[str]:
+        """
+        Yield the paths from index start to stop (exclusive).
+        """
+        directories = self._directories
+        names = self._names
+        name_start = self._name_ends[start - 1] if start else 0
+        for index in range(start, stop):
+            name_end = self._name_ends[index]
+            yield directories[self._path_directories[index]] + names[
+                name_start:name_end
+            ].decode("UTF-8", "surrogatepass")
+            name_start = name_end
+
+
+class PathRange(Sequence[str]):
+    """
+    Contiguous range of the paths in a PathStore, without a copy of the
+    paths.
+
+    A PathRange compares equal to other sequences with the same paths and
+    is pickled as a list of its paths (e.g. if it is sent to a worker
+    process), so the whole store isn't copied.
+
+    store:  the PathStore containing the paths
+    start:  index of the first path of the range in store
+    stop:   index after the last path of the range in store
+    """
+
+    def __init__(self, store: PathStore, start: int, stop: int) -> None:
+        self._store = store
+        self._start = start
+        self._stop = stop
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "PathRange": ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, "PathRange"]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("PathRange only supports contiguous slices")
+            return PathRange(
+                self._store, self._start + start, self._start + max(start, stop)
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PathRange index out of range")
+        return self._store[self._start + index]
+
+    def __iter__(self) -> Iterator[str]:
+        return self._store.iter_range(self._start, self._stop)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            path == other_path for path, other_path in zip(self, other)
+        )
+
+    def __reduce__(self) -> Any:
+        return list, (list(self),)
+
+    def __repr__(self) -> str:
+        return f"PathRange({list(self)!r})"
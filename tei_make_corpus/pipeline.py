@@ -0,0 +1,301 @@
+import asyncio
+import copy
+import dataclasses
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, Union
+
+from lxml import etree
+
+from tei_make_corpus.archive import read_corpus_file
+from tei_make_corpus.document_pool import (
+    DocumentTask,
+    reconcile_document,
+    serialize_tei_document,
+)
+from tei_make_corpus.xmlid_handler import PresetXmlIdPrefixer, XmlIdPrefixer
+
+if TYPE_CHECKING:
+    from tei_make_corpus.partition import Partition
+
+logger = logging.getLogger(__name__)
+
+# stages with configurable number of workers, in the order of the pipeline
+STAGES = ("read", "transform", "serialize")
+
+# seconds between log messages with the depths of the queues
+REPORT_INTERVAL = 10.0
+
+# position of the document in the partition, task and result of last stage
+_Item = Tuple[int, DocumentTask, Any]
+
+
+@dataclasses.dataclass
+class StageStats:
+    """
+    Statistics of a stage of the pipeline.
+
+    documents:      number of documents processed by the stage
+    busy_time:      seconds spent processing documents, summed over the
+                    workers of the stage
+    queue_samples:  number of times the depth of the input queue was
+                    sampled (each time a document was put into it)
+    queue_depths:   sum of the sampled depths of the input queue
+    """
+
+    documents: int = 0
+    busy_time: float = 0.0
+    queue_samples: int = 0
+    queue_depths: int = 0
+
+    def mean_queue_depth(self) -> float:
+        if not self.queue_samples:
+            return 0.0
+        return self.queue_depths / self.queue_samples
+
+
+class DocumentPipeline:
+    """
+    Prepare and write the TEI documents of a Partition in a staged pipeline
+    run by an asyncio event loop.
+
+    The stages discover (iterating the files of the partition), read,
+    transform (parse and prepare the document), serialize and write are
+    connected by bounded queues, so a slow stage only stalls the others
+    when its input queue is full. Read, transform and serialize run in
+    thread pools with a configurable number of workers (lxml releases the
+    GIL while parsing and serializing). The documents are written in the
+    order of the files, so the output is identical to the output of
+    processing the documents one after another.
+
+    The depths of the queues are logged regularly and a summary per stage
+    is logged when the partition is written. A stage whose input queue is
+    full most of the time is the bottleneck of the pipeline.
+
+    partition:      the Partition whose documents are prepared
+    stage_workers:  number of workers per stage ('read', 'transform',
+                    'serialize'), default is 1 per stage
+    queue_size:     maximal number of documents in each queue
+    """
+
+    def __init__(
+        self,
+        partition: "Partition",
+        stage_workers: Optional[Dict[str, int]] = None,
+        queue_size: int = 64,
+    ) -> None:
+        self._partition = partition
+        self._stage_workers = {stage: 1 for stage in STAGES}
+        self._stage_workers.update(stage_workers or {})
+        self._queue_size = queue_size
+        self._queues: Dict[str, "asyncio.Queue[Optional[_Item]]"] = {}
+        self.stats: Dict[str, StageStats] = {}
+
+    def write_documents(self, write: Callable[[bytes], None]) -> None:
+        """
+        Prepare the documents of the partition and pass them serialized to
+        write, in the order of the files. Files that can't be parsed or
+        don't contain a TEI document result in an empty byte string.
+        """
+        asyncio.run(self._run(write))
+
+    def queue_depths(self) -> Dict[str, int]:
+        """
+        Return the number of documents waiting in the input queue of each
+        stage.
+        """
+        return {stage: queue.qsize() for stage, queue in self._queues.items()}
+
+    async def _run(self, write: Callable[[bytes], None]) -> None:
+        stages = STAGES + ("write",)
+        self._queues = {stage: asyncio.Queue(self._queue_size) for stage in stages}
+        self.stats = {stage: StageStats() for stage in ("discover",) + stages}
+        # documents between discover and write, so the reorder buffer of the
+        # write stage is bounded
+        window = asyncio.Semaphore(self._queue_size * (len(stages) + 1))
+        executors = {
+            stage: ThreadPoolExecutor(max_workers=self._stage_workers[stage])
+            for stage in STAGES
+        }
+        # discovery and writing may block on I/O, each runs in its own thread
+        executors["discover"] = ThreadPoolExecutor(max_workers=1)
+        executors["write"] = ThreadPoolExecutor(max_workers=1)
+        functions: Dict[str, Callable[[DocumentTask, Any], Any]] = {
+            "read": self._read,
+            "transform": self._transform,
+            "serialize": self._serialize,
+        }
+        tasks = [asyncio.ensure_future(self._discover(executors["discover"], window))]
+        for i, stage in enumerate(STAGES):
+            tasks.append(
+                asyncio.ensure_future(
+                    self._run_stage(
+                        stage, stages[i + 1], functions[stage], executors[stage]
+                    )
+                )
+            )
+        tasks.append(
+            asyncio.ensure_future(self._write(write, executors["write"], window))
+        )
+        report = asyncio.ensure_future(self._report())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks + [report]:
+                task.cancel()
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+        self._log_summary()
+
+    async def _discover(
+        self, executor: ThreadPoolExecutor, window: asyncio.Semaphore
+    ) -> None:
+        # prefixes are assigned in file order, assuming all documents are
+        # valid, and verified by the write stage
+        speculative_prefixer = None
+        if isinstance(self._partition.xmlid_handler, XmlIdPrefixer):
+            speculative_prefixer = copy.deepcopy(self._partition.xmlid_handler)
+        files = iter(self._partition.files)
+        index = 0
+        while True:
+            await window.acquire()
+            file_path = await self._timed("discover", executor, next, files, None)
+            if file_path is None:
+                break
+            self.stats["discover"].documents += 1
+            prefix = None
+            if speculative_prefixer is not None:
+                prefix = speculative_prefixer.generate_prefix(file_path)
+            await self._put("read", (index, (file_path, prefix), None))
+            index += 1
+        for _ in range(self._stage_workers["read"]):
+            await self._queues["read"].put(None)
+
+    async def _run_stage(
+        self,
+        stage: str,
+        next_stage: str,
+        function: Callable[[DocumentTask, Any], Any],
+        executor: ThreadPoolExecutor,
+    ) -> None:
+        async def worker() -> None:
+            while (item := await self._queues[stage].get()) is not None:
+                index, task, payload = item
+                result = await self._timed(stage, executor, function, task, payload)
+                self.stats[stage].documents += 1
+                await self._put(next_stage, (index, task, result))
+
+        await asyncio.gather(*(worker() for _ in range(self._stage_workers[stage])))
+        workers = self._stage_workers.get(next_stage, 1)
+        for _ in range(workers):
+            await self._queues[next_stage].put(None)
+
+    async def _write(
+        self,
+        write: Callable[[bytes], None],
+        executor: ThreadPoolExecutor,
+        window: asyncio.Semaphore,
+    ) -> None:
+        reorder_buffer: Dict[int, Tuple[DocumentTask, Optional[bytes]]] = {}
+        next_index = 0
+        while (item := await self._queues["write"].get()) is not None:
+            index, task, serialized = item
+            reorder_buffer[index] = (task, serialized)
+            while next_index in reorder_buffer:
+                task, serialized = reorder_buffer.pop(next_index)
+                await self._timed(
+                    "write",
+                    executor,
+                    self._reconcile_and_write,
+                    task,
+                    (serialized, write),
+                )
+                self.stats["write"].documents += 1
+                window.release()
+                next_index += 1
+
+    def _reconcile_and_write(
+        self,
+        task: DocumentTask,
+        payload: Tuple[Optional[bytes], Callable[[bytes], None]],
+    ) -> None:
+        serialized, write = payload
+        write(reconcile_document(self._partition, task, serialized))
+
+    def _read(self, task: DocumentTask, payload: None) -> Union[bytes, OSError]:
+        file_path, _ = task
+        try:
+            return read_corpus_file(file_path)
+        except OSError as error:
+            # raised when the document is parsed, as without the pipeline
+            return error
+
+    def _transform(
+        self, task: DocumentTask, content: Union[bytes, OSError]
+    ) -> Optional[etree._Element]:
+        file_path, prefix = task
+        partition = self._partition
+        if prefix is not None:
+            partition = dataclasses.replace(
+                partition, xmlid_handler=PresetXmlIdPrefixer([prefix])
+            )
+
+        def parse() -> etree._ElementTree:
+            if isinstance(content, OSError):
+                raise content
+            return etree.fromstring(content, base_url=file_path).getroottree()
+
+        return partition._prepare_tei_document(file_path, parse)
+
+    def _serialize(
+        self, task: DocumentTask, root: Optional[etree._Element]
+    ) -> Optional[bytes]:
+        if root is None:
+            return None
+        return serialize_tei_document(root)
+
+    async def _put(self, stage: str, item: _Item) -> None:
+        queue = self._queues[stage]
+        stats = self.stats[stage]
+        stats.queue_samples += 1
+        stats.queue_depths += queue.qsize()
+        await queue.put(item)
+
+    async def _timed(
+        self,
+        stage: str,
+        executor: ThreadPoolExecutor,
+        function: Callable[..., Any],
+        *args: Any,
+    ) -> Any:
+        start = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(
+            executor, function, *args
+        )
+        self.stats[stage].busy_time += time.perf_counter() - start
+        return result
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            logger.info(
+                "Pipeline queue depths (max %d): %s",
+                self._queue_size,
+                ", ".join(
+                    f"{stage}={depth}" for stage, depth in self.queue_depths().items()
+                ),
+            )
+
+    def _log_summary(self) -> None:
+        for stage, stats in self.stats.items():
+            workers = self._stage_workers.get(stage, 1)
+            logger.info(
+                "Pipeline stage %s: %d documents, %d workers, %.2f s busy, "
+                "mean input queue depth %.1f",
+                stage,
+                stats.documents,
+                workers,
+                stats.busy_time,
+                stats.mean_queue_depth(),
+            )
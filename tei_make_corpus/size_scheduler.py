@@ -0,0 +1,82 @@
+import heapq
+from typing import Dict, Generic, Iterable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SizeScheduler(Generic[T]):
+    """
+    Determine the order in which the documents of a partition are
+    dispatched to workers: the largest documents first, so a large
+    document doesn't delay the end of the partition if it is dispatched
+    late.
+
+    The documents are admitted to a window in the order of the files and
+    dispatched from the window by size. The window is bounded by the sum
+    of the file sizes of the documents that were admitted, but not yet
+    released (i.e. written) by the caller. As the results of the workers
+    are held until all previous documents are written, this bounds the
+    reorder buffer of the caller (approximately, by the size of the input
+    files). A document is admitted as long as the window is not full, so
+    the window may exceed window_size by the size of one document.
+
+    items:          pairs of a document and the size of its file in bytes,
+                    in the order of the files (the sizes are collected while
+                    the files are discovered, so no file is accessed)
+    window_size:    intended maximal size of the window in bytes
+    """
+
+    def __init__(self, items: Iterable[Tuple[T, int]], window_size: int) -> None:
+        self._items = enumerate(items)
+        self._window_size = window_size
+        self._exhausted = False
+        # admitted documents that were not dispatched, largest first
+        self._heap: List[Tuple[int, int, T]] = []
+        # sizes of admitted documents that were not released
+        self._sizes: Dict[int, int] = {}
+        self._window = 0
+
+    def next_batch(self, max_documents: int, max_size: int) -> List[Tuple[int, T]]:
+        """
+        Return the next documents to dispatch, with their index in the order
+        of the files. The batch starts with the largest document in the
+        window and is completed with the next largest ones until it
+        contains max_documents or reaches max_size bytes. Returns an empty
+        list if all documents were dispatched.
+        """
+        batch: List[Tuple[int, T]] = []
+        batch_size = 0
+        while len(batch) < max_documents and batch_size < max_size:
+            self._admit()
+            if not self._heap:
+                break
+            negative_size, index, item = heapq.heappop(self._heap)
+            batch.append((index, item))
+            batch_size -= negative_size
+        return batch
+
+    def release(self, index: int) -> None:
+        """
+        Remove the document with index from the window after it was
+        written, so further documents can be admitted.
+        """
+        self._window -= self._sizes.pop(index)
+
+    def window(self) -> int:
+        """
+        Return the sum of the file sizes of the documents in the window.
+        """
+        return self._window
+
+    def _admit(self) -> None:
+        while not self._exhausted and (
+            not self._sizes or self._window < self._window_size
+        ):
+            next_item = next(self._items, None)
+            if next_item is None:
+                self._exhausted = True
+                return
+            index, (item, size) = next_item
+            heapq.heappush(self._heap, (-size, index, item))
+            self._sizes[index] = size
+            self._window += size
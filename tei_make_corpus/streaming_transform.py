@@ -0,0 +1,340 @@
+import logging
+import re
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+from xml.sax.saxutils import unescape
+
+from lxml import etree
+
+from tei_make_corpus.archive import iterparse_corpus_file
+from tei_make_corpus.file_size_estimator import FileSizeEstimator, FileSizeEstimatorImpl
+from tei_make_corpus.xmlid_handler import XmlIdPrefixer, XmlIdRemover
+
+if TYPE_CHECKING:
+    from tei_make_corpus.partition import Partition
+
+logger = logging.getLogger(__name__)
+
+_XMLID = "{http://www.w3.org/XML/1998/namespace}id"
+
+# the output is passed on in chunks of this size
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+_TAG_NAME = re.compile(rb"<[^\s/>]+")
+
+_NAMESPACE_DECLARATION = re.compile(rb' xmlns(?::([^\s=]+))?="([^"]*)"')
+
+# prefix (None for the default namespace) and URI of a namespace
+_Namespace = Tuple[Optional[str], str]
+
+# the namespaces in scope of an element
+_Scope = Tuple[_Namespace, ...]
+
+
+class StreamingTransformer:
+    """
+    Transform large TEI documents of a Partition while they are parsed
+    and write them without building the element tree of the whole
+    document.
+
+    Each file is parsed incrementally in two passes. The first pass checks
+    that the file contains a well-formed TEI document, so nothing is
+    written for files that are omitted, and collects the values of
+    @xml:id if they are prefixed. In the second pass, each element is
+    written as soon as it is parsed and removed from the tree afterwards;
+    @xml:id attributes are removed or prefixed on the fly. Only the
+    teiHeader of the document is kept in memory as a whole, to remove the
+    elements repeated in the common header and add the document
+    identifier.
+
+    The output is identical to the output of transforming the document as
+    a whole. Files are parsed with the huge_tree option, so documents
+    exceeding the default limits of the parser (e.g. for the length of
+    text nodes) are accepted.
+
+    partition:      the Partition whose documents are written, its
+                    xmlid_handler must be an XmlIdRemover or XmlIdPrefixer
+    threshold:      minimal size in bytes of files that are streamed
+    size_estimator: implementation of FileSizeEstimator protocol, provides
+                    the sizes of the files
+    """
+
+    def __init__(
+        self,
+        partition: "Partition",
+        threshold: int,
+        size_estimator: FileSizeEstimator = FileSizeEstimatorImpl(),
+    ) -> None:
+        self._partition = partition
+        self._threshold = threshold
+        self._size_estimator = size_estimator
+        # per tag and namespaces in scope: an element used to serialize
+        # attributes, the qualified name and the serialized empty element
+        self._templates: Dict[
+            Tuple[str, _Scope], Tuple[etree._Element, bytes, bytes]
+        ] = {}
+
+    def streams(self, file_path: str) -> bool:
+        """
+        Return True if the document in file_path should be streamed, i.e.
+        if the file reaches the threshold and its @xml:id attributes can
+        be handled element by element.
+        """
+        if not isinstance(self._partition.xmlid_handler, (XmlIdRemover, XmlIdPrefixer)):
+            return False
+        (size,) = self._size_estimator.determine_file_sizes([file_path])
+        return size >= self._threshold
+
+    def write_document(self, file_path: str, write: Callable[[bytes], Any]) -> None:
+        """
+        Transform the TEI document in file_path and pass it serialized to
+        write, in chunks. Nothing is written if the file can't be parsed or
+        doesn't contain a TEI document.
+        """
+        xmlids = self._check_document(file_path)
+        if xmlids is None:
+            return
+        process_element = self._xmlid_processor(file_path, xmlids)
+        docid_handler = self._partition.docid_handler
+        buffer = bytearray()
+        root: Optional[etree._Element] = None
+        header: Optional[etree._Element] = None
+        header_found = False
+        header_declarations: List[_Namespace] = []
+        docid_added = False
+        # namespaces declared on the next element
+        declarations: List[_Namespace] = []
+        # namespaces in scope and qualified names of the open elements
+        scopes: List[_Scope] = []
+        qnames: List[bytes] = []
+        # element whose start tag isn't completed yet (it may be empty)
+        open_element: Optional[etree._Element] = None
+        # element whose tail isn't written yet
+        tail_element: Optional[etree._Element] = None
+        for event, element in iterparse_corpus_file(
+            file_path,
+            events=("start", "end", "start-ns", "comment", "pi"),
+            huge_tree=True,
+        ):
+            if header is not None:
+                # the teiHeader is written as a whole
+                if event == "end" and element is header:
+                    self._process_header(header, process_element)
+                    if docid_handler is not None:
+                        assert root is not None
+                        docid_handler.add_doc_id(root, file_path)
+                        docid_added = True
+                    buffer += _serialize_subtree(header, header_declarations)
+                    tail_element = header
+                    header = None
+                continue
+            if event == "start-ns":
+                prefix, uri = element
+                declarations.append((prefix or None, uri))
+                continue
+            if not scopes and event in ("comment", "pi"):
+                # outside of the TEI element
+                continue
+            if event == "end" and element is root and not docid_added:
+                if docid_handler is not None:
+                    # no teiHeader, the error is logged
+                    docid_handler.add_doc_id(element, file_path)
+            # text and tail before the current event are parsed completely
+            if open_element is not None:
+                if event == "end" and not open_element.text:
+                    buffer += b"/>"
+                    open_element = None
+                    scopes.pop()
+                    qnames.pop()
+                    tail_element = element
+                    _release(element)
+                    continue
+                buffer += b">"
+                buffer += _escape_text(open_element.text)
+                open_element = None
+            if tail_element is not None:
+                buffer += _escape_text(tail_element.tail)
+                tail_element = None
+            if event == "start":
+                if root is None:
+                    root = element
+                elif not header_found and etree.QName(element).localname == "teiHeader":
+                    header = element
+                    header_declarations = declarations
+                    declarations = []
+                    header_found = True
+                    continue
+                process_element(element)
+                scope = (
+                    tuple(element.nsmap.items())
+                    if declarations
+                    else scopes[-1] if scopes else ()
+                )
+                qname, start_tag = self._start_tag(element, scope, declarations)
+                buffer += start_tag
+                scopes.append(scope)
+                qnames.append(qname)
+                declarations = []
+                open_element = element
+            elif event == "end":
+                scopes.pop()
+                buffer += b"</" + qnames.pop() + b">"
+                tail_element = element
+                _release(element)
+            else:
+                buffer += etree.tostring(element, encoding="UTF-8", with_tail=False)
+                tail_element = element
+            if len(buffer) >= _WRITE_BUFFER_SIZE:
+                write(bytes(buffer))
+                buffer.clear()
+        write(bytes(buffer))
+
+    def _check_document(self, file_path: str) -> Optional[Set[str]]:
+        # first pass: returns the values of @xml:id in the document as
+        # written (i.e. after removing elements from the teiHeader) or None
+        # if the document is omitted
+        collect_xmlids = isinstance(self._partition.xmlid_handler, XmlIdPrefixer)
+        xmlids: Set[str] = set()
+        is_tei = False
+        header: Optional[etree._Element] = None
+        header_found = False
+        depth = 0
+        try:
+            for event, element in iterparse_corpus_file(
+                file_path, events=("start", "end"), huge_tree=True
+            ):
+                if event == "start":
+                    if depth == 0:
+                        is_tei = etree.QName(element).localname == "TEI"
+                    elif (
+                        collect_xmlids
+                        and not header_found
+                        and etree.QName(element).localname == "teiHeader"
+                    ):
+                        header = element
+                        header_found = True
+                    depth += 1
+                    continue
+                depth -= 1
+                if not collect_xmlids or not is_tei:
+                    _release(element)
+                    continue
+                if element is header:
+                    if self._partition.clean_files:
+                        self._partition.header_handler.declutter_individual_header(
+                            header
+                        )
+                    xmlids.update(
+                        descendant.get(_XMLID)
+                        for descendant in header.iter(etree.Element)
+                        if descendant.get(_XMLID) is not None
+                    )
+                    header = None
+                elif header is None and (xmlid := element.get(_XMLID)) is not None:
+                    xmlids.add(xmlid)
+                if header is None:
+                    _release(element)
+        except etree.XMLSyntaxError:
+            logger.exception("File ommitted: %s" % file_path)
+            return None
+        if not is_tei:
+            logger.info("No <TEI> root element found. Ignoring file: %s", file_path)
+            return None
+        return xmlids
+
+    def _xmlid_processor(
+        self, file_path: str, xmlids: Set[str]
+    ) -> Callable[[etree._Element], None]:
+        xmlid_handler = self._partition.xmlid_handler
+        if isinstance(xmlid_handler, XmlIdPrefixer):
+            prefix = xmlid_handler.generate_prefix(file_path)
+            return lambda element: xmlid_handler.prefix_element(element, prefix, xmlids)
+        return lambda element: element.attrib.pop(_XMLID, None)
+
+    def _process_header(
+        self,
+        header: etree._Element,
+        process_element: Callable[[etree._Element], None],
+    ) -> None:
+        if self._partition.clean_files:
+            self._partition.header_handler.declutter_individual_header(header)
+        for element in header.iter(etree.Element):
+            process_element(element)
+
+    def _start_tag(
+        self,
+        element: etree._Element,
+        scope: _Scope,
+        declarations: List[_Namespace],
+    ) -> Tuple[bytes, bytes]:
+        # returns the qualified name and the start tag without '>' (or '/>'
+        # if the element turns out to be empty); the attributes are
+        # serialized by lxml with an element of the same tag and namespaces
+        # in scope
+        key = (element.tag, scope)
+        if key not in self._templates:
+            template = etree.Element(element.tag, nsmap=dict(scope))
+            serialized = etree.tostring(template, encoding="UTF-8")[:-2]
+            tag_name = _TAG_NAME.match(serialized)
+            assert tag_name is not None
+            self._templates[key] = (template, tag_name.group(0)[1:], serialized)
+        template, qname, empty_start_tag = self._templates[key]
+        start_tag = b"<" + qname
+        if declarations:
+            start_tag = _filter_declarations(empty_start_tag, declarations)
+        if element.attrib:
+            template.attrib.update(element.attrib)
+            serialized = etree.tostring(template, encoding="UTF-8")
+            template.attrib.clear()
+            start_tag += serialized[len(empty_start_tag):-2]
+        return qname, start_tag
+
+
+def _release(element: etree._Element) -> None:
+    # remove the children and the preceding siblings of an element that was
+    # written, the element itself is needed until its tail is written
+    if len(element):
+        del element[:]
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _escape_text(text: Optional[str]) -> bytes:
+    # escaped as by the serializer of lxml
+    if not text:
+        return b""
+    return (
+        text.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace("\r", "&#13;")
+        .encode("UTF-8")
+    )
+
+
+def _serialize_subtree(
+    element: etree._Element, declarations: List[_Namespace]
+) -> bytes:
+    serialized = etree.tostring(element, encoding="UTF-8", with_tail=False)
+    return _filter_declarations(serialized, declarations)
+
+
+def _filter_declarations(serialized: bytes, declarations: List[_Namespace]) -> bytes:
+    # lxml declares all namespaces in scope on the first element of a
+    # serialized subtree, only the namespaces declared on the element in the
+    # source are kept
+    tag_name = _TAG_NAME.match(serialized)
+    assert tag_name is not None
+    position = tag_name.end()
+    kept = []
+    while declaration := _NAMESPACE_DECLARATION.match(serialized, position):
+        prefix = declaration.group(1)
+        uri = declaration.group(2).decode("UTF-8")
+        if "&" in uri:
+            uri = unescape(uri, {"&quot;": '"'})
+        namespace = (prefix.decode("UTF-8") if prefix else None, uri)
+        if namespace in declarations:
+            kept.append(declaration.group(0))
+        position = declaration.end()
+    return serialized[: tag_name.end()] + b"".join(kept) + serialized[position:]
@@ -0,0 +1,202 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set
+
+from tei_make_corpus.partition_plan import PartitionPlan
+
+_SCHEMA = """
+CREATE TABLE plan (
+    digest TEXT NOT NULL
+);
+CREATE TABLE partitions (
+    idx INTEGER PRIMARY KEY,
+    output_file TEXT NOT NULL,
+    files TEXT NOT NULL,
+    reserved_prefixes TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL
+);
+"""
+
+
+@dataclass
+class QueuedPartition:
+    """
+    A part of the corpus claimed from the WorkQueue.
+
+    index:              position of the part in the partition plan
+    output_file:        path of the output file of the part
+    files:              file paths of the TEI documents of the part
+    reserved_prefixes:  prefixes of @xml:id in use before the part, None if
+                        @xml:id attributes aren't prefixed
+    """
+
+    index: int
+    output_file: str
+    files: List[str]
+    reserved_prefixes: Optional[List[str]] = None
+
+
+class WorkQueue:
+    """
+    Queue of the parts of a split corpus in an SQLite database, shared by
+    worker processes (possibly on different hosts) that write the parts.
+
+    A worker claims a part for a lease timeout and marks it as done after
+    writing it. While a part is written, the lease can be renewed. Parts
+    whose lease expired, e.g. because the worker crashed, can be claimed
+    again.
+
+    path:   path of the SQLite database
+    clock:  function returning the current time in seconds, used for the
+            leases (default time.time)
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self._clock = clock
+
+    def create(
+        self,
+        plan: PartitionPlan,
+        reserved_prefixes: Optional[Sequence[Set[str]]] = None,
+    ) -> None:
+        """
+        Create the queue with all parts of plan. If reserved_prefixes is
+        given, it contains the prefixes in use before each part.
+        The database must not exist yet.
+        """
+        if os.path.exists(self.path):
+            raise FileExistsError(f"Work queue already exists: {self.path}")
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT INTO plan VALUES (?)", (plan.digest(),))
+            connection.executemany(
+                "INSERT INTO partitions (idx, output_file, files, reserved_prefixes) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        i,
+                        output_file,
+                        json.dumps(list(partition.files)),
+                        (
+                            json.dumps(sorted(reserved_prefixes[i]))
+                            if reserved_prefixes is not None
+                            else None
+                        ),
+                    )
+                    for i, (partition, output_file) in enumerate(plan.partitions)
+                ),
+            )
+            connection.execute("COMMIT")
+
+    def digest(self) -> str:
+        """
+        Return the digest of the partition plan the queue was created from.
+        """
+        with self._connect() as connection:
+            (digest,) = connection.execute("SELECT digest FROM plan").fetchone()
+        return digest
+
+    def claim(self, worker: str, lease_timeout: float) -> Optional[QueuedPartition]:
+        """
+        Claim the first part that is neither done nor claimed with a valid
+        lease. Returns None if there is no such part.
+        """
+        now = self._clock()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT idx, output_file, files, reserved_prefixes FROM partitions "
+                "WHERE state = 'pending' OR (state = 'claimed' AND lease_expires < ?) "
+                "ORDER BY idx LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE partitions SET state = 'claimed', worker = ?, "
+                    "lease_expires = ? WHERE idx = ?",
+                    (worker, now + lease_timeout, row[0]),
+                )
+            connection.execute("COMMIT")
+        if row is None:
+            return None
+        index, output_file, files, reserved_prefixes = row
+        return QueuedPartition(
+            index,
+            output_file,
+            json.loads(files),
+            json.loads(reserved_prefixes) if reserved_prefixes is not None else None,
+        )
+
+    def renew(self, index: int, worker: str, lease_timeout: float) -> None:
+        """
+        Extend the lease of worker for the part at index.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE partitions SET lease_expires = ? "
+                "WHERE idx = ? AND worker = ? AND state = 'claimed'",
+                (self._clock() + lease_timeout, index, worker),
+            )
+
+    @contextlib.contextmanager
+    def keep_lease(
+        self, index: int, worker: str, lease_timeout: float
+    ) -> Iterator[None]:
+        """
+        Renew the lease of worker for the part at index in a background
+        thread while the context is active.
+        """
+        stop = threading.Event()
+
+        def renew_lease() -> None:
+            while not stop.wait(lease_timeout / 3):
+                self.renew(index, worker, lease_timeout)
+
+        thread = threading.Thread(target=renew_lease, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, index: int) -> None:
+        """
+        Mark the part at index as done.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE partitions SET state = 'done', lease_expires = NULL "
+                "WHERE idx = ?",
+                (index,),
+            )
+
+    def status(self) -> Dict[str, int]:
+        """
+        Return the number of parts per state ('pending', 'claimed', 'done').
+        """
+        counts = {"pending": 0, "claimed": 0, "done": 0}
+        with self._connect() as connection:
+            for state, count in connection.execute(
+                "SELECT state, COUNT(*) FROM partitions GROUP BY state"
+            ):
+                counts[state] = count
+        return counts
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # transactions are controlled explicitly (isolation_level=None)
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
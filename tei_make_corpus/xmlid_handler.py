@@ -1,9 +1,16 @@
 import abc
+import collections
+import copy
+import re
 import uuid
-from typing import Set
+from typing import Iterable, List, Match, Set
 
 from lxml import etree
 
+# a pointer ('#' followed by an @xml:id) in a whitespace-separated list
+# of values, e.g. corresp="#a #b"
+_POINTER = re.compile(r"(?<!\S)#(\S+)")
+
 
 class XmlIdHandler(abc.ABC):
     """
@@ -41,13 +48,22 @@ class XmlIdPrefixer(XmlIdHandler):
     Prefix @xml:id attributes to disambiguate them in the teiCorpus.
     """
 
-    def __init__(self) -> None:
-        self._prefixes: Set[str] = set()
+    def __init__(self, reserved_prefixes: Iterable[str] = ()) -> None:
+        """
+        reserved_prefixes:  prefixes (without the leading 'p') that are
+                            already in use, e.g. by documents processed
+                            in another process
+        """
+        self._prefixes: Set[str] = set(reserved_prefixes)
 
     def process_document(self, doc_root: etree._Element, file_path: str) -> None:
         """
         Disambiguate @xml:id in TEI document by prefixing values of @xml:id
         and attributes referencing them.
+
+        An attribute references an @xml:id if its value, or one of the
+        whitespace-separated values of a list (e.g. corresp="#a #b"),
+        is '#' followed by the @xml:id.
         """
         self._add_prefix_to_xmlid_attributes(doc_root, file_path)
 
@@ -74,44 +90,137 @@ class XmlIdPrefixer(XmlIdHandler):
         # clipped:   a3a300
         # final:     pa3a300
         """
-        uid = uuid.uuid5(uuid.NAMESPACE_DNS, file_path).hex
-        prefix = uid[:6]
+        prefix = self.next_prefix(file_path)
+        self._prefixes.add(prefix[1:])
+        return prefix
+
+    def next_prefix(self, file_path: str) -> str:
+        """
+        Return the prefix generate_prefix would generate for file_path,
+        without reserving it.
+        """
+        prefix = self._clipped_uuid(file_path)
         tmp_prefix = prefix
         suffix_on_collision = 0
         while tmp_prefix in self._prefixes:
             tmp_prefix = f"{prefix}{suffix_on_collision}"
             suffix_on_collision += 1
-        self._prefixes.add(tmp_prefix)
         return f"p{tmp_prefix}"
 
+    def reserved_prefixes(self, file_path: str) -> Set[str]:
+        """
+        Return the prefixes in use (without the leading 'p') that
+        generate_prefix would check for collisions when generating the
+        prefix for file_path.
+        """
+        prefix = self._clipped_uuid(file_path)
+        reserved = set()
+        tmp_prefix = prefix
+        suffix_on_collision = 0
+        while tmp_prefix in self._prefixes:
+            reserved.add(tmp_prefix)
+            tmp_prefix = f"{prefix}{suffix_on_collision}"
+            suffix_on_collision += 1
+        return reserved
+
+    def add_reserved_prefixes(self, prefixes: Iterable[str]) -> None:
+        """
+        Mark prefixes (without the leading 'p') as in use, as if they had
+        been generated, e.g. for documents that aren't processed again.
+        """
+        self._prefixes.update(prefixes)
+
+    def prefix_element(
+        self, element: etree._Element, prefix: str, xmlids: Set[str]
+    ) -> None:
+        """
+        Prefix @xml:id of a single element and its attributes referencing
+        one of xmlids (the values of @xml:id in the document), as
+        process_document does for all elements of a document. Used if the
+        document is processed element by element.
+        """
+
+        def prefix_pointer(match: Match[str]) -> str:
+            if match.group(1) in xmlids:
+                return f"#{prefix}-{match.group(1)}"
+            return match.group(0)
+
+        for attrib, value in element.items():
+            if attrib == "{http://www.w3.org/XML/1998/namespace}id":
+                element.set(attrib, f"{prefix}-{value}")
+            elif "#" in value:
+                prefixed = _POINTER.sub(prefix_pointer, value)
+                if prefixed != value:
+                    element.set(attrib, prefixed)
+
+    def _clipped_uuid(self, file_path: str) -> str:
+        return uuid.uuid5(uuid.NAMESPACE_DNS, file_path).hex[:6]
+
     def _add_prefix_to_xmlid_attributes(
         self, doc_root: etree._Element, file_path: str
     ) -> None:
         prefix = self.generate_prefix(file_path)
-        if (
-            xmlid_attrib := doc_root.get("{http://www.w3.org/XML/1998/namespace}id")
-        ) is not None:
-            doc_root.set(
-                "{http://www.w3.org/XML/1998/namespace}id",
-                f"{prefix}-{xmlid_attrib}",
-            )
-            self._add_prefix_to_referencing_attributes(doc_root, xmlid_attrib, prefix)
-
-        for node in doc_root.findall(".//*[@{http://www.w3.org/XML/1998/namespace}id]"):
-            xmlid_attrib = node.get("{http://www.w3.org/XML/1998/namespace}id")
-            node.set(
-                "{http://www.w3.org/XML/1998/namespace}id",
-                f"{prefix}-{xmlid_attrib}",
-            )
-            self._add_prefix_to_referencing_attributes(doc_root, xmlid_attrib, prefix)
-
-    def _add_prefix_to_referencing_attributes(
-        self, doc_root: etree._Element, xmlid_value: str, prefix: str
-    ) -> None:
-        for element in doc_root.xpath(f"//*[@*= '#{xmlid_value}']"):
-            for attrib, value in element.items():
-                if value == "#" + xmlid_value:
-                    element.set(attrib, f"#{prefix}-{xmlid_value}")
+        # all values of @xml:id are collected first, so the referencing
+        # attributes are prefixed in a single pass over the document
+        xmlids = {
+            xmlid
+            for element in doc_root.iter(etree.Element)
+            if (xmlid := element.get("{http://www.w3.org/XML/1998/namespace}id"))
+            is not None
+        }
+        if not xmlids:
+            return
+        for element in doc_root.iter(etree.Element):
+            self.prefix_element(element, prefix, xmlids)
+
+
+class PresetXmlIdPrefixer(XmlIdPrefixer):
+    """
+    Prefix @xml:id attributes with prefixes that were assigned in advance,
+    one for each processed document, in the order of processing.
+
+    Because prefixes of colliding file paths depend on the order in which
+    the documents are processed, documents prepared in parallel can't
+    generate their prefixes independently.
+    """
+
+    def __init__(self, prefixes: Iterable[str]) -> None:
+        super().__init__()
+        self._preset_prefixes = collections.deque(prefixes)
+
+    def generate_prefix(self, file_path: str) -> str:
+        return self._preset_prefixes.popleft()
+
+    def next_prefix(self, file_path: str) -> str:
+        return self._preset_prefixes[0]
+
+
+def reserve_prefixes_for_parts(
+    xmlid_handler: XmlIdPrefixer, parts: Iterable[Iterable[str]]
+) -> List[Set[str]]:
+    """
+    Return for each part of a corpus (a collection of file paths) the
+    prefixes that are in use when its first document is processed, if the
+    parts are processed in order by xmlid_handler.
+
+    Only the prefixes relevant for the file paths of a part are returned,
+    i.e. an XmlIdPrefixer initialized with them generates the same prefixes
+    for the part as xmlid_handler would. All documents are assumed to be
+    valid TEI documents. xmlid_handler itself isn't changed.
+    """
+    speculative_prefixer = copy.deepcopy(xmlid_handler)
+    reserved = []
+    for files in parts:
+        reserved.append(
+            {
+                prefix
+                for file_path in files
+                for prefix in speculative_prefixer.reserved_prefixes(file_path)
+            }
+        )
+        for file_path in files:
+            speculative_prefixer.generate_prefix(file_path)
+    return reserved
 
 
 def create_xmlid_handler(prefix_xmlid: bool = False) -> XmlIdHandler:
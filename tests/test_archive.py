@@ -0,0 +1,198 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from tei_make_corpus.archive import (
+    ArchivePathFinder,
+    corpus_file_size,
+    corpus_file_source,
+    is_archive,
+    read_corpus_file,
+    split_member_path,
+)
+from tei_make_corpus.cli.make_corpus_usecase import CliRequest, TeiMakeCorpusUseCaseImpl
+from tei_make_corpus.corpus_stream import CorpusStreamImpl
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+
+ARCHIVE_NAMES = ["corpus.tar", "corpus.tar.gz", "corpus.tar.xz", "corpus.zip"]
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.corpus_dir = os.path.join("tests", "testdata", "xmlid")
+        # members in the archives, not sorted
+        self.members = ["file2.xml", "header.xml", "sub/file1.xml", "notes.txt"]
+        self.files = {
+            "file2.xml": os.path.join(self.corpus_dir, "file2.xml"),
+            "header.xml": os.path.join(self.corpus_dir, "header.xml"),
+            "sub/file1.xml": os.path.join(self.corpus_dir, "file1.xml"),
+            "notes.txt": os.path.join(self.corpus_dir, "header.xml"),
+        }
+        for archive_name in ARCHIVE_NAMES:
+            self._write_archive(archive_name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_members_found_in_order_of_archive(self):
+        for archive_path in self._archive_paths():
+            with self.subTest(archive=archive_path):
+                result = ArchivePathFinder().get_paths_and_sizes_for_corpus_files(
+                    archive_path, "header.xml"
+                )
+                self.assertEqual(
+                    result,
+                    [
+                        (
+                            f"{archive_path}/file2.xml",
+                            os.path.getsize(self.files["file2.xml"]),
+                        ),
+                        (
+                            f"{archive_path}/sub/file1.xml",
+                            os.path.getsize(self.files["sub/file1.xml"]),
+                        ),
+                    ],
+                )
+
+    def test_all_methods_return_same_order(self):
+        path_finder = ArchivePathFinder()
+        archive_path = os.path.join(self.tempdir.name, "corpus.tar.gz")
+        expected = [f"{archive_path}/file2.xml", f"{archive_path}/sub/file1.xml"]
+        for method in [
+            path_finder.get_paths_for_corpus_files,
+            path_finder.iter_paths_for_corpus_files,
+            path_finder.iter_sorted_paths_for_corpus_files,
+        ]:
+            with self.subTest(method=method.__name__):
+                self.assertEqual(list(method(archive_path, "header.xml")), expected)
+
+    def test_members_read_without_extracting(self):
+        for archive_path in self._archive_paths():
+            # members are read in a different order than in the archive
+            for member in reversed(self.members):
+                with self.subTest(archive=archive_path, member=member):
+                    with open(self.files[member], "rb") as ptr:
+                        expected = ptr.read()
+                    path = f"{archive_path}/{member}"
+                    self.assertEqual(read_corpus_file(path), expected)
+                    with corpus_file_source(path) as source:
+                        self.assertEqual(source.read(), expected)
+                    self.assertEqual(corpus_file_size(path), len(expected))
+        self.assertEqual(sorted(os.listdir(self.tempdir.name)), sorted(ARCHIVE_NAMES))
+
+    def test_members_streamed_while_other_members_read(self):
+        for archive_path in self._archive_paths():
+            with self.subTest(archive=archive_path):
+                with corpus_file_source(
+                    f"{archive_path}/sub/file1.xml"
+                ) as first, corpus_file_source(f"{archive_path}/file2.xml") as second:
+                    chunks = [(first.read(10), second.read(10)) for _ in range(3)]
+                    first_content = b"".join(c for c, _ in chunks) + first.read()
+                    second_content = b"".join(c for _, c in chunks) + second.read()
+                with open(self.files["sub/file1.xml"], "rb") as ptr:
+                    self.assertEqual(first_content, ptr.read())
+                with open(self.files["file2.xml"], "rb") as ptr:
+                    self.assertEqual(second_content, ptr.read())
+
+    def test_tar_archive_indexed_once(self):
+        archive_path = os.path.join(self.tempdir.name, "corpus.tar.gz")
+        with mock.patch.object(
+            tarfile.TarFile, "next", autospec=True, side_effect=tarfile.TarFile.next
+        ) as next_member:
+            for member in reversed(self.members):
+                read_corpus_file(f"{archive_path}/{member}")
+        # one pass through the archive: a call per member (and the directory),
+        # one for the end and one when the archive is opened
+        self.assertEqual(next_member.call_count, len(self.members) + 3)
+
+    def test_missing_member_raises_error(self):
+        for archive_path in self._archive_paths():
+            with self.subTest(archive=archive_path):
+                with self.assertRaises(FileNotFoundError):
+                    read_corpus_file(f"{archive_path}/missing.xml")
+                self.assertEqual(corpus_file_size(f"{archive_path}/missing.xml"), 0)
+
+    def test_files_not_in_archive_read_from_disk(self):
+        file_path = os.path.join(self.corpus_dir, "file1.xml")
+        with corpus_file_source(file_path) as source:
+            self.assertEqual(source, file_path)
+        self.assertEqual(corpus_file_size(file_path), os.path.getsize(file_path))
+        with open(file_path, "rb") as ptr:
+            self.assertEqual(read_corpus_file(file_path), ptr.read())
+
+    def test_member_path_split(self):
+        archive_path = os.path.join(self.tempdir.name, "corpus.tar.gz")
+        self.assertEqual(
+            split_member_path(f"{archive_path}/sub/file1.xml"),
+            (archive_path, "sub/file1.xml"),
+        )
+        self.assertIsNone(split_member_path(archive_path))
+
+    def test_directory_with_archive_extension_not_archive(self):
+        directory = os.path.join(self.tempdir.name, "dir.zip")
+        os.mkdir(directory)
+        self.assertFalse(is_archive(directory))
+        self.assertIsNone(split_member_path(os.path.join(directory, "file.xml")))
+        self.assertTrue(is_archive(os.path.join(self.tempdir.name, "corpus.zip")))
+
+    def test_partition_output_same_as_for_extracted_files(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join(self.corpus_dir, "header.xml")
+        )
+        expected = io.BytesIO()
+        Partition(
+            header_handler,
+            [self.files["file2.xml"], self.files["sub/file1.xml"]],
+            XmlIdRemover(),
+        ).write_partition(expected)
+        for archive_path in self._archive_paths():
+            for workers in [1, 2]:
+                with self.subTest(archive=archive_path, workers=workers):
+                    output = io.BytesIO()
+                    Partition(
+                        header_handler,
+                        ArchivePathFinder().get_paths_for_corpus_files(
+                            archive_path, "header.xml"
+                        ),
+                        XmlIdRemover(),
+                        workers=workers,
+                    ).write_partition(output)
+                    self.assertEqual(output.getvalue(), expected.getvalue())
+
+    def test_corpus_built_from_archive(self):
+        output_file = os.path.join(self.tempdir.name, "output.xml")
+        TeiMakeCorpusUseCaseImpl(CorpusStreamImpl()).process(
+            CliRequest(
+                header_file=os.path.join(self.corpus_dir, "header.xml"),
+                corpus_dir=os.path.join(self.tempdir.name, "corpus.zip"),
+                output_file=output_file,
+            )
+        )
+        with open(output_file, "rb") as ptr:
+            self.assertEqual(ptr.read().count(b"<TEI"), 2)
+
+    def _archive_paths(self):
+        return [os.path.join(self.tempdir.name, name) for name in ARCHIVE_NAMES]
+
+    def _write_archive(self, archive_name):
+        archive_path = os.path.join(self.tempdir.name, archive_name)
+        if archive_name.endswith(".zip"):
+            with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("sub/", "")
+                for member in self.members:
+                    archive.write(self.files[member], member)
+            return
+        mode = "w:" + archive_name.split(".tar")[1].lstrip(".")
+        with tarfile.open(archive_path, mode) as archive:
+            directory = tarfile.TarInfo("sub")
+            directory.type = tarfile.DIRTYPE
+            archive.addfile(directory)
+            for member in self.members:
+                archive.add(self.files[member], member)
@@ -0,0 +1,92 @@
+import gzip
+import io
+import lzma
+import os
+import random
+import tempfile
+import unittest
+import zlib
+
+from tei_make_corpus.block_compression import (
+    BlockCompressor,
+    GzipBlockCompressor,
+    XzBlockCompressor,
+)
+from tei_make_corpus.compression import uncompressed_size
+
+
+class BlockCompressorTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(4)
+        words = [b"<p>", b"</p>", b"text", b"TEI", b"\n", b"corpus", b"header"]
+        self.content = b"".join(rng.choice(words) for _ in range(50_000))
+
+    def test_gzip_output_decompressed_to_content(self):
+        for content in [self.content, b"", b"x" * 4096]:
+            with self.subTest(size=len(content)):
+                output = self._compress(GzipBlockCompressor, content, 2, 4096)
+                self.assertEqual(gzip.decompress(output), content)
+
+    def test_gzip_output_is_single_member(self):
+        output = self._compress(GzipBlockCompressor, self.content, 3, 1000)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(output), self.content)
+        self.assertTrue(decompressor.eof)
+        self.assertEqual(decompressor.unused_data, b"")
+
+    def test_gzip_trailer_contains_size_of_content(self):
+        output = self._compress(GzipBlockCompressor, self.content, 2, 1000)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "output.xml.gz")
+            with open(path, "wb") as ptr:
+                ptr.write(output)
+            self.assertEqual(uncompressed_size(path, len(output)), len(self.content))
+
+    def test_output_independent_of_workers_and_writes(self):
+        for compressor in [GzipBlockCompressor, XzBlockCompressor]:
+            with self.subTest(compressor=compressor.__name__):
+                outputs = [
+                    self._compress(compressor, self.content, workers, 5000, chunk)
+                    for workers, chunk in [(1, 100), (2, 7), (4, 100_000)]
+                ]
+                self.assertEqual(outputs[0], outputs[1])
+                self.assertEqual(outputs[0], outputs[2])
+
+    def test_gzip_blocks_compressed_with_preceding_block_as_dictionary(self):
+        # the content repeats after the first block, so with the preceding
+        # block as dictionary, the second block is very small
+        block = os.urandom(2000)
+        output = self._compress(GzipBlockCompressor, block * 2, 2, 2000)
+        self.assertLess(len(output), 2200)
+
+    def test_xz_output_decompressed_to_content(self):
+        for content in [self.content, b"", b"x" * 4096]:
+            with self.subTest(size=len(content)):
+                output = self._compress(XzBlockCompressor, content, 2, 4096)
+                self.assertEqual(lzma.decompress(output), content)
+
+    def test_xz_sizes_of_blocks_recorded(self):
+        output = self._compress(XzBlockCompressor, self.content, 2, 50_000)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "output.xml.xz")
+            with open(path, "wb") as ptr:
+                ptr.write(output)
+            self.assertEqual(uncompressed_size(path, len(output)), len(self.content))
+
+    def test_block_compressor_without_compression_cannot_be_created(self):
+        with self.assertRaises(TypeError):
+            BlockCompressor(io.BytesIO(), 2, 1024)
+
+    def test_fileobj_not_closed(self):
+        output = io.BytesIO()
+        with GzipBlockCompressor(output, 2) as compressor:
+            compressor.write(b"<TEI/>")
+        self.assertTrue(compressor.closed)
+        self.assertFalse(output.closed)
+
+    def _compress(self, compressor, content, workers, block_size, chunk=1000):
+        output = io.BytesIO()
+        with compressor(output, workers, block_size) as writer:
+            for start in range(0, len(content), chunk):
+                writer.write(content[start:start + chunk])
+        return output.getvalue()
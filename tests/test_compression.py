@@ -0,0 +1,195 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import tempfile
+import time
+import unittest
+
+from tei_make_corpus.archive import corpus_file_size, read_corpus_file
+from tei_make_corpus.compression import (
+    ESTIMATED_COMPRESSION_RATIO,
+    compression_ratio,
+    is_corpus_file_name,
+    open_compressed,
+    output_extension,
+    strip_compression_extension,
+    uncompressed_size,
+)
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+COMPRESSORS = {
+    ".gz": gzip.compress,
+    ".bz2": bz2.compress,
+    ".xz": lzma.compress,
+}
+if zstandard is not None:
+    COMPRESSORS[".zst"] = lambda data: zstandard.ZstdCompressor().compress(data)
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.corpus_dir = os.path.join("tests", "testdata", "xmlid")
+        self.contents = {}
+        for file_name in ["file1.xml", "file2.xml"]:
+            with open(os.path.join(self.corpus_dir, file_name), "rb") as ptr:
+                self.contents[file_name] = ptr.read()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_corpus_file_names(self):
+        for file_name in ["a.xml", "a.xml.gz", "a.xml.bz2", "a.xml.xz"]:
+            with self.subTest(file_name=file_name):
+                self.assertTrue(is_corpus_file_name(file_name))
+        for file_name in ["a.txt", "a.gz", "a.txt.gz", "a.xml.zip", "a.xmlgz"]:
+            with self.subTest(file_name=file_name):
+                self.assertFalse(is_corpus_file_name(file_name))
+
+    @unittest.skipIf(zstandard is None, "zstandard not installed")
+    def test_zstandard_file_name_is_corpus_file_name(self):
+        self.assertTrue(is_corpus_file_name("a.xml.zst"))
+
+    def test_compression_extension_stripped(self):
+        self.assertEqual(strip_compression_extension("dir/a.xml.gz"), "dir/a.xml")
+        self.assertEqual(strip_compression_extension("dir/a.xml"), "dir/a.xml")
+
+    def test_compressed_files_read_decompressed(self):
+        for extension in COMPRESSORS:
+            with self.subTest(extension=extension):
+                path = self._write_compressed("file1.xml", extension)
+                self.assertEqual(read_corpus_file(path), self.contents["file1.xml"])
+
+    def test_recorded_uncompressed_size_used(self):
+        data = b"<TEI>" + b"x" * 100_000 + b"</TEI>"
+        for extension in [".gz", ".xz", ".zst"]:
+            if extension not in COMPRESSORS:
+                continue
+            with self.subTest(extension=extension):
+                path = os.path.join(self.tempdir.name, "large.xml" + extension)
+                with open(path, "wb") as ptr:
+                    ptr.write(COMPRESSORS[extension](data))
+                self.assertEqual(corpus_file_size(path), len(data))
+
+    def test_size_of_concatenated_xz_streams(self):
+        data = [b"x" * 100_000, b"y" * 50_000]
+        path = os.path.join(self.tempdir.name, "streams.xml.xz")
+        with open(path, "wb") as ptr:
+            ptr.write(lzma.compress(data[0]) + bytes(8) + lzma.compress(data[1]))
+        self.assertEqual(
+            uncompressed_size(path, os.path.getsize(path)), len(b"".join(data))
+        )
+
+    def test_size_estimated_if_not_recorded(self):
+        path = self._write_compressed("file1.xml", ".bz2")
+        size = os.path.getsize(path)
+        self.assertEqual(corpus_file_size(path), size * ESTIMATED_COMPRESSION_RATIO)
+
+    def test_size_estimated_for_invalid_file(self):
+        path = os.path.join(self.tempdir.name, "invalid.xml.xz")
+        with open(path, "wb") as ptr:
+            ptr.write(b"x" * 100)
+        self.assertEqual(
+            uncompressed_size(path, 100), 100 * ESTIMATED_COMPRESSION_RATIO
+        )
+
+    def test_compressed_archive_members_read_decompressed(self):
+        archive_path = os.path.join(self.tempdir.name, "corpus.tar")
+        with tarfile.open(archive_path, "w") as archive:
+            for extension in COMPRESSORS:
+                data = COMPRESSORS[extension](self.contents["file2.xml"])
+                tarinfo = tarfile.TarInfo("file2.xml" + extension)
+                tarinfo.size = len(data)
+                archive.addfile(tarinfo, io.BytesIO(data))
+        for extension in COMPRESSORS:
+            with self.subTest(extension=extension):
+                self.assertEqual(
+                    read_corpus_file(f"{archive_path}/file2.xml{extension}"),
+                    self.contents["file2.xml"],
+                )
+
+    def test_partition_output_same_as_for_uncompressed_files(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join(self.corpus_dir, "header.xml")
+        )
+        uncompressed = [
+            os.path.join(self.corpus_dir, "file1.xml"),
+            os.path.join(self.corpus_dir, "file2.xml"),
+        ]
+        expected = io.BytesIO()
+        Partition(header_handler, uncompressed, XmlIdRemover()).write_partition(
+            expected
+        )
+        for extension in COMPRESSORS:
+            for workers in [1, 2]:
+                with self.subTest(extension=extension, workers=workers):
+                    output = io.BytesIO()
+                    Partition(
+                        header_handler,
+                        [
+                            self._write_compressed("file1.xml", extension),
+                            self._write_compressed("file2.xml", extension),
+                        ],
+                        XmlIdRemover(),
+                        workers=workers,
+                    ).write_partition(output)
+                    self.assertEqual(output.getvalue(), expected.getvalue())
+
+    def test_output_compressed_without_closing_file(self):
+        for compression, extension in [
+            ("gzip", ".gz"),
+            ("xz", ".xz"),
+            ("zstd", ".zst"),
+        ]:
+            if extension not in COMPRESSORS:
+                continue
+            with self.subTest(compression=compression):
+                self.assertEqual(output_extension(compression), extension)
+                output = io.BytesIO()
+                with open_compressed(output, compression) as compressed:
+                    compressed.write(self.contents["file1.xml"])
+                self.assertFalse(output.closed)
+                path = os.path.join(self.tempdir.name, "output.xml" + extension)
+                with open(path, "wb") as ptr:
+                    ptr.write(output.getvalue())
+                self.assertEqual(read_corpus_file(path), self.contents["file1.xml"])
+
+    def test_compressed_output_independent_of_time(self):
+        outputs = []
+        for _ in range(2):
+            output = io.BytesIO()
+            with open_compressed(output, "gzip") as compressed:
+                compressed.write(self.contents["file1.xml"])
+            outputs.append(output.getvalue())
+            time.sleep(1)
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_compression_ratio(self):
+        samples = [self.contents["file1.xml"], self.contents["file2.xml"]]
+        data = b"".join(samples)
+        self.assertAlmostEqual(
+            compression_ratio(samples, "gzip"),
+            len(data) / len(gzip.compress(data, compresslevel=6)),
+            delta=0.1,
+        )
+        self.assertEqual(compression_ratio([], "gzip"), 1.0)
+
+    def test_start_of_file_read(self):
+        path = self._write_compressed("file1.xml", ".gz")
+        self.assertEqual(read_corpus_file(path, 10), self.contents["file1.xml"][:10])
+
+    def _write_compressed(self, file_name, extension):
+        path = os.path.join(self.tempdir.name, file_name + extension)
+        with open(path, "wb") as ptr:
+            ptr.write(COMPRESSORS[extension](self.contents[file_name]))
+        return path
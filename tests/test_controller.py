@@ -506,3 +506,512 @@ class TeiMakeCorpusControllerTest(unittest.TestCase):
             ["corpus", "-c", "header.xml", "--config", cfg, "--add-docid=1"]
         )
         self.assertEqual(self.mock_use_case.request.docid_pattern_index, 1)
+
+    def test_default_for_workers_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertEqual(self.mock_use_case.request.workers, 1)
+
+    def test_controller_extracts_workers_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--workers", "8"]
+        )
+        self.assertEqual(self.mock_use_case.request.workers, 8)
+
+    def test_non_positive_number_of_workers_rejected(self):
+        for val in ["0", "-2", "two"]:
+            with self.subTest():
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus", "-c", "header.xml", "--workers", val]
+                    )
+
+    def test_default_for_partition_workers_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertEqual(self.mock_use_case.request.partition_workers, 1)
+
+    def test_controller_extracts_partition_workers_option(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "-f",
+                "out.xml",
+                "--split-size",
+                "--partition-workers",
+                "4",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.partition_workers, 4)
+
+    def test_partition_workers_option_requires_split_option(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--partition-workers", "4"]
+            )
+
+    def test_default_for_backend_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertEqual(self.mock_use_case.request.backend, "process")
+
+    def test_controller_extracts_backend_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--workers", "4", "--backend", "thread"]
+        )
+        self.assertEqual(self.mock_use_case.request.backend, "thread")
+
+    def test_invalid_value_for_backend_option_raises_error(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--backend", "fiber"]
+            )
+
+    def test_default_for_discovery_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertEqual(self.mock_use_case.request.discovery, "sort")
+
+    def test_controller_extracts_discovery_option(self):
+        for discovery in ["sort", "walk", "external-sort"]:
+            with self.subTest():
+                self.mock_use_case.request = None
+                self.controller.process_arguments(
+                    ["corpus", "-c", "header.xml", "--discovery", discovery]
+                )
+                self.assertEqual(self.mock_use_case.request.discovery, discovery)
+
+    def test_invalid_value_for_discovery_option_raises_error(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--discovery", "random"]
+            )
+
+    def test_default_for_walk_threads_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertEqual(self.mock_use_case.request.walk_threads, 1)
+
+    def test_controller_extracts_walk_threads_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--walk-threads", "16"]
+        )
+        self.assertEqual(self.mock_use_case.request.walk_threads, 16)
+
+    def test_default_for_listing_cache_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.listing_cache)
+
+    def test_controller_extracts_listing_cache_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--listing-cache", "listings.db"]
+        )
+        self.assertEqual(self.mock_use_case.request.listing_cache, "listings.db")
+
+    def test_non_positive_number_of_walk_threads_rejected(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--walk-threads", "0"]
+            )
+
+    def test_default_for_shard_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.shard)
+
+    def test_controller_extracts_shard_option(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "-f",
+                "out.xml",
+                "--split-size",
+                "--shard",
+                "2/4",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.shard, (2, 4))
+
+    def test_invalid_values_for_shard_option_rejected(self):
+        for val in ["0/4", "5/4", "2", "a/b", "1/0", "-1/2"]:
+            with self.subTest(val=val):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        [
+                            "corpus",
+                            "-c",
+                            "header.xml",
+                            "-f",
+                            "out.xml",
+                            "--split-size",
+                            "--shard",
+                            val,
+                        ]
+                    )
+
+    def test_shard_option_requires_split_option(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--shard", "1/2"]
+            )
+
+    def test_controller_extracts_export_plan_option(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "-f",
+                "out.xml",
+                "--split-documents",
+                "--export-plan",
+                "plan.json",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.plan_file, "plan.json")
+
+    def test_export_plan_option_requires_split_option(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--export-plan", "plan.json"]
+            )
+
+    def test_controller_extracts_create_queue_option(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "-f",
+                "out.xml",
+                "--split-size",
+                "--create-queue",
+                "queue.db",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.create_queue, "queue.db")
+
+    def test_create_queue_option_requires_split_option(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--create-queue", "queue.db"]
+            )
+
+    def test_controller_extracts_worker_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--worker", "queue.db"]
+        )
+        self.assertEqual(self.mock_use_case.request.worker_queue, "queue.db")
+        self.assertEqual(self.mock_use_case.request.lease_timeout, 600)
+
+    def test_create_queue_and_worker_options_exclusive(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                [
+                    "corpus",
+                    "-c",
+                    "header.xml",
+                    "-f",
+                    "out.xml",
+                    "--split-size",
+                    "--create-queue",
+                    "queue.db",
+                    "--worker",
+                    "queue.db",
+                ]
+            )
+
+    def test_controller_extracts_lease_timeout_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--worker", "q.db", "--lease-timeout", "30"]
+        )
+        self.assertEqual(self.mock_use_case.request.lease_timeout, 30)
+
+    def test_invalid_lease_timeout_rejected(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                [
+                    "corpus",
+                    "-c",
+                    "header.xml",
+                    "--worker",
+                    "q.db",
+                    "--lease-timeout",
+                    "0",
+                ]
+            )
+
+    def test_controller_extracts_incremental_option(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "-f", "out.xml", "--incremental"]
+        )
+        self.assertTrue(self.mock_use_case.request.incremental)
+
+    def test_incremental_option_requires_output_file(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--incremental"]
+            )
+
+    def test_incremental_option_rejected_with_distributing_options(self):
+        for option in [
+            ["--split-documents", "--shard", "1/2"],
+            ["--split-documents", "--create-queue", "queue.db"],
+            ["--worker", "queue.db"],
+            ["--resplit"],
+        ]:
+            with self.subTest(option=option):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus", "-c", "header.xml", "-f", "out.xml", "--incremental"]
+                        + option
+                    )
+
+    def test_default_for_resplit_option(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.resplit)
+
+    def test_controller_extracts_resplit_option(self):
+        self.controller.process_arguments(
+            ["corpus.xml", "-c", "header.xml", "-f", "out.xml", "--resplit"]
+        )
+        self.assertEqual(self.mock_use_case.request.resplit, "copy")
+
+    def test_controller_extracts_resplit_mode(self):
+        self.controller.process_arguments(
+            ["corpus.xml", "-c", "header.xml", "-f", "out.xml", "--resplit", "stream"]
+        )
+        self.assertEqual(self.mock_use_case.request.resplit, "stream")
+
+    def test_invalid_resplit_mode_rejected(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus.xml", "-c", "header.xml", "--resplit", "parse"]
+            )
+
+    def test_resplit_option_rejected_with_transforming_options(self):
+        for option in [["-d"], ["--prefix-xmlid"], ["--add-docid"]]:
+            with self.subTest(option=option):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus.xml", "-c", "header.xml", "--resplit"] + option
+                    )
+
+    def test_controller_extracts_pipeline_backend(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--backend", "pipeline"]
+        )
+        self.assertEqual(self.mock_use_case.request.backend, "pipeline")
+
+    def test_defaults_for_pipeline_options(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.stage_workers)
+        self.assertEqual(self.mock_use_case.request.queue_size, 64)
+
+    def test_controller_extracts_stage_workers_option(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "--backend",
+                "pipeline",
+                "--stage-workers",
+                "read=8,transform=4",
+                "--queue-size",
+                "16",
+            ]
+        )
+        self.assertEqual(
+            self.mock_use_case.request.stage_workers, {"read": 8, "transform": 4}
+        )
+        self.assertEqual(self.mock_use_case.request.queue_size, 16)
+
+    def test_invalid_values_for_stage_workers_rejected(self):
+        for val in ["read=0", "parse=2", "read", "read=2;write=1", ""]:
+            with self.subTest(val=val):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus", "-c", "header.xml", "--stage-workers", val]
+                    )
+
+    def test_invalid_queue_size_rejected(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--queue-size", "0"]
+            )
+
+    def test_defaults_for_schedule_options(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertEqual(self.mock_use_case.request.schedule, "order")
+        self.assertEqual(self.mock_use_case.request.reorder_buffer, 500_000_000)
+
+    def test_controller_extracts_schedule_options(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "--workers",
+                "4",
+                "--schedule",
+                "size",
+                "--reorder-buffer",
+                "200M",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.schedule, "size")
+        self.assertEqual(self.mock_use_case.request.reorder_buffer, 200_000_000)
+
+    def test_invalid_reorder_buffer_rejected(self):
+        for val in ["0", "-2", "1.5k0"]:
+            with self.subTest(val=val):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus", "-c", "header.xml", "--reorder-buffer", val]
+                    )
+
+    def test_no_documents_streamed_by_default(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.stream_threshold)
+
+    def test_controller_extracts_stream_threshold(self):
+        for args, expected in [
+            (["--stream-threshold"], 100_000_000),
+            (["--stream-threshold", "2G"], 2_000_000_000),
+            (["--stream-threshold", "500k"], 500_000),
+        ]:
+            with self.subTest(args=args):
+                self.mock_use_case.request = None
+                self.controller.process_arguments(["corpus", "-c", "header.xml", *args])
+                self.assertEqual(self.mock_use_case.request.stream_threshold, expected)
+
+    def test_no_documents_copied_by_default(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertFalse(self.mock_use_case.request.passthrough)
+
+    def test_controller_extracts_passthrough(self):
+        self.controller.process_arguments(
+            ["corpus", "-c", "header.xml", "--passthrough"]
+        )
+        self.assertTrue(self.mock_use_case.request.passthrough)
+
+    def test_defaults_for_fragment_cache_options(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.fragment_cache)
+        self.assertEqual(self.mock_use_case.request.fragment_cache_size, 1_000_000_000)
+
+    def test_controller_extracts_fragment_cache_options(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "--fragment-cache",
+                "cache",
+                "--fragment-cache-size",
+                "5G",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.fragment_cache, "cache")
+        self.assertEqual(self.mock_use_case.request.fragment_cache_size, 5_000_000_000)
+
+    def test_invalid_fragment_cache_size_rejected(self):
+        for val in ["0", "-2", "1.5k0"]:
+            with self.subTest(val=val):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus", "-c", "header.xml", "--fragment-cache-size", val]
+                    )
+
+    def test_invalid_stream_threshold_rejected(self):
+        for val in ["0", "-2", "1.5k0"]:
+            with self.subTest(val=val):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        ["corpus", "-c", "header.xml", "--stream-threshold", val]
+                    )
+
+    def test_output_not_compressed_by_default(self):
+        self.controller.process_arguments(["corpus", "-c", "header.xml"])
+        self.assertIsNone(self.mock_use_case.request.compression)
+        self.assertFalse(self.mock_use_case.request.split_compressed)
+
+    def test_controller_extracts_compression(self):
+        for compression in ["gzip", "xz"]:
+            with self.subTest(compression=compression):
+                self.mock_use_case.request = None
+                self.controller.process_arguments(
+                    ["corpus", "-c", "header.xml", "--compress", compression]
+                )
+                self.assertEqual(self.mock_use_case.request.compression, compression)
+
+    def test_invalid_compression_rejected(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                ["corpus", "-c", "header.xml", "--compress", "bzip2"]
+            )
+
+    def test_controller_extracts_split_compressed(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "-f",
+                "out.xml",
+                "--split-size",
+                "10M",
+                "--compress",
+                "gzip",
+                "--split-compressed",
+            ]
+        )
+        self.assertTrue(self.mock_use_case.request.split_compressed)
+        self.assertEqual(self.mock_use_case.request.split_size, 10_000_000)
+
+    def test_split_compressed_requires_compression_and_split_size(self):
+        for args in [
+            ["--split-size", "10M"],
+            ["--compress", "gzip"],
+            ["--split-documents", "10", "--compress", "gzip"],
+        ]:
+            with self.subTest(args=args):
+                with self.assertRaises(SystemExit):
+                    self.controller.process_arguments(
+                        [
+                            "corpus",
+                            "-c",
+                            "header.xml",
+                            "-f",
+                            "out.xml",
+                            "--split-compressed",
+                            *args,
+                        ]
+                    )
+
+    def test_controller_extracts_compress_workers(self):
+        self.controller.process_arguments(
+            [
+                "corpus",
+                "-c",
+                "header.xml",
+                "--compress",
+                "gzip",
+                "--compress-workers",
+                "4",
+            ]
+        )
+        self.assertEqual(self.mock_use_case.request.compress_workers, 4)
+
+    def test_invalid_compress_workers_rejected(self):
+        with self.assertRaises(SystemExit):
+            self.controller.process_arguments(
+                [
+                    "corpus",
+                    "-c",
+                    "header.xml",
+                    "--compress",
+                    "gzip",
+                    "--compress-workers",
+                    "0",
+                ]
+            )
@@ -1,3 +1,4 @@
+import json
 import os
 import unittest
 
@@ -6,7 +7,6 @@ from lxml import etree
 from tei_make_corpus.cli.corpus_config import CorpusConfig
 from tei_make_corpus.corpus_maker import TeiCorpusMaker
 from tei_make_corpus.corpus_stream import CorpusStreamImpl
-from tei_make_corpus.file_size_estimator import FileSizeEstimatorImpl
 from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
 from tei_make_corpus.partitioner import Partitioner
 from tei_make_corpus.path_finder import PathFinderImpl
@@ -14,6 +14,17 @@ from tei_make_corpus.xmlid_handler import XmlIdPrefixer, XmlIdRemover
 from tests.utils import MockHeaderHandler, create_validator
 
 
+class ListPathFinder:
+    def __init__(self, files):
+        self.files = files
+
+    def get_paths_for_corpus_files(self, corpus_dir, header_file):
+        return self.files
+
+    def iter_sorted_paths_for_corpus_files(self, corpus_dir, header_file):
+        return iter(self.files)
+
+
 class TeiCorpusMakerTester(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -27,7 +38,6 @@ class TeiCorpusMakerTester(unittest.TestCase):
         )
         self.header_handler = MockHeaderHandler()
         self.path_finder = PathFinderImpl()
-        self.size_estimator = FileSizeEstimatorImpl()
         self.xmlid_handler = XmlIdRemover()
         self.config_clean = CorpusConfig(clean_header=True)
         self.config_default = CorpusConfig(clean_header=False)
@@ -50,9 +60,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         header_file = os.path.join("tests", "testdata", "header.xml")
         empty_dir = os.path.join("tests", "testdata", "corpus")
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         corpus_maker = TeiCorpusMaker(
             self.mock_stream, partitioner, self.config_default
         )
@@ -80,9 +88,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         header_file = os.path.join("tests", "testdata", "header.xml")
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         corpus_maker = TeiCorpusMaker(
             self.mock_stream, partitioner, self.config_default
         )
@@ -97,9 +103,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         header_file = os.path.join("tests", "testdata", "header.xml")
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         corpus_maker = TeiCorpusMaker(
             self.mock_stream, partitioner, self.config_default
         )
@@ -113,9 +117,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         header_file = os.path.join("tests", "testdata", "header.xml")
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         corpus_maker = TeiCorpusMaker(
             self.mock_stream, partitioner, self.config_default
         )
@@ -127,9 +129,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         config = CorpusConfig(clean_header=False, split_docs=1)
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
         corpus_maker = TeiCorpusMaker(stream, partitioner, config)
         corpus_maker.build_corpus(corpus_dir, header_file)
@@ -143,9 +143,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         config = CorpusConfig(clean_header=False, split_docs=1)
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
         corpus_maker = TeiCorpusMaker(stream, partitioner, config)
         corpus_maker.build_corpus(corpus_dir, header_file)
@@ -161,9 +159,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         config = CorpusConfig(clean_header=False, split_docs=1)
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
         corpus_maker = TeiCorpusMaker(stream, partitioner, config)
         corpus_maker.build_corpus(corpus_dir, header_file)
@@ -177,9 +173,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         header_file = os.path.join("tests", "testdata", "header.xml")
         empty_dir = os.path.join("tests", "testdata", "empty")
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         corpus_maker = TeiCorpusMaker(
             self.mock_stream, partitioner, self.config_default
         )
@@ -191,9 +185,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         config = CorpusConfig(clean_header=False, split_size=2000)
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
         corpus_maker = TeiCorpusMaker(stream, partitioner, config)
         corpus_maker.build_corpus(corpus_dir, header_file)
@@ -207,9 +199,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         config = CorpusConfig(clean_header=False, split_size=2000)
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
         corpus_maker = TeiCorpusMaker(stream, partitioner, config)
         corpus_maker.build_corpus(corpus_dir, header_file)
@@ -225,9 +215,7 @@ class TeiCorpusMakerTester(unittest.TestCase):
         corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
         config = CorpusConfig(clean_header=False, split_size=2000)
         header_handler = TeiHeaderHandlerImpl(header_file)
-        partitioner = Partitioner(
-            header_handler, self.path_finder, self.size_estimator, self.xmlid_handler
-        )
+        partitioner = Partitioner(header_handler, self.path_finder, self.xmlid_handler)
         stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
         corpus_maker = TeiCorpusMaker(stream, partitioner, config)
         corpus_maker.build_corpus(corpus_dir, header_file)
@@ -244,7 +232,6 @@ class TeiCorpusMakerTester(unittest.TestCase):
         partitioner = Partitioner(
             header_handler,
             self.path_finder,
-            self.size_estimator,
             XmlIdPrefixer(),
         )
         corpus_maker = TeiCorpusMaker(
@@ -262,7 +249,6 @@ class TeiCorpusMakerTester(unittest.TestCase):
         partitioner = Partitioner(
             header_handler,
             self.path_finder,
-            self.size_estimator,
             XmlIdPrefixer(),
         )
         corpus_maker = TeiCorpusMaker(self.mock_stream, partitioner, self.config_clean)
@@ -270,3 +256,166 @@ class TeiCorpusMakerTester(unittest.TestCase):
         doc = etree.parse(self.mock_stream.output_file)
         result = self.validator.validate(doc)
         self.assertTrue(result)
+
+    def test_partitions_written_concurrently_identical_to_serial_output(self):
+        header_file = os.path.join("tests", "testdata", "header.xml")
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        pis = [etree.PI("xml-model", "href='tei_all.rng'")]
+        results = []
+        for partition_workers in [1, 3]:
+            config = CorpusConfig(
+                clean_header=True,
+                split_docs=1,
+                processing_instructions=pis,
+                partition_workers=partition_workers,
+            )
+            partitioner = Partitioner(header_handler, self.path_finder, XmlIdPrefixer())
+            stream = CorpusStreamImpl(
+                os.path.join("tests", "testdata", "output_file.xml")
+            )
+            corpus_maker = TeiCorpusMaker(stream, partitioner, config)
+            corpus_maker.build_corpus(corpus_dir, header_file)
+            output = []
+            for file in self.partition_files:
+                with open(os.path.join("tests", "testdata", file), "rb") as ptr:
+                    output.append(ptr.read())
+                os.remove(os.path.join("tests", "testdata", file))
+            results.append(output)
+        self.assertEqual(results[0], results[1])
+
+    def test_shards_together_identical_to_output_without_shards(self):
+        header_file = os.path.join("tests", "testdata", "cleaning", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        # repeated files result in prefix collisions across the parts
+        path_finder = ListPathFinder(
+            [os.path.join("tests", "testdata", "cleaning", "file1.xml")] * 8
+        )
+        expected = self._build_shards(header_handler, path_finder, [None])
+        self.assertEqual(len(expected), 4)
+        for partition_workers in [1, 2]:
+            with self.subTest(partition_workers=partition_workers):
+                result = self._build_shards(
+                    header_handler,
+                    path_finder,
+                    [(1, 3), (2, 3), (3, 3)],
+                    partition_workers,
+                )
+                self.assertEqual(result, expected)
+
+    def test_shard_writes_only_assigned_output_files(self):
+        header_file = os.path.join("tests", "testdata", "header.xml")
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        config = CorpusConfig(clean_header=False, split_docs=1, shard=(2, 3))
+        partitioner = Partitioner(
+            TeiHeaderHandlerImpl(header_file), self.path_finder, self.xmlid_handler
+        )
+        corpus_maker = TeiCorpusMaker(self.mock_stream, partitioner, config)
+        corpus_maker.build_corpus(corpus_dir, header_file)
+        written = [
+            file
+            for file in self.partition_files
+            if os.path.exists(os.path.join("tests", "testdata", file))
+        ]
+        self.assertEqual(written, ["output_file0002.xml"])
+
+    def test_partition_plan_exported(self):
+        header_file = os.path.join("tests", "testdata", "header.xml")
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        plan_file = os.path.join("tests", "testdata", "plan.json")
+        config = CorpusConfig(
+            clean_header=False, split_docs=2, shard=(1, 2), plan_file=plan_file
+        )
+        partitioner = Partitioner(
+            TeiHeaderHandlerImpl(header_file), self.path_finder, self.xmlid_handler
+        )
+        corpus_maker = TeiCorpusMaker(self.mock_stream, partitioner, config)
+        try:
+            with self.assertLogs("tei_make_corpus.corpus_maker") as logged:
+                corpus_maker.build_corpus(corpus_dir, header_file)
+            with open(plan_file) as ptr:
+                plan = json.load(ptr)
+        finally:
+            os.remove(plan_file)
+        files = self.path_finder.get_paths_for_corpus_files(corpus_dir, header_file)
+        self.assertEqual(plan["shards"], 2)
+        self.assertEqual(
+            plan["partitions"],
+            [
+                {
+                    "output_file": os.path.join("tests", "testdata", file),
+                    "shard": shard,
+                    "files": part_files,
+                }
+                for file, shard, part_files in [
+                    ("output_file0001.xml", 1, files[:2]),
+                    ("output_file0002.xml", 2, files[2:]),
+                ]
+            ],
+        )
+        self.assertIn(plan["digest"], logged.output[0])
+
+    def _build_shards(self, header_handler, path_finder, shards, partition_workers=1):
+        output = {}
+        for shard in shards:
+            config = CorpusConfig(
+                clean_header=True,
+                split_docs=2,
+                shard=shard,
+                partition_workers=partition_workers,
+            )
+            partitioner = Partitioner(header_handler, path_finder, XmlIdPrefixer())
+            stream = CorpusStreamImpl(
+                os.path.join("tests", "testdata", "output_file.xml")
+            )
+            TeiCorpusMaker(stream, partitioner, config).build_corpus(
+                "corpus", "header.xml"
+            )
+            for file in self.partition_files:
+                file_path = os.path.join("tests", "testdata", file)
+                if os.path.exists(file_path):
+                    with open(file_path, "rb") as ptr:
+                        output[file] = ptr.read()
+                    os.remove(file_path)
+        return output
+
+    def test_workers_from_queue_identical_to_output_without_queue(self):
+        header_file = os.path.join("tests", "testdata", "cleaning", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        path_finder = ListPathFinder(
+            [os.path.join("tests", "testdata", "cleaning", "file1.xml")] * 8
+        )
+        expected = self._build_shards(header_handler, path_finder, [None])
+        queue_file = os.path.join("tests", "testdata", "queue.db")
+        try:
+            self._build_from_queue(
+                header_handler,
+                path_finder,
+                CorpusConfig(clean_header=True, split_docs=2, create_queue=queue_file),
+            )
+            self.assertFalse(
+                any(
+                    os.path.exists(os.path.join("tests", "testdata", file))
+                    for file in self.partition_files
+                )
+            )
+            for _ in range(2):
+                self._build_from_queue(
+                    header_handler,
+                    path_finder,
+                    CorpusConfig(clean_header=True, worker_queue=queue_file),
+                )
+        finally:
+            os.remove(queue_file)
+        result = {}
+        for file in self.partition_files:
+            with open(os.path.join("tests", "testdata", file), "rb") as ptr:
+                result[file] = ptr.read()
+        self.assertEqual(result, expected)
+
+    def _build_from_queue(self, header_handler, path_finder, config):
+        partitioner = Partitioner(header_handler, path_finder, XmlIdPrefixer())
+        stream = CorpusStreamImpl(os.path.join("tests", "testdata", "output_file.xml"))
+        TeiCorpusMaker(stream, partitioner, config).build_corpus(
+            "corpus", "header.xml"
+        )
@@ -0,0 +1,234 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from lxml import etree
+
+from tei_make_corpus.cli.corpus_config import CorpusConfig
+from tei_make_corpus.corpus_maker import TeiCorpusMaker
+from tei_make_corpus.corpus_resplitter import (
+    TeiCorpusResplitter,
+    iter_tei_documents,
+    scan_tei_documents,
+)
+from tei_make_corpus.corpus_stream import CorpusStreamImpl
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.partitioner import Partitioner
+from tei_make_corpus.path_finder import PathFinderImpl
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+
+
+class TeiCorpusResplitterTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.header_file = os.path.join("tests", "testdata", "header.xml")
+        self.corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        self.header_handler = TeiHeaderHandlerImpl(self.header_file)
+        self.path_finder = PathFinderImpl()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_resplit_by_documents_identical_to_split_build(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        expected = self._build("expected", CorpusConfig(False, split_docs=2))
+        result = self._resplit(source, "result", CorpusConfig(False, split_docs=2))
+        self.assertEqual(self._read(result), self._read(expected))
+
+    def test_resplit_by_size_of_documents(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        documents = list(scan_tei_documents(os.path.join(source, "corpus.xml")))
+        split_size = documents[0][2] - documents[0][1] + 1
+        result = self._resplit(
+            source, "result", CorpusConfig(False, split_size=split_size)
+        )
+        self.assertEqual(
+            [
+                len(list(scan_tei_documents(os.path.join(result, file))))
+                for file in sorted(os.listdir(result))
+            ],
+            [2, len(documents) - 2],
+        )
+
+    def test_merged_parts_identical_to_single_build(self):
+        parts = self._build("parts", CorpusConfig(False, split_docs=1))
+        expected = self._build("expected", CorpusConfig(clean_header=False))
+        result = self._resplit(parts, "result", CorpusConfig(clean_header=False))
+        self.assertEqual(self._read(result), self._read(expected))
+
+    def test_markup_in_comments_not_mistaken_for_documents(self):
+        corpus_file = self._write_file(
+            "corpus.xml",
+            b"<?xml version='1.0' encoding='UTF-8'?>\n"
+            b'<teiCorpus xmlns="http://www.tei-c.org/ns/1.0">\n'
+            b"<teiHeader/>\n"
+            b"<TEI><!-- </TEI> <TEI> --><text/></TEI>\n"
+            b"<TEI><TEI/><TEI><text/></TEI></TEI>\n"
+            b"</teiCorpus>",
+        )
+        with open(corpus_file, "rb") as ptr:
+            content = ptr.read()
+        self.assertEqual(
+            [content[start:end] for _, start, end in scan_tei_documents(corpus_file)],
+            [
+                b"<TEI><!-- </TEI> <TEI> --><text/></TEI>",
+                b"<TEI><TEI/><TEI><text/></TEI></TEI>",
+            ],
+        )
+
+    def test_greater_than_in_attribute_values_not_mistaken_for_end_of_tag(self):
+        corpus_file = self._write_file(
+            "corpus.xml",
+            b'<teiCorpus xmlns="http://www.tei-c.org/ns/1.0" n=">">\n'
+            b'<teiHeader n="a>"/>\n'
+            b'<TEI n="/>"><text rend=\'a > b\'/><TEI n=">"/></TEI>\n'
+            b"</teiCorpus>",
+        )
+        with open(corpus_file, "rb") as ptr:
+            content = ptr.read()
+        self.assertEqual(
+            [content[start:end] for _, start, end in scan_tei_documents(corpus_file)],
+            [b'<TEI n="/>"><text rend=\'a > b\'/><TEI n=">"/></TEI>'],
+        )
+
+    def test_incomplete_corpus_file_rejected(self):
+        corpus_file = self._write_file(
+            "corpus.xml", b"<teiCorpus><teiHeader/><TEI><text/>"
+        )
+        with self.assertRaises(ValueError):
+            list(scan_tei_documents(corpus_file))
+
+    def test_invalid_corpus_file_omitted(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        self._write_file(os.path.join("source", "invalid.xml"), b"<TEI/>")
+        expected = self._build("expected", CorpusConfig(clean_header=False))
+        with self.assertLogs("tei_make_corpus.corpus_resplitter", level="ERROR"):
+            result = self._resplit(source, "result", CorpusConfig(False))
+        self.assertEqual(self._read(result), self._read(expected))
+
+    def test_compressed_corpus_file_rejected(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        self._compress(os.path.join(source, "corpus.xml"))
+        with self.assertRaises(ValueError):
+            self._resplit(source, "result", CorpusConfig(False))
+
+    def test_input_file_not_overwritten(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        source_file = os.path.join(source, "corpus.xml")
+        resplitter = TeiCorpusResplitter(
+            CorpusStreamImpl(source_file),
+            self.header_handler,
+            self.path_finder,
+            CorpusConfig(clean_header=False),
+        )
+        with self.assertRaises(ValueError):
+            resplitter.resplit_corpus(source, self.header_file)
+
+    def test_streamed_resplit_by_documents_distributes_as_split_build(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        expected = self._build("expected", CorpusConfig(False, split_docs=2))
+        result = self._resplit(
+            source, "result", CorpusConfig(False, split_docs=2), mode="stream"
+        )
+        self.assertEqual(self._count_documents(result), self._count_documents(expected))
+
+    def test_streamed_resplit_by_size(self):
+        source = self._write_file(
+            "corpus.xml",
+            b'<teiCorpus xmlns="http://www.tei-c.org/ns/1.0"><teiHeader/>'
+            + b"<TEI><text>abc</text></TEI>" * 5
+            + b"</teiCorpus>",
+        )
+        result = self._resplit(
+            source, "result", CorpusConfig(False, split_size=100), mode="stream"
+        )
+        self.assertEqual(self._count_documents(result), [2, 2, 1])
+
+    def test_streamed_resplit_of_compressed_corpus_file(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        expected = self._build("expected", CorpusConfig(False, split_docs=2))
+        self._compress(os.path.join(source, "corpus.xml"))
+        result = self._resplit(
+            source, "result", CorpusConfig(False, split_docs=2), mode="stream"
+        )
+        self.assertEqual(self._count_documents(result), self._count_documents(expected))
+
+    def test_streamed_documents_keep_content_and_namespaces(self):
+        source = self._write_file(
+            "corpus.xml",
+            b'<teiCorpus xmlns="http://www.tei-c.org/ns/1.0"'
+            b' xmlns:xi="http://www.w3.org/2001/XInclude">'
+            b"<teiHeader><fileDesc/></teiHeader>\n"
+            b'<TEI xml:id="a"><text xi:href="b">\xc3\xa4</text></TEI>\n'
+            b"</teiCorpus>",
+        )
+        result = self._resplit(source, "result", CorpusConfig(False), mode="stream")
+        tree = etree.parse(os.path.join(result, "corpus.xml"))
+        tei = tree.find("{http://www.tei-c.org/ns/1.0}TEI")
+        self.assertEqual(tei.get("{http://www.w3.org/XML/1998/namespace}id"), "a")
+        text = tei.find("{http://www.tei-c.org/ns/1.0}text")
+        self.assertEqual(text.text, "\u00e4")
+        self.assertEqual(text.get("{http://www.w3.org/2001/XInclude}href"), "b")
+        self.assertEqual(len(tree.findall("{http://www.tei-c.org/ns/1.0}teiHeader")), 1)
+
+    def test_streamed_documents_cleared_after_use(self):
+        source = self._build("source", CorpusConfig(clean_header=False))
+        documents = iter_tei_documents([os.path.join(source, "corpus.xml")])
+        first = next(documents)
+        self.assertGreater(len(first), 0)
+        next(documents)
+        self.assertEqual(len(first), 0)
+
+    def test_streamed_resplit_omits_rest_of_invalid_file(self):
+        source = self._write_file(
+            "corpus.xml",
+            b'<teiCorpus xmlns="http://www.tei-c.org/ns/1.0"><teiHeader/>'
+            b"<TEI><text/></TEI><TEI><text></TEI>",
+        )
+        with self.assertLogs("tei_make_corpus.corpus_resplitter", level="ERROR"):
+            result = self._resplit(source, "result", CorpusConfig(False), mode="stream")
+        self.assertEqual(self._count_documents(result), [1])
+
+    def _build(self, name, config):
+        output_dir = os.path.join(self.tempdir.name, name)
+        os.mkdir(output_dir)
+        partitioner = Partitioner(self.header_handler, self.path_finder, XmlIdRemover())
+        stream = CorpusStreamImpl(os.path.join(output_dir, "corpus.xml"))
+        TeiCorpusMaker(stream, partitioner, config).build_corpus(
+            self.corpus_dir, self.header_file
+        )
+        return output_dir
+
+    def _resplit(self, source, name, config, mode="copy"):
+        output_dir = os.path.join(self.tempdir.name, name)
+        os.mkdir(output_dir)
+        stream = CorpusStreamImpl(os.path.join(output_dir, "corpus.xml"))
+        TeiCorpusResplitter(
+            stream, self.header_handler, self.path_finder, config, mode
+        ).resplit_corpus(source, self.header_file)
+        return output_dir
+
+    def _count_documents(self, output_dir):
+        return [
+            len(etree.parse(os.path.join(output_dir, file)).getroot()) - 1
+            for file in sorted(os.listdir(output_dir))
+        ]
+
+    def _read(self, output_dir):
+        output = {}
+        for file in os.listdir(output_dir):
+            with open(os.path.join(output_dir, file), "rb") as ptr:
+                output[file] = ptr.read()
+        return output
+
+    def _compress(self, file_path):
+        with open(file_path, "rb") as ptr, gzip.open(f"{file_path}.gz", "wb") as output:
+            output.write(ptr.read())
+        os.remove(file_path)
+
+    def _write_file(self, name, content):
+        file_path = os.path.join(self.tempdir.name, name)
+        with open(file_path, "wb") as ptr:
+            ptr.write(content)
+        return file_path
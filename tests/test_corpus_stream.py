@@ -44,3 +44,25 @@ class CorpusStreamTest(unittest.TestCase):
             result.append(self.corpus_stream.path())
         expected = [f"file{i:04}.xml" for i in range(1, 21)]
         self.assertEqual(result, expected)
+
+    def test_compression_extension_added_to_output_file(self):
+        for file_name in ["file.xml", "file.xml.gz"]:
+            with self.subTest(file_name=file_name):
+                corpus_stream = CorpusStreamImpl(file_name, compression="gzip")
+                self.assertEqual(corpus_stream.path(), "file.xml.gz")
+
+    def test_stdout_not_renamed_with_compression(self):
+        self.corpus_stream.set_compression("xz")
+        self.assertEqual(self.corpus_stream.path(), sys.stdout.buffer)
+
+    def test_update_output_file_name_with_compression_extension(self):
+        for template_name in ["file", "file.xml", "file.xml.xz", None]:
+            with self.subTest(template_name=template_name):
+                corpus_stream = CorpusStreamImpl(template_name, compression="xz")
+                result = []
+                for _ in range(3):
+                    corpus_stream.update_output_file_name()
+                    result.append(corpus_stream.path())
+                name = "part" if template_name is None else "file"
+                expected = [f"{name}{i:04}.xml.xz" for i in range(1, 4)]
+                self.assertEqual(result, expected)
@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from tei_make_corpus import directory_walker
+from tei_make_corpus.directory_walker import (
+    CachedDirectoryWalker,
+    ParallelDirectoryWalker,
+    walk_directory_tree,
+)
+
+
+class DirectoryWalkerTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        for path in [
+            "b.xml",
+            "a.txt",
+            "a/c.xml",
+            "a/b/a.xml",
+            "a/b/c/d.xml",
+            "b/a.xml",
+            "c/empty/",
+        ]:
+            full_path = os.path.join(self.tempdir.name, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if not path.endswith("/"):
+                with open(full_path, "w") as fp:
+                    fp.write(path)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_files_yielded_in_sorted_order_per_directory(self):
+        entries = walk_directory_tree(self.tempdir.name)
+        expected = ["a.txt", "b.xml", "a/c.xml", "a/b/a.xml", "a/b/c/d.xml", "b/a.xml"]
+        self.assertEqual(
+            [entry.path for entry in entries],
+            [os.path.join(self.tempdir.name, path) for path in expected],
+        )
+
+    def test_parallel_walker_yields_same_order_as_sequential_walk(self):
+        expected = [entry.path for entry in walk_directory_tree(self.tempdir.name)]
+        for threads in [1, 2, 8]:
+            with self.subTest(threads=threads):
+                walker = ParallelDirectoryWalker(threads)
+                entries = walker.walk(self.tempdir.name)
+                self.assertEqual([entry.path for entry in entries], expected)
+
+    def test_parallel_walker_in_wide_directory_tree(self):
+        for i in range(50):
+            sub_dir = os.path.join(self.tempdir.name, "wide", f"{i:03d}")
+            os.makedirs(sub_dir)
+            for j in range(3):
+                open(os.path.join(sub_dir, f"{j}.xml"), "w").close()
+        expected = [entry.path for entry in walk_directory_tree(self.tempdir.name)]
+        entries = ParallelDirectoryWalker(8).walk(self.tempdir.name)
+        self.assertEqual([entry.path for entry in entries], expected)
+
+    def test_symlinks_to_directories_not_followed(self):
+        os.symlink(
+            os.path.join(self.tempdir.name, "a"), os.path.join(self.tempdir.name, "l")
+        )
+        expected = ["a.txt", "b.xml", "a/c.xml", "a/b/a.xml", "a/b/c/d.xml", "b/a.xml"]
+        for entries in [
+            walk_directory_tree(self.tempdir.name),
+            ParallelDirectoryWalker(4).walk(self.tempdir.name),
+        ]:
+            with self.subTest():
+                self.assertEqual(
+                    [entry.path for entry in entries],
+                    [os.path.join(self.tempdir.name, path) for path in expected],
+                )
+
+    def test_nonexistent_directory_yields_nothing(self):
+        missing = os.path.join(self.tempdir.name, "missing")
+        self.assertEqual(list(walk_directory_tree(missing)), [])
+        self.assertEqual(list(ParallelDirectoryWalker(2).walk(missing)), [])
+
+    def test_file_status_retrieved_by_parallel_walker(self):
+        entries = ParallelDirectoryWalker(2, stat=True).walk(self.tempdir.name)
+        self.assertEqual(
+            [entry.stat().st_size for entry in entries],
+            [len(path) for path in ["a.txt", "b.xml", "a/c.xml"]]
+            + [len(path) for path in ["a/b/a.xml", "a/b/c/d.xml", "b/a.xml"]],
+        )
+
+    def test_throughput_logged_after_parallel_walk(self):
+        with self.assertLogs("tei_make_corpus.directory_walker", level="INFO") as cm:
+            list(ParallelDirectoryWalker(2).walk(self.tempdir.name))
+        self.assertIn("Walked 7 directories", cm.output[0])
+
+    def test_parallel_walk_can_be_stopped_early(self):
+        entries = ParallelDirectoryWalker(2).walk(self.tempdir.name)
+        self.assertEqual(next(entries).path, os.path.join(self.tempdir.name, "a.txt"))
+        entries.close()
+
+    def test_pending_listings_cancelled_if_walk_stopped_early(self):
+        for i in range(100):
+            os.makedirs(os.path.join(self.tempdir.name, f"d{i:03}"))
+        list_directory = directory_walker._list_directory
+        listed = []
+
+        def slow_list_directory(directory):
+            listed.append(directory)
+            time.sleep(0.01)
+            return list_directory(directory)
+
+        with mock.patch.object(
+            directory_walker, "_list_directory", slow_list_directory
+        ):
+            entries = ParallelDirectoryWalker(2).walk(self.tempdir.name)
+            next(entries)
+            entries.close()
+        self.assertLess(len(listed), 50)
+
+
+class CachedDirectoryWalkerTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.top = os.path.join(self.tempdir.name, "corpus")
+        for path in ["b.xml", "a.txt", "a/c.xml", "a/b/a.xml", "b/a.xml", "c/empty/"]:
+            full_path = os.path.join(self.top, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if not path.endswith("/"):
+                with open(full_path, "w") as fp:
+                    fp.write(path)
+        self._set_old_modification_times()
+        self.cache_file = os.path.join(self.tempdir.name, "listings.db")
+        self.walker = CachedDirectoryWalker(
+            self.cache_file, lambda entry: entry.stat().st_size
+        )
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_files_yielded_in_order_of_sequential_walk(self):
+        expected = [
+            (entry.path, entry.stat().st_size)
+            for entry in walk_directory_tree(self.top)
+        ]
+        for _ in range(2):
+            with self.subTest():
+                self.assertEqual(list(self.walker.walk(self.top)), expected)
+
+    def test_unchanged_directories_taken_from_cache(self):
+        list(self.walker.walk(self.top))
+        with self.assertLogs("tei_make_corpus.directory_walker") as logged:
+            list(self.walker.walk(self.top))
+        self.assertIn("Listed 0 of 6 directories", logged.output[0])
+
+    def test_changed_directory_listed_again(self):
+        list(self.walker.walk(self.top))
+        new_file = os.path.join(self.top, "a", "b", "b.xml")
+        with open(new_file, "w") as fp:
+            fp.write("new")
+        with self.assertLogs("tei_make_corpus.directory_walker") as logged:
+            result = list(self.walker.walk(self.top))
+        self.assertIn("Listed 1 of 6 directories", logged.output[0])
+        self.assertIn((new_file, 3), result)
+
+    def test_recently_changed_directory_not_trusted(self):
+        os.utime(os.path.join(self.top, "b"))
+        list(self.walker.walk(self.top))
+        with self.assertLogs("tei_make_corpus.directory_walker") as logged:
+            list(self.walker.walk(self.top))
+        self.assertIn("Listed 1 of 6 directories", logged.output[0])
+
+    def test_listings_of_removed_directories_removed_from_cache(self):
+        list(self.walker.walk(self.top))
+        os.rmdir(os.path.join(self.top, "c", "empty"))
+        list(self.walker.walk(self.top))
+        with sqlite3.connect(self.cache_file) as connection:
+            (count,) = connection.execute("SELECT COUNT(*) FROM listings").fetchone()
+        self.assertEqual(count, 5)
+
+    def test_files_filtered_by_name(self):
+        walker = CachedDirectoryWalker(
+            self.cache_file, lambda entry: 0, lambda name: name.endswith(".xml")
+        )
+        result = [path for path, _ in walker.walk(os.path.join(self.top, "a"))]
+        self.assertEqual(
+            result,
+            [
+                os.path.join(self.top, "a", "c.xml"),
+                os.path.join(self.top, "a", "b", "a.xml"),
+            ],
+        )
+
+    def _set_old_modification_times(self):
+        for root, _, _ in os.walk(self.top):
+            os.utime(root, ns=(10**18, 10**18))
@@ -429,6 +429,29 @@ class DocIdToIdnoHandlerTest(unittest.TestCase):
         idno_elem = doc.find(".//{*}idno")
         self.assertEqual(idno_elem.text, "file")
 
+    def test_compression_extension_ignored_for_doc_id(self):
+        for file_path in ["path/to/file.xml.gz", "path/to/file.xml.xz"]:
+            for pattern, expected in [(r".*/(\w+)\.xml$", "file"), (None, "file.xml")]:
+                with self.subTest(file_path=file_path, pattern=pattern):
+                    doc = etree.XML(
+                        """
+                        <TEI xmlns='http://www.tei-c.org/ns/1.0'>
+                        <teiHeader>
+                            <fileDesc>
+                                <titleStmt/>
+                                <publicationStmt>
+                                    <publisher/>
+                                    <availability/>
+                                </publicationStmt>
+                            </fileDesc>
+                        </teiHeader>
+                        </TEI>
+                        """
+                    )
+                    DocIdToIdnoHandler(pattern).add_doc_id(doc, file_path)
+                    idno_elem = doc.find(".//{*}idno")
+                    self.assertEqual(idno_elem.text, expected)
+
     def test_basename_used_as_fallback_if_no_match_with_capturing_group(self):
         doc = etree.XML(
             """
@@ -2,7 +2,11 @@ import random
 
 from lxml import etree
 
-from tei_make_corpus.element_equality import elements_equal
+from tei_make_corpus.element_equality import (
+    elements_equal,
+    node_fingerprint,
+    subtree_fingerprint,
+)
 
 
 def test_tag_different():
@@ -196,3 +200,45 @@ def test_elements_different_with_namespace_ignored():
     elem1 = etree.Element("{namespace}tag")
     elem2 = etree.Element("tag2")
     assert elements_equal(elem1, elem2, ignore_ns=True) is False
+
+
+def test_fingerprints_of_equal_elements_equal():
+    elem1 = etree.XML('<tag a="1" b="2">  text <child/>\n</tag>')
+    elem2 = etree.XML('<n:tag xmlns:n="namespace" b="2" a="1">text<n:child/></n:tag>')
+    assert elements_equal(elem1, elem2, ignore_ns=True) is True
+    assert subtree_fingerprint(elem1) == subtree_fingerprint(elem2)
+
+
+def test_fingerprints_of_whitespace_and_missing_text_equal():
+    elem1 = etree.XML("<tag>   </tag>")
+    elem2 = etree.XML("<tag/>")
+    assert subtree_fingerprint(elem1) == subtree_fingerprint(elem2)
+
+
+def test_fingerprints_of_different_descendants_different():
+    elem1 = etree.XML("<tag><child><leaf>1</leaf></child></tag>")
+    elem2 = etree.XML("<tag><child><leaf>2</leaf></child></tag>")
+    assert node_fingerprint(elem1) == node_fingerprint(elem2)
+    assert subtree_fingerprint(elem1) != subtree_fingerprint(elem2)
+
+
+def test_fingerprints_of_different_attributes_different():
+    elem1 = etree.XML('<tag a="1"/>')
+    elem2 = etree.XML('<tag a="2"/>')
+    assert node_fingerprint(elem1) != node_fingerprint(elem2)
+    assert subtree_fingerprint(elem1) != subtree_fingerprint(elem2)
+
+
+def test_node_fingerprints_of_different_number_of_children_different():
+    elem1 = etree.XML("<tag><child/></tag>")
+    elem2 = etree.XML("<tag><child/><child/></tag>")
+    assert node_fingerprint(elem1) != node_fingerprint(elem2)
+
+
+def test_fingerprints_of_descendants_stored_in_cache():
+    elem = etree.XML("<tag><child><leaf/></child></tag>")
+    cache = {}
+    fingerprint = subtree_fingerprint(elem, cache)
+    assert set(cache) == set(elem.iter())
+    assert cache[elem] == fingerprint
+    assert cache[elem[0]] == subtree_fingerprint(elem[0])
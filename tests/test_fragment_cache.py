@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from tei_make_corpus.fragment_cache import FragmentCache, fragment_key
+
+
+class FragmentKeyTest(unittest.TestCase):
+    def test_key_depends_on_content_and_settings(self):
+        key = fragment_key(b"<TEI/>", {"xmlid": "XmlIdRemover"})
+        self.assertEqual(key, fragment_key(b"<TEI/>", {"xmlid": "XmlIdRemover"}))
+        self.assertNotEqual(key, fragment_key(b"<TEI />", {"xmlid": "XmlIdRemover"}))
+        self.assertNotEqual(key, fragment_key(b"<TEI/>", {"xmlid": "pa3a300"}))
+
+
+class FragmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = FragmentCache(self.tempdir.name, max_size=100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_stored_fragment_returned(self):
+        key = fragment_key(b"<TEI/>", {})
+        self.cache.put(key, b"<TEI/>")
+        self.assertEqual(self.cache.get(key), b"<TEI/>")
+
+    def test_none_returned_for_missing_fragment(self):
+        self.assertIsNone(self.cache.get(fragment_key(b"<TEI/>", {})))
+
+    def test_fragments_shared_by_instances(self):
+        key = fragment_key(b"<TEI/>", {})
+        self.cache.put(key, b"<TEI/>")
+        other = FragmentCache(self.tempdir.name)
+        self.assertEqual(other.get(key), b"<TEI/>")
+
+    def test_fragment_larger_than_cache_not_stored(self):
+        key = fragment_key(b"<TEI/>", {})
+        self.cache.put(key, b"x" * 101)
+        self.assertIsNone(self.cache.get(key))
+
+    def test_least_recently_used_fragments_removed(self):
+        keys = [fragment_key(str(i).encode(), {}) for i in range(4)]
+        for i, key in enumerate(keys[:3]):
+            self.cache.put(key, b"x" * 30)
+            path = os.path.join(self.tempdir.name, key[:2], key[2:])
+            os.utime(path, ns=(i * 10**9, i * 10**9))
+        # the first fragment is used again
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.cache.put(keys[3], b"x" * 30)
+        # the oldest fragment is removed, which reduces the cache to 90 bytes
+        self.assertIsNone(self.cache.get(keys[1]))
+        for key in [keys[0], keys[2], keys[3]]:
+            self.assertIsNotNone(self.cache.get(key))
+
+    def test_no_temporary_files_left(self):
+        self.cache.put(fragment_key(b"<TEI/>", {}), b"<TEI/>")
+        [subdir] = os.listdir(self.tempdir.name)
+        self.assertEqual(len(os.listdir(os.path.join(self.tempdir.name, subdir))), 1)
@@ -1,11 +1,12 @@
 import io
 import os
+import pickle
 import unittest
 
 from lxml import etree
 
 from tei_make_corpus.element_equality import elements_equal
-from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.header_handler import DeduplicationPlan, TeiHeaderHandlerImpl
 
 
 class TeiHeaderHandlerImplTest(unittest.TestCase):
@@ -377,48 +378,6 @@ class TeiHeaderHandlerImplTest(unittest.TestCase):
         header_handler.declutter_individual_header(iheader)
         self.assertEqual(len(tei_doc.findall(".//{*}addrLine")), 1)
 
-    def test_position_indices_at_end_removed_from_xpath(self):
-        header_file = io.BytesIO(b"<header/>")
-        header_handler = TeiHeaderHandlerImpl(header_file)
-        path = "tag/subTag/other[1]"
-        self.assertEqual(
-            header_handler._clean_position_indices_from_path(path), "tag/subTag/other"
-        )
-
-    def test_path_constructed_correctly(self):
-        header_file = io.BytesIO(b"<header/>")
-        header_handler = TeiHeaderHandlerImpl(header_file)
-        path = "tag/subTag/other[1]"
-        self.assertEqual(header_handler._adjust_xpath(path), "./tag/subTag/other")
-
-    def test_position_indices_inside_path_removed(self):
-        header_file = io.BytesIO(b"<header/>")
-        header_handler = TeiHeaderHandlerImpl(header_file)
-        path = "tag/subTag/other[1]/someMore/else[19]"
-        result = header_handler._clean_position_indices_from_path(path)
-        self.assertEqual(result, "tag/subTag/other/someMore/else")
-
-    def test_tag_in_braces_not_removed_during_path_cleaning(self):
-        header_file = io.BytesIO(b"<header/>")
-        header_handler = TeiHeaderHandlerImpl(header_file)
-        path = "tag[tag2]"
-        result = header_handler._clean_position_indices_from_path(path)
-        self.assertEqual(result, "tag[tag2]")
-
-    def test_attributes_not_removed_from_path_during_cleaning(self):
-        header_file = io.BytesIO(b"<header/>")
-        header_handler = TeiHeaderHandlerImpl(header_file)
-        path = "tag[@class1]"
-        result = header_handler._clean_position_indices_from_path(path)
-        self.assertEqual(result, "tag[@class1]")
-
-    def test_attribute_with_value_not_removed_from_path_during_cleaning(self):
-        header_file = io.BytesIO(b"<header/>")
-        header_handler = TeiHeaderHandlerImpl(header_file)
-        path = "tag[@class1='value1']"
-        result = header_handler._clean_position_indices_from_path(path)
-        self.assertEqual(result, "tag[@class1='value1']")
-
     def test_all_matching_elements_from_individual_header_removed(self):
         header_file = io.BytesIO(
             b"""<teiHeader>
@@ -466,5 +425,138 @@ class TeiHeaderHandlerImplTest(unittest.TestCase):
         header_handler.declutter_individual_header(iheader)
         self.assertEqual(tei_doc.findall(".//{*}notesStmt"), [])
 
+    def test_header_handler_can_be_pickled(self):
+        header_file = os.path.join(self.testdata, "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        result = pickle.loads(pickle.dumps(header_handler))
+        self.assertXmlElementsEqual(
+            result.common_header(), header_handler.common_header()
+        )
+
+    def test_repeated_elements_with_same_path_removed_from_individual_header(self):
+        header_file = io.BytesIO(
+            b"""<teiHeader><fileDesc><titleStmt>
+                <respStmt><resp>A</resp><name>X</name></respStmt>
+                <respStmt><resp>B</resp><name>Y</name></respStmt>
+                </titleStmt></fileDesc></teiHeader>"""
+        )
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        tei_doc = etree.XML(
+            """<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader>
+            <fileDesc><titleStmt>
+              <respStmt><resp>B</resp><name>Y</name></respStmt>
+              <respStmt><resp>C</resp><name>Z</name></respStmt>
+              <respStmt><resp>A</resp><name>X</name></respStmt>
+            </titleStmt></fileDesc>
+            </teiHeader></TEI>"""
+        )
+        iheader = tei_doc.find(".//{*}teiHeader")
+        header_handler.declutter_individual_header(iheader)
+        self.assertEqual([resp.text for resp in tei_doc.iterfind(".//{*}resp")], ["C"])
+
+    def test_comments_in_common_header_ignored(self):
+        header_file = io.BytesIO(
+            b"<teiHeader><!-- comment --><fileDesc><funder>F</funder></fileDesc>"
+            b"</teiHeader>"
+        )
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        tei_doc = etree.XML(
+            """<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader>
+            <fileDesc><!-- comment --><funder>F</funder></fileDesc>
+            </teiHeader></TEI>"""
+        )
+        iheader = tei_doc.find(".//{*}teiHeader")
+        header_handler.declutter_individual_header(iheader)
+        self.assertEqual(tei_doc.findall(".//{*}funder"), [])
+
+    def test_unpickled_header_handler_declutters_individual_header(self):
+        header_file = os.path.join(self.testdata, "corpus_header", "header.xml")
+        header_handler = pickle.loads(pickle.dumps(TeiHeaderHandlerImpl(header_file)))
+        tei_doc = etree.parse(os.path.join(self.testdata, "corpus_header", "file1.xml"))
+        iheader = tei_doc.find(".//{*}teiHeader")
+        header_handler.declutter_individual_header(iheader)
+        self.assertEqual(tei_doc.findall(".//{*}funder"), [])
+
+    def test_element_compared_again_after_descendant_removed(self):
+        header_file = io.BytesIO(
+            b"""<teiHeader>
+                <fileDesc><title>T</title></fileDesc>
+                <fileDesc><note>N</note></fileDesc>
+                </teiHeader>"""
+        )
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        tei_doc = etree.XML(
+            """<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader>
+            <fileDesc><title>T</title><note>N</note></fileDesc>
+            </teiHeader></TEI>"""
+        )
+        iheader = tei_doc.find(".//{*}teiHeader")
+        header_handler.declutter_individual_header(iheader)
+        self.assertEqual(tei_doc.findall(".//{*}fileDesc"), [])
+
+    def test_identical_headers_decluttered_the_same_way(self):
+        header_file = os.path.join(self.testdata, "corpus_header", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        results = []
+        for _ in range(2):
+            tei_doc = etree.parse(
+                os.path.join(self.testdata, "corpus_header", "file1.xml")
+            )
+            header_handler.declutter_individual_header(tei_doc.find(".//{*}teiHeader"))
+            results.append(etree.tostring(tei_doc))
+        self.assertEqual(results[0], results[1])
+        self.assertNotIn(b"funder", results[1])
+
     def assertXmlElementsEqual(self, element1, element2):
         self.assertTrue(elements_equal(element1, element2))
+
+
+class DeduplicationPlanTest(unittest.TestCase):
+    TEI = "{http://www.tei-c.org/ns/1.0}"
+
+    def test_paths_without_namespace_in_tei_namespace(self):
+        plan = DeduplicationPlan(
+            etree.XML("<teiHeader><fileDesc><title/></fileDesc></teiHeader>"), set()
+        )
+        self.assertEqual(
+            [path for _, path in plan.removals],
+            [
+                (f"{self.TEI}fileDesc",),
+                (f"{self.TEI}fileDesc", f"{self.TEI}title"),
+            ],
+        )
+
+    def test_elements_with_tags_no_leftover_sibling_are_replacements(self):
+        plan = DeduplicationPlan(
+            etree.XML("<teiHeader><publisher/><title/></teiHeader>"), {"publisher"}
+        )
+        self.assertEqual([element.tag for element, _ in plan.removals], ["title"])
+        self.assertEqual(
+            [element.tag for element, _ in plan.replacements], ["publisher"]
+        )
+
+    def test_index_groups_elements_by_path_in_document_order(self):
+        plan = DeduplicationPlan(
+            etree.XML("<teiHeader><fileDesc><title/></fileDesc></teiHeader>"), set()
+        )
+        iheader = etree.XML(
+            """<teiHeader xmlns="http://www.tei-c.org/ns/1.0"><fileDesc>
+            <title>1</title><author/><title>2</title></fileDesc>
+            <fileDesc><title>3</title></fileDesc></teiHeader>"""
+        )
+        index = plan.index(iheader)
+        titles = index[(f"{self.TEI}fileDesc", f"{self.TEI}title")]
+        self.assertEqual([title.text for title in titles], ["1", "2", "3"])
+        self.assertEqual(len(index[(f"{self.TEI}fileDesc",)]), 2)
+        self.assertEqual(len(index), 2)
+
+    def test_index_skips_subtrees_without_matching_path(self):
+        plan = DeduplicationPlan(
+            etree.XML("<teiHeader><fileDesc><title/></fileDesc></teiHeader>"), set()
+        )
+        iheader = etree.XML(
+            """<teiHeader xmlns="http://www.tei-c.org/ns/1.0">
+            <profileDesc><fileDesc><title/></fileDesc></profileDesc>
+            </teiHeader>"""
+        )
+        self.assertEqual(plan.index(iheader), {})
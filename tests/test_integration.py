@@ -1,14 +1,21 @@
 import contextlib
+import gzip
 import io
+import itertools
 import os
 import re
+import shutil
 import sys
+import tempfile
 import unittest
 
 from lxml import etree
 
 from tei_make_corpus.cli.make_corpus_usecase import CliRequest, TeiMakeCorpusUseCaseImpl
 from tei_make_corpus.corpus_stream import CorpusStreamImpl
+from tei_make_corpus.xmlid_handler import XmlIdPrefixer
+
+TEI_CORPUS = "{http://www.tei-c.org/ns/1.0}teiCorpus"
 
 
 class IntegrationTest(unittest.TestCase):
@@ -392,6 +399,161 @@ class IntegrationTest(unittest.TestCase):
         ]
         self.assertEqual(doc_ids, [])
 
+    def test_output_with_streamed_files_identical_to_sorted_files(self):
+        results = []
+        for discovery in ["sort", "walk", "external-sort"]:
+            request = CliRequest(
+                header_file=os.path.join(self.test_dir, "header.xml"),
+                corpus_dir=os.path.join(self.test_dir, "rec_corpus"),
+                prefix_xmlid=True,
+                discovery=discovery,
+            )
+            with contextlib.redirect_stdout(
+                io.TextIOWrapper(io.BytesIO(), sys.stdout.encoding)
+            ) as pseudo:
+                TeiMakeCorpusUseCaseImpl(CorpusStreamImpl()).process(request)
+            pseudo.seek(0)
+            results.append(pseudo.buffer.read())
+        self.assertEqual(results[0].count(b"<TEI"), 4)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+    def test_compressed_output_files_created_with_split_size_option(self):
+        request = CliRequest(
+            header_file=os.path.join(self.test_dir, "header.xml"),
+            corpus_dir=os.path.join(self.test_dir, "rec_corpus"),
+            output_file=os.path.join(self.test_dir, "part_out.xml"),
+            split_size=1000,
+            compression="gzip",
+        )
+        self.use_case.process(request)
+        result = sorted(
+            file for file in os.listdir(self.test_dir) if file.startswith("part_out")
+        )
+        self.assertEqual(result, [f"part_out{i:04}.xml.gz" for i in range(1, 5)])
+        for file in result:
+            with gzip.open(os.path.join(self.test_dir, file)) as ptr:
+                with self.subTest(file=file):
+                    self.assertEqual(etree.parse(ptr).getroot().tag, TEI_CORPUS)
+        self._remove_output_files(pattern=r"part_out\d*\.xml\.gz")
+
+    def test_split_size_of_compressed_output_scaled_by_compression_ratio(self):
+        request = CliRequest(
+            header_file=os.path.join(self.test_dir, "header.xml"),
+            corpus_dir=os.path.join(self.test_dir, "rec_corpus"),
+            output_file=os.path.join(self.test_dir, "part_out.xml"),
+            split_size=1000,
+            compression="gzip",
+            split_compressed=True,
+        )
+        with self.assertLogs("tei_make_corpus.cli.make_corpus_usecase") as logged:
+            self.use_case.process(request)
+        self.assertIn("Estimated compression ratio", logged.output[0])
+        result = [
+            file for file in os.listdir(self.test_dir) if file.startswith("part_out")
+        ]
+        # the split size is scaled to the uncompressed size of the TEI files
+        self.assertEqual(len(result), 1)
+        self._remove_output_files(pattern=r"part_out\d*\.xml\.gz")
+
+    def test_incremental_build_only_writes_changed_parts(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            corpus_dir = os.path.join(tempdir, "corpus")
+            shutil.copytree(os.path.join(self.test_dir, "rec_corpus"), corpus_dir)
+            changed_file = os.path.join(corpus_dir, "part2", "subpart", "file21.xml")
+            request = CliRequest(
+                header_file=os.path.join(self.test_dir, "header.xml"),
+                corpus_dir=corpus_dir,
+                output_file=os.path.join(tempdir, "out.xml"),
+                split_docs=1,
+                incremental=True,
+            )
+            self.assertEqual(self._incremental_build(request), "4 of 4")
+            self.assertTrue(
+                os.path.exists(os.path.join(tempdir, "out.xml.manifest.jsonl"))
+            )
+            self.assertEqual(self._incremental_build(request), "0 of 4")
+            # touched file with unchanged content
+            os.utime(changed_file, ns=(0, 0))
+            self.assertEqual(self._incremental_build(request), "0 of 4")
+            with open(changed_file, "a") as ptr:
+                ptr.write("\n")
+            self.assertEqual(self._incremental_build(request), "1 of 4")
+            os.remove(os.path.join(tempdir, "out0001.xml"))
+            self.assertEqual(self._incremental_build(request), "1 of 4")
+            request.clean_header = True
+            self.assertEqual(self._incremental_build(request), "4 of 4")
+
+    def test_incremental_build_produces_same_output_as_full_build(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            request = CliRequest(
+                header_file=os.path.join(self.test_dir, "header.xml"),
+                corpus_dir=os.path.join(self.test_dir, "rec_corpus"),
+                output_file=os.path.join(tempdir, "out.xml"),
+                split_docs=2,
+                prefix_xmlid=True,
+            )
+            self.use_case.process(request)
+            expected = self._read_files(tempdir, "out0001.xml", "out0002.xml")
+            request.incremental = True
+            self._incremental_build(request)
+            os.remove(os.path.join(tempdir, "out0002.xml"))
+            self.assertEqual(self._incremental_build(request), "1 of 2")
+            result = self._read_files(tempdir, "out0001.xml", "out0002.xml")
+            self.assertEqual(result, expected)
+
+    def test_incremental_build_rewrites_parts_with_shifted_prefixes(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            corpus_dir = os.path.join(tempdir, "corpus")
+            os.mkdir(corpus_dir)
+            first, second = self._files_with_same_prefix(corpus_dir)
+            valid_file = os.path.join(self.test_dir, "xmlid", "file1.xml")
+            with open(first, "w") as ptr:
+                ptr.write("<TEI>")
+            shutil.copy(valid_file, second)
+            request = CliRequest(
+                header_file=os.path.join(self.test_dir, "xmlid", "header.xml"),
+                corpus_dir=corpus_dir,
+                output_file=os.path.join(tempdir, "out.xml"),
+                split_docs=1,
+                prefix_xmlid=True,
+                incremental=True,
+            )
+            self.assertEqual(self._incremental_build(request), "2 of 2")
+            # the first document gets the prefix the second document had
+            shutil.copy(valid_file, first)
+            self.assertEqual(self._incremental_build(request), "2 of 2")
+            result = self._read_files(tempdir, "out0001.xml", "out0002.xml")
+            self.assertEqual(self._incremental_build(request), "0 of 2")
+            request.incremental = False
+            self.use_case.process(request)
+            expected = self._read_files(tempdir, "out0001.xml", "out0002.xml")
+            self.assertEqual(result, expected)
+
+    def _incremental_build(self, request):
+        with self.assertLogs("tei_make_corpus.corpus_maker") as logged:
+            TeiMakeCorpusUseCaseImpl(CorpusStreamImpl()).process(request)
+        [message] = [line for line in logged.output if "Incremental build" in line]
+        return re.search(r"\d+ of \d+", message).group()
+
+    def _files_with_same_prefix(self, dir):
+        # two file paths in dir whose @xml:id prefixes collide
+        prefixer = XmlIdPrefixer()
+        paths = {}
+        for i in itertools.count():
+            path = os.path.join(dir, f"file{i}.xml")
+            prefix = prefixer.next_prefix(path)
+            if prefix in paths:
+                return sorted([paths[prefix], path])
+            paths[prefix] = path
+
+    def _read_files(self, dir, *files):
+        contents = []
+        for file in files:
+            with open(os.path.join(dir, file), "rb") as ptr:
+                contents.append(ptr.read())
+        return contents
+
     def _remove_output_files(self, dir=None, pattern=None):
         dir = dir or self.test_dir
         other_files = [file for file in os.listdir(dir) if re.match(pattern, file)]
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+
+from tei_make_corpus.cli.corpus_config import CorpusConfig
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.manifest import (
+    Manifest,
+    ManifestPart,
+    current_file_states,
+    settings_digest,
+)
+from tei_make_corpus.partitioner import Partitioner
+from tei_make_corpus.path_finder import PathFinderImpl
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tempdir.name, "file.xml")
+        with open(self.file, "w") as ptr:
+            ptr.write("<TEI/>")
+        self.manifest = Manifest(os.path.join(self.tempdir.name, "out.manifest.jsonl"))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_no_settings_digest_without_manifest(self):
+        self.assertIsNone(self.manifest.read_settings_digest())
+        self.assertEqual(list(self.manifest.iter_parts()), [])
+
+    def test_parts_read_from_written_manifest(self):
+        parts = [
+            ManifestPart("out0001.xml", [(self.file, 1, 6, "abc")], ["a3a300"], ["a3a3000"]),
+            ManifestPart("out0002.xml", []),
+        ]
+        with self.manifest.writer("digest") as writer:
+            for part in parts:
+                writer.add_part(part)
+        self.assertEqual(self.manifest.read_settings_digest(), "digest")
+        self.assertEqual(list(self.manifest.iter_parts()), parts)
+
+    def test_manifest_not_replaced_if_build_fails(self):
+        with self.manifest.writer("first"):
+            pass
+        with self.assertRaises(RuntimeError):
+            with self.manifest.writer("second"):
+                raise RuntimeError
+        self.assertEqual(self.manifest.read_settings_digest(), "first")
+        self.assertFalse(os.path.exists(f"{self.manifest.path}.tmp"))
+
+    def test_hash_reused_if_modification_time_and_size_unchanged(self):
+        [state] = current_file_states([self.file], {})
+        previous = (self.file, state[1], state[2], "previous hash")
+        result = current_file_states([self.file], {self.file: previous})
+        self.assertEqual(result, [previous])
+
+    def test_touched_file_with_same_content_has_same_hash(self):
+        [state] = current_file_states([self.file], {})
+        os.utime(self.file, ns=(state[1] + 10**9, state[1] + 10**9))
+        [result] = current_file_states([self.file], {self.file: state})
+        self.assertNotEqual(result[1], state[1])
+        self.assertEqual(result[3], state[3])
+
+    def test_changed_file_has_other_hash(self):
+        [state] = current_file_states([self.file], {})
+        with open(self.file, "w") as ptr:
+            ptr.write("<TEI></TEI>")
+        [result] = current_file_states([self.file], {self.file: state})
+        self.assertNotEqual(result[3], state[3])
+
+    def test_missing_file_has_no_hash(self):
+        missing = os.path.join(self.tempdir.name, "missing.xml")
+        self.assertEqual(current_file_states([missing], {}), [(missing, -1, -1, "")])
+
+
+class SettingsDigestTest(unittest.TestCase):
+    def setUp(self):
+        self.header_file = os.path.join("tests", "testdata", "header.xml")
+
+    def test_digest_independent_of_workers(self):
+        self.assertEqual(
+            self._digest(CorpusConfig(False, split_docs=2)),
+            self._digest(
+                CorpusConfig(False, split_docs=2, workers=4, partition_workers=2)
+            ),
+        )
+
+    def test_digest_changes_with_settings_that_change_output(self):
+        digest = self._digest(CorpusConfig(False))
+        for config in [
+            CorpusConfig(clean_header=True),
+            CorpusConfig(False, compression="gzip"),
+            CorpusConfig(False, passthrough=True),
+        ]:
+            with self.subTest(config=config):
+                self.assertNotEqual(self._digest(config), digest)
+
+    def test_digest_changes_with_common_header(self):
+        self.assertNotEqual(
+            self._digest(CorpusConfig(False)),
+            self._digest(
+                CorpusConfig(False),
+                os.path.join("tests", "testdata", "header2.xml"),
+            ),
+        )
+
+    def _digest(self, config, header_file=None):
+        header_handler = TeiHeaderHandlerImpl(header_file or self.header_file)
+        partitioner = Partitioner(header_handler, PathFinderImpl(), XmlIdRemover())
+        return settings_digest(partitioner, config)
@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from lxml import etree
+
+from tei_make_corpus.parse_ahead import ParseAheadPool, _advise_will_need
+
+
+class ParseAheadPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        self.files = sorted(
+            os.path.join(root, file)
+            for root, dirs, files in os.walk(self.corpus_dir)
+            for file in files
+        )
+
+    def test_documents_returned_in_order_of_files(self):
+        pool = ParseAheadPool(3, lookahead=2)
+        result = [file for file, _ in pool.parsed_documents(self.files * 3)]
+        self.assertEqual(result, self.files * 3)
+
+    def test_parsed_documents_equal_serially_parsed_documents(self):
+        pool = ParseAheadPool(2)
+        result = [
+            etree.tostring(parse()) for _, parse in pool.parsed_documents(self.files)
+        ]
+        expected = [etree.tostring(etree.parse(file)) for file in self.files]
+        self.assertEqual(result, expected)
+
+    def test_parsing_error_raised_on_access(self):
+        invalid_file = os.path.join("tests", "testdata", "dir_invalid", "invalid.xml")
+        pool = ParseAheadPool(2)
+        documents = list(pool.parsed_documents([invalid_file] + self.files))
+        with self.assertRaises(etree.XMLSyntaxError):
+            documents[0][1]()
+        self.assertIsInstance(documents[1][1](), etree._ElementTree)
+
+    def test_no_documents(self):
+        pool = ParseAheadPool(2)
+        self.assertEqual(list(pool.parsed_documents([])), [])
+
+    def test_prefetching_missing_file_ignored(self):
+        missing_file = os.path.join("tests", "testdata", "missing.xml")
+        self.assertIsNone(_advise_will_need(missing_file))
+        files = self.files[:2] + [missing_file] + self.files[2:]
+        pool = ParseAheadPool(2, lookahead=1)
+        documents = list(pool.parsed_documents(files))
+        self.assertEqual([file for file, _ in documents], files)
+        with self.assertRaises(OSError):
+            documents[2][1]()
+        self.assertEqual(
+            [etree.tostring(parse()) for _, parse in documents[:2] + documents[3:]],
+            [etree.tostring(etree.parse(file)) for file in self.files],
+        )
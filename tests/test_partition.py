@@ -1,12 +1,21 @@
+import contextlib
+import gzip
 import io
+import itertools
+import lzma
 import os
 import random
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 from lxml import etree
 
+from tei_make_corpus.fragment_cache import FragmentCache
 from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
 from tei_make_corpus.partition import Partition
+from tei_make_corpus.passthrough import read_unchanged_document
 from tei_make_corpus.xmlid_handler import XmlIdPrefixer, XmlIdRemover
 from tests.utils import MockHeaderHandler
 
@@ -152,6 +161,26 @@ class PartitionTest(unittest.TestCase):
         partition = Partition(self.mock_header_handler, files, self.xmlid_handler)
         self.assertEqual(len(partition), expected)
 
+    def test_len_of_partition_with_streamed_files_unknown(self):
+        partition = Partition(
+            self.mock_header_handler, iter(["file"]), self.xmlid_handler
+        )
+        with self.assertRaises(TypeError):
+            len(partition)
+
+    def test_streamed_files_written_to_output(self):
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        corpus_files = (
+            os.path.join(root, file)
+            for root, dirs, files in os.walk(corpus_dir)
+            for file in files
+        )
+        partition = Partition(self.mock_header_handler, corpus_files, XmlIdRemover())
+        partition.write_partition(self.mock_stream.path())
+        self.mock_stream.output_file.seek(0)
+        root = etree.parse(self.mock_stream.output_file).getroot()
+        self.assertEqual(len(root.findall("{*}TEI")), 4)
+
     def test_empty_file_in_corpus_ommited(self):
         corpus_dir = os.path.join("tests", "testdata", "dir_empty")
         header_file = os.path.join("tests", "testdata", "header.xml")
@@ -307,3 +336,479 @@ class PartitionTest(unittest.TestCase):
         result = doc.find(".//{*}new")
         self.assertTrue(result is not None)
         self.assertEqual(result.text, file)
+
+    def test_output_with_worker_processes_identical_to_serial_output(self):
+        corpus_dirs = ["cleaning", "contaminated", "dir_invalid", "rec_corpus", "xmlid"]
+        header_file = os.path.join("tests", "testdata", "xmlid", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        for corpus_dir in corpus_dirs:
+            corpus_files = sorted(
+                os.path.join(root, file)
+                for root, dirs, files in os.walk(
+                    os.path.join("tests", "testdata", corpus_dir)
+                )
+                for file in files
+            )
+            with self.subTest(corpus_dir=corpus_dir):
+                self.assertEqual(
+                    self._write_with_workers(header_handler, corpus_files, 1),
+                    self._write_with_workers(header_handler, corpus_files, 2),
+                )
+
+    def test_prefixes_with_worker_processes_identical_to_serial_output(self):
+        corpus_dir = os.path.join("tests", "testdata", "cleaning")
+        header_file = os.path.join(corpus_dir, "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        # repeated files result in prefix collisions, header.xml is omitted
+        corpus_files = [
+            os.path.join(corpus_dir, file) for file in ["header.xml", "file1.xml"]
+        ] * 20
+        result = self._write_with_workers(
+            header_handler, corpus_files, 3, XmlIdPrefixer()
+        )
+        expected = self._write_with_workers(
+            header_handler, corpus_files, 1, XmlIdPrefixer()
+        )
+        self.assertEqual(result, expected)
+
+    def test_omitted_file_shifts_prefixes_with_worker_processes(self):
+        source = os.path.join("tests", "testdata", "cleaning", "file1.xml")
+        with tempfile.TemporaryDirectory() as tempdir:
+            # find two file paths that result in the same prefix
+            prefixes = {}
+            for i in itertools.count():
+                file_path = os.path.join(tempdir, f"file{i}.xml")
+                prefix = XmlIdPrefixer().generate_prefix(file_path)
+                if prefix in prefixes:
+                    break
+                prefixes[prefix] = file_path
+            invalid_file, valid_file = prefixes[prefix], file_path
+            with open(invalid_file, "w") as ptr:
+                ptr.write("<TEI>")
+            shutil.copy(source, valid_file)
+            corpus_files = [invalid_file, valid_file, source, valid_file]
+            expected = self._write_with_workers(
+                self.mock_header_handler, corpus_files, 1, XmlIdPrefixer()
+            )
+            result = self._write_with_workers(
+                self.mock_header_handler, corpus_files, 2, XmlIdPrefixer()
+            )
+        self.assertIn(f'xml:id="{prefix}-'.encode(), result)
+        self.assertEqual(result, expected)
+
+    def test_doc_id_added_with_worker_processes(self):
+        file = os.path.join("tests", "testdata", "corpus", "file1.xml")
+        partition = Partition(
+            self.mock_header_handler,
+            [file],
+            self.xmlid_handler,
+            docid_handler=MockDocIdHandler(),
+            workers=2,
+        )
+        partition.write_partition(self.mock_stream.path())
+        self.mock_stream.output_file.seek(0)
+        doc = etree.parse(self.mock_stream.output_file)
+        self.assertEqual(doc.find(".//{*}new").text, file)
+
+    def test_output_with_thread_backend_identical_to_serial_output(self):
+        corpus_dir = os.path.join("tests", "testdata", "cleaning")
+        header_handler = TeiHeaderHandlerImpl(os.path.join(corpus_dir, "header.xml"))
+        corpus_files = [
+            os.path.join(corpus_dir, file) for file in ["header.xml", "file1.xml"]
+        ] * 10
+        result = self._write_with_workers(
+            header_handler, corpus_files, 3, XmlIdPrefixer(), backend="thread"
+        )
+        expected = self._write_with_workers(
+            header_handler, corpus_files, 1, XmlIdPrefixer()
+        )
+        self.assertEqual(result, expected)
+
+    def test_filename_logged_on_parsing_error_with_thread_backend(self):
+        corpus_dir = os.path.join("tests", "testdata", "dir_invalid")
+        corpus_files = sorted(
+            os.path.join(corpus_dir, file) for file in os.listdir(corpus_dir)
+        )
+        partition = Partition(
+            self.mock_header_handler,
+            corpus_files,
+            self.xmlid_handler,
+            workers=2,
+            backend="thread",
+        )
+        with self.assertLogs() as logged:
+            partition.write_partition(self.mock_stream.path())
+        self.assertIn("tests/testdata/dir_invalid/invalid.xml", logged.output[0])
+
+    def test_output_with_pipeline_backend_identical_to_serial_output(self):
+        corpus_dir = os.path.join("tests", "testdata", "cleaning")
+        header_handler = TeiHeaderHandlerImpl(os.path.join(corpus_dir, "header.xml"))
+        corpus_files = [
+            os.path.join(corpus_dir, file) for file in ["header.xml", "file1.xml"]
+        ] * 10
+        result = self._write_with_workers(
+            header_handler, corpus_files, 3, XmlIdPrefixer(), backend="pipeline"
+        )
+        expected = self._write_with_workers(
+            header_handler, corpus_files, 1, XmlIdPrefixer()
+        )
+        self.assertEqual(result, expected)
+
+    def test_output_with_size_schedule_identical_to_serial_output(self):
+        corpus_dirs = ["cleaning", "dir_invalid", "rec_corpus"]
+        header_file = os.path.join("tests", "testdata", "cleaning", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        corpus_files = (
+            sorted(
+                os.path.join(root, file)
+                for corpus_dir in corpus_dirs
+                for root, dirs, files in os.walk(
+                    os.path.join("tests", "testdata", corpus_dir)
+                )
+                for file in files
+            )
+            * 3
+        )
+        for reorder_buffer in [1, 5_000, 500_000_000]:
+            with self.subTest(reorder_buffer=reorder_buffer):
+                with self.assertLogs("tei_make_corpus.partition"):
+                    result = self._write_with_workers(
+                        header_handler,
+                        corpus_files,
+                        3,
+                        XmlIdPrefixer(),
+                        schedule="size",
+                        reorder_buffer=reorder_buffer,
+                    )
+                    expected = self._write_with_workers(
+                        header_handler, corpus_files, 1, XmlIdPrefixer()
+                    )
+                self.assertEqual(result, expected)
+
+    def test_file_sizes_of_partition_used_for_size_schedule(self):
+        header_file = os.path.join("tests", "testdata", "cleaning", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        corpus_files = sorted(
+            os.path.join(root, file)
+            for root, dirs, files in os.walk(corpus_dir)
+            for file in files
+        )
+        expected = self._write_with_workers(
+            header_handler, corpus_files, 1, XmlIdPrefixer()
+        )
+        with mock.patch(
+            "tei_make_corpus.document_pool.corpus_file_size"
+        ) as corpus_file_size:
+            result = self._write_with_workers(
+                header_handler,
+                corpus_files,
+                3,
+                XmlIdPrefixer(),
+                schedule="size",
+                file_sizes=[os.path.getsize(file) for file in corpus_files],
+            )
+        corpus_file_size.assert_not_called()
+        self.assertEqual(result, expected)
+
+    def test_output_with_streamed_documents_identical_to_serial_output(self):
+        corpus_dirs = ["cleaning", "dir_invalid", "rec_corpus", "xmlid"]
+        header_file = os.path.join("tests", "testdata", "cleaning", "header.xml")
+        header_handler = TeiHeaderHandlerImpl(header_file)
+        corpus_files = sorted(
+            os.path.join(root, file)
+            for corpus_dir in corpus_dirs
+            for root, dirs, files in os.walk(
+                os.path.join("tests", "testdata", corpus_dir)
+            )
+            for file in files
+        )
+        for stream_threshold in [0, 1_000]:
+            with self.subTest(stream_threshold=stream_threshold):
+                with self.assertLogs(level="INFO"):
+                    result = self._write_with_workers(
+                        header_handler,
+                        corpus_files,
+                        1,
+                        XmlIdPrefixer(),
+                        stream_threshold=stream_threshold,
+                    )
+                    expected = self._write_with_workers(
+                        header_handler, corpus_files, 1, XmlIdPrefixer()
+                    )
+                self.assertEqual(result, expected)
+
+    def test_documents_without_xmlid_copied_with_passthrough(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = self._passthrough_files()
+        outputs = []
+        for passthrough in [True, False]:
+            output = io.BytesIO()
+            with self.assertLogs("tei_make_corpus.partition"):
+                Partition(
+                    header_handler, files, XmlIdPrefixer(), passthrough=passthrough
+                ).write_partition(output)
+            outputs.append(output.getvalue())
+        self.assertIn(read_unchanged_document(files[0]), outputs[0])
+        self.assertNotEqual(outputs[0], outputs[1])
+        self.assertEqual(
+            etree.tostring(etree.fromstring(outputs[0]), method="c14n"),
+            etree.tostring(etree.fromstring(outputs[1]), method="c14n"),
+        )
+
+    def test_malformed_document_omitted_with_passthrough(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        with tempfile.TemporaryDirectory() as tempdir:
+            malformed_file = os.path.join(tempdir, "malformed.xml")
+            with open(malformed_file, "wb") as ptr:
+                ptr.write(b"<TEI><unclosed></TEI>")
+            files = [self._passthrough_files()[0], malformed_file]
+            outputs = []
+            for passthrough in [True, False]:
+                output = io.BytesIO()
+                with self.assertLogs("tei_make_corpus.partition", level="ERROR"):
+                    Partition(
+                        header_handler, files, XmlIdRemover(), passthrough=passthrough
+                    ).write_partition(output)
+                outputs.append(output.getvalue())
+        self.assertNotIn(b"<unclosed>", outputs[0])
+        self.assertEqual(
+            etree.tostring(etree.fromstring(outputs[0]), method="c14n"),
+            etree.tostring(etree.fromstring(outputs[1]), method="c14n"),
+        )
+
+    def test_output_with_passthrough_and_workers_identical_to_serial_output(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = self._passthrough_files() * 3
+        outputs = []
+        for workers in [1, 3]:
+            output = io.BytesIO()
+            with (
+                self.assertLogs("tei_make_corpus.partition")
+                if workers == 1
+                else contextlib.nullcontext()
+            ):
+                Partition(
+                    header_handler,
+                    files,
+                    XmlIdPrefixer(),
+                    workers=workers,
+                    passthrough=True,
+                ).write_partition(output)
+            outputs.append(output.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_no_documents_copied_if_headers_cleaned(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = self._passthrough_files()
+        outputs = []
+        for passthrough in [True, False]:
+            output = io.BytesIO()
+            with self.assertLogs("tei_make_corpus.partition"):
+                Partition(
+                    header_handler,
+                    files,
+                    XmlIdRemover(),
+                    clean_files=True,
+                    passthrough=passthrough,
+                ).write_partition(output)
+            outputs.append(output.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_skipped_partition_reserves_prefixes_of_its_files(self):
+        corpus_dir = os.path.join("tests", "testdata", "cleaning")
+        header_handler = TeiHeaderHandlerImpl(os.path.join(corpus_dir, "header.xml"))
+        files = [os.path.join(corpus_dir, "file1.xml")] * 2
+        outputs = []
+        for skip in [False, True]:
+            xmlid_handler = XmlIdPrefixer()
+            first = Partition(header_handler, files, xmlid_handler)
+            if skip:
+                first.skip_partition()
+            else:
+                first.write_partition(io.BytesIO())
+            output = io.BytesIO()
+            Partition(header_handler, files, xmlid_handler).write_partition(output)
+            outputs.append(output.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_compressed_output_decompressed_identical_to_uncompressed_output(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = [
+            os.path.join("tests", "testdata", "xmlid", "file1.xml"),
+            os.path.join("tests", "testdata", "xmlid", "file2.xml"),
+        ]
+        expected = self._write_with_workers(header_handler, files, 1, XmlIdRemover())
+        decompress = {"gzip": gzip.decompress, "xz": lzma.decompress}
+        for compression in decompress:
+            for workers, backend in [(1, "process"), (2, "process"), (2, "pipeline")]:
+                with self.subTest(
+                    compression=compression, workers=workers, backend=backend
+                ):
+                    result = self._write_with_workers(
+                        header_handler,
+                        files,
+                        workers,
+                        XmlIdRemover(),
+                        backend=backend,
+                        compression=compression,
+                    )
+                    self.assertNotEqual(result, expected)
+                    self.assertEqual(decompress[compression](result), expected)
+
+    def test_output_compressed_in_blocks_decompressed_identical(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = [
+            os.path.join("tests", "testdata", "xmlid", "file1.xml"),
+            os.path.join("tests", "testdata", "xmlid", "file2.xml"),
+        ] * 20
+        expected = self._write_with_workers(header_handler, files, 1, XmlIdRemover())
+        for compression, decompress in [
+            ("gzip", gzip.decompress),
+            ("xz", lzma.decompress),
+        ]:
+            for workers in [1, 2]:
+                with self.subTest(compression=compression, workers=workers):
+                    result = self._write_with_workers(
+                        header_handler,
+                        files,
+                        workers,
+                        XmlIdRemover(),
+                        compression=compression,
+                        compress_workers=3,
+                    )
+                    self.assertEqual(decompress(result), expected)
+
+    def test_compressed_output_written_to_file(self):
+        files = [os.path.join("tests", "testdata", "xmlid", "file1.xml")]
+        with tempfile.TemporaryDirectory() as tempdir:
+            output_file = os.path.join(tempdir, "output.xml.gz")
+            Partition(
+                self.mock_header_handler, files, XmlIdRemover(), compression="gzip"
+            ).write_partition(output_file)
+            with gzip.open(output_file) as ptr:
+                self.assertTrue(ptr.read().startswith(b"<?xml"))
+
+    def test_output_with_fragment_cache_identical_to_serial_output(self):
+        corpus_dir = os.path.join("tests", "testdata", "cleaning")
+        header_handler = TeiHeaderHandlerImpl(os.path.join(corpus_dir, "header.xml"))
+        # repeated files result in prefix collisions, header.xml is omitted
+        files = [
+            os.path.join(corpus_dir, file) for file in ["header.xml", "file1.xml"]
+        ] * 10
+        expected = self._write_with_workers(header_handler, files, 1, XmlIdPrefixer())
+        with tempfile.TemporaryDirectory() as tempdir:
+            fragment_cache = FragmentCache(tempdir)
+            for workers in [1, 2, 1]:
+                with self.subTest(workers=workers):
+                    result = self._write_with_workers(
+                        header_handler,
+                        files,
+                        workers,
+                        XmlIdPrefixer(),
+                        fragment_cache=fragment_cache,
+                    )
+                    self.assertEqual(result, expected)
+
+    def test_cached_documents_not_parsed_again(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = [
+            os.path.join("tests", "testdata", "xmlid", "file1.xml"),
+            os.path.join("tests", "testdata", "xmlid", "file2.xml"),
+        ]
+        with tempfile.TemporaryDirectory() as tempdir:
+            fragment_cache = FragmentCache(tempdir)
+            expected = self._write_with_workers(
+                header_handler,
+                files,
+                1,
+                fragment_cache=fragment_cache,
+            )
+            with mock.patch.object(
+                Partition, "_prepare_tei_document", side_effect=AssertionError
+            ):
+                result = self._write_with_workers(
+                    header_handler,
+                    files,
+                    1,
+                    fragment_cache=fragment_cache,
+                )
+        self.assertEqual(result, expected)
+
+    def test_fragments_not_shared_between_settings(self):
+        header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+        files = [os.path.join("tests", "testdata", "xmlid", "file1.xml")]
+        with tempfile.TemporaryDirectory() as tempdir:
+            fragment_cache = FragmentCache(tempdir)
+            for xmlid_handler, docid_handler in [
+                (XmlIdRemover(), None),
+                (XmlIdPrefixer(), None),
+                (XmlIdRemover(), MockDocIdHandler()),
+            ]:
+                with self.subTest(xmlid_handler=xmlid_handler):
+                    expected = self._write_with_workers(
+                        header_handler,
+                        files,
+                        1,
+                        xmlid_handler,
+                        docid_handler=docid_handler,
+                    )
+                    result = self._write_with_workers(
+                        header_handler,
+                        files,
+                        1,
+                        type(xmlid_handler)(),
+                        docid_handler=docid_handler,
+                        fragment_cache=fragment_cache,
+                    )
+                    self.assertEqual(result, expected)
+
+    def _passthrough_files(self):
+        # documents without and with @xml:id and an invalid file
+        return [
+            os.path.join(
+                "tests", "testdata", "rec_corpus", "part1", "subpart", "file1.xml"
+            ),
+            os.path.join("tests", "testdata", "xmlid", "file1.xml"),
+            os.path.join("tests", "testdata", "dir_invalid", "invalid.xml"),
+            os.path.join("tests", "testdata", "corpus_header", "file1.xml"),
+            os.path.join("tests", "testdata", "xmlid", "file2.xml"),
+        ]
+
+    def _write_with_workers(
+        self,
+        header_handler,
+        files,
+        workers,
+        xmlid_handler=None,
+        backend="process",
+        **options,
+    ):
+        output = io.BytesIO()
+        partition = Partition(
+            header_handler,
+            files,
+            xmlid_handler or XmlIdRemover(),
+            clean_files=True,
+            workers=workers,
+            backend=backend,
+            **options,
+        )
+        partition.write_partition(output)
+        return output.getvalue()
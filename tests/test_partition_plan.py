@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.partition_plan import PartitionPlan
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+from tests.utils import MockHeaderHandler
+
+
+class PartitionPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.header_handler = MockHeaderHandler()
+        self.xmlid_handler = XmlIdRemover()
+
+    def test_partitions_assigned_to_shards_in_turns(self):
+        plan = self._create_plan(5, shards=2)
+        self.assertEqual([plan.shard_of(i) for i in range(5)], [1, 2, 1, 2, 1])
+
+    def test_single_shard_by_default(self):
+        plan = self._create_plan(3)
+        self.assertEqual([plan.shard_of(i) for i in range(3)], [1, 1, 1])
+
+    def test_same_plan_has_same_digest(self):
+        self.assertEqual(
+            self._create_plan(3, shards=2).digest(),
+            self._create_plan(3, shards=2).digest(),
+        )
+
+    def test_digest_differs_for_different_files(self):
+        plan = self._create_plan(3, shards=2)
+        other = self._create_plan(3, shards=2)
+        other.partitions[1][0].files.append("other.xml")
+        self.assertNotEqual(plan.digest(), other.digest())
+
+    def test_digest_differs_for_different_number_of_shards(self):
+        self.assertNotEqual(
+            self._create_plan(3, shards=2).digest(),
+            self._create_plan(3, shards=3).digest(),
+        )
+
+    def test_exported_plan_contains_partitions_and_digest(self):
+        plan = self._create_plan(2, shards=2)
+        with tempfile.TemporaryDirectory() as tempdir:
+            plan_file = os.path.join(tempdir, "plan.json")
+            plan.export(plan_file)
+            with open(plan_file) as ptr:
+                exported = json.load(ptr)
+        self.assertEqual(
+            exported,
+            {
+                "shards": 2,
+                "partitions": [
+                    {
+                        "output_file": "part0001.xml",
+                        "shard": 1,
+                        "files": ["file0.xml", "file1.xml"],
+                    },
+                    {
+                        "output_file": "part0002.xml",
+                        "shard": 2,
+                        "files": ["file2.xml", "file3.xml"],
+                    },
+                ],
+                "digest": plan.digest(),
+            },
+        )
+
+    def _create_plan(self, num_partitions, shards=None):
+        partitions = [
+            (
+                Partition(
+                    self.header_handler,
+                    [f"file{2 * i}.xml", f"file{2 * i + 1}.xml"],
+                    self.xmlid_handler,
+                ),
+                f"part{i + 1:04}.xml",
+            )
+            for i in range(num_partitions)
+        ]
+        if shards is None:
+            return PartitionPlan(partitions)
+        return PartitionPlan(partitions, shards)
@@ -0,0 +1,78 @@
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.partition_pool import PartitionPool
+from tei_make_corpus.xmlid_handler import XmlIdPrefixer, XmlIdRemover
+
+
+class PartitionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "header.xml")
+        )
+        self.source = os.path.join("tests", "testdata", "cleaning", "file1.xml")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_all_partitions_written(self):
+        partitions = self._partitions([[self.source]] * 5, XmlIdRemover())
+        PartitionPool(2).write_partitions(partitions)
+        self.assertTrue(all(os.path.exists(path) for _, path in partitions))
+
+    def test_no_partitions(self):
+        PartitionPool(2).write_partitions([])
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+    def test_prefix_collisions_across_partitions_identical_to_serial_output(self):
+        files = [[self.source], [self.source, self.source], [self.source]]
+        serial = self._partitions(files, XmlIdPrefixer(), "serial")
+        for partition, path in serial:
+            partition.write_partition(path)
+        concurrent = self._partitions(files, XmlIdPrefixer(), "concurrent")
+        PartitionPool(3).write_partitions(concurrent)
+        self.assertEqual(self._read(concurrent), self._read(serial))
+
+    def test_omitted_file_shifts_prefixes_in_later_partition(self):
+        # find two file paths that result in the same prefix
+        prefixes = {}
+        for i in itertools.count():
+            file_path = os.path.join(self.tempdir.name, f"file{i}.xml")
+            prefix = XmlIdPrefixer().generate_prefix(file_path)
+            if prefix in prefixes:
+                break
+            prefixes[prefix] = file_path
+        invalid_file, valid_file = prefixes[prefix], file_path
+        with open(invalid_file, "w") as ptr:
+            ptr.write("<TEI>")
+        shutil.copy(self.source, valid_file)
+        files = [[invalid_file], [self.source, valid_file], [valid_file]]
+        serial = self._partitions(files, XmlIdPrefixer(), "serial")
+        for partition, path in serial:
+            partition.write_partition(path)
+        concurrent = self._partitions(files, XmlIdPrefixer(), "concurrent")
+        PartitionPool(3).write_partitions(concurrent)
+        self.assertIn(f'xml:id="{prefix}-'.encode(), self._read(concurrent)[1])
+        self.assertEqual(self._read(concurrent), self._read(serial))
+
+    def _partitions(self, files, xmlid_handler, name="part"):
+        return [
+            (
+                Partition(self.header_handler, part, xmlid_handler),
+                os.path.join(self.tempdir.name, f"{name}{i:04}.xml"),
+            )
+            for i, part in enumerate(files, start=1)
+        ]
+
+    def _read(self, partitions):
+        output = []
+        for _, path in partitions:
+            with open(path, "rb") as ptr:
+                output.append(ptr.read())
+        return output
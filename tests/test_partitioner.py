@@ -7,6 +7,7 @@ from lxml import etree
 from tei_make_corpus.cli.corpus_config import CorpusConfig
 from tei_make_corpus.doc_id_handler import DocIdToIdnoHandler
 from tei_make_corpus.partitioner import Partitioner
+from tei_make_corpus.path_store import PathRange
 from tei_make_corpus.xmlid_handler import XmlIdRemover
 from tests.utils import MockHeaderHandler
 
@@ -14,32 +15,40 @@ from tests.utils import MockHeaderHandler
 class MockPathFinder:
     def __init__(self):
         self.files = dict()
+        self.file_size = 1000
+
+    def set_file_size(self, file_size):
+        self.file_size = file_size
 
     def get_paths_for_corpus_files(self, corpus_dir, header_file):
         return self.files.get(corpus_dir, [])
 
+    def iter_paths_for_corpus_files(self, corpus_dir, header_file):
+        return iter(self.files.get(corpus_dir, []))
 
-class MockSizeEstimator:
-    def __init__(self):
-        self.file_size = 1000
+    def iter_sorted_paths_for_corpus_files(self, corpus_dir, header_file):
+        return iter(sorted(self.files.get(corpus_dir, [])))
 
-    def set_file_size(self, file_size):
-        self.file_size = file_size
+    def get_paths_and_sizes_for_corpus_files(self, corpus_dir, header_file):
+        return list(self.iter_paths_and_sizes_for_corpus_files(corpus_dir, header_file))
+
+    def iter_paths_and_sizes_for_corpus_files(self, corpus_dir, header_file):
+        return ((path, self.file_size) for path in self.files.get(corpus_dir, []))
 
-    def determine_file_sizes(self, list_of_file_paths):
-        return [self.file_size for _ in range(len(list_of_file_paths))]
+    def iter_sorted_paths_and_sizes_for_corpus_files(self, corpus_dir, header_file):
+        return iter(
+            sorted(self.iter_paths_and_sizes_for_corpus_files(corpus_dir, header_file))
+        )
 
 
 class PartitionerTest(unittest.TestCase):
     def setUp(self):
         self.mock_header_handler = MockHeaderHandler()
         self.mock_path_finder = MockPathFinder()
-        self.size_estimator = MockSizeEstimator()
         self.id_handler = XmlIdRemover()
         self.partitioner = Partitioner(
             header_handler=self.mock_header_handler,
             path_finder=self.mock_path_finder,
-            size_estimator=self.size_estimator,
             xmlid_handler=self.id_handler,
         )
         self.header_file = "header.xml"
@@ -96,7 +105,7 @@ class PartitionerTest(unittest.TestCase):
         total_no_files = random.randint(100, 10_000)
         split_val = random.randint(10, total_no_files)
         corpus_dir = "corpus"
-        corpus_files = [f"file{i}.xml" for i in range(total_no_files)]
+        corpus_files = [f"file{i:05}.xml" for i in range(total_no_files)]
         self.mock_path_finder.files[corpus_dir] = corpus_files
         config = CorpusConfig(clean_header=False, split_docs=split_val)
         partitions = self.partitioner.get_partitions(
@@ -107,6 +116,25 @@ class PartitionerTest(unittest.TestCase):
             result += part.files
         self.assertEqual(result, corpus_files)
 
+    def test_partitions_are_ranges_of_one_path_store(self):
+        corpus_files = [os.path.join("corpus", f"file{i:02}.xml") for i in range(25)]
+        self.mock_path_finder.files["corpus"] = corpus_files
+        for config in [
+            CorpusConfig(clean_header=False, split_docs=10),
+            CorpusConfig(
+                clean_header=False, split_size=10 * self.mock_path_finder.file_size
+            ),
+        ]:
+            with self.subTest(config=config):
+                partitions = list(
+                    self.partitioner.get_partitions("corpus", self.header_file, config)
+                )
+                self.assertTrue(
+                    all(isinstance(part.files, PathRange) for part in partitions)
+                )
+                self.assertEqual(len({id(part.files._store) for part in partitions}), 1)
+                self.assertEqual(partitions[1].files, corpus_files[10:20])
+
     def test_last_partition_with_only_small_amount_of_file_avoided(self):
         total_no_files = 1001
         split_val = 100
@@ -156,7 +184,7 @@ class PartitionerTest(unittest.TestCase):
     def test_partitioning_with_random_file_size(self):
         total_no_files = random.randint(10, 15_000_000)
         split_val = random.randint(100_000, 1_000_000)
-        self.size_estimator.set_file_size(random.randint(1000, 10_000))
+        self.mock_path_finder.set_file_size(random.randint(1000, 10_000))
         corpus_dir = "test_dir"
         corpus_files = [f"file{i}.xml" for i in range(total_no_files)]
         config = CorpusConfig(clean_header=False, split_size=split_val)
@@ -181,9 +209,9 @@ class PartitionerTest(unittest.TestCase):
     def test_all_files_contained_in_partitions_with_split_size(self):
         total_no_files = random.randint(100, 10_000)
         split_val = 100_000
-        self.size_estimator.set_file_size(random.randint(1000, 10_000))
+        self.mock_path_finder.set_file_size(random.randint(1000, 10_000))
         corpus_dir = "corpus"
-        corpus_files = [f"file{i}.xml" for i in range(total_no_files)]
+        corpus_files = [f"file{i:05}.xml" for i in range(total_no_files)]
         self.mock_path_finder.files[corpus_dir] = corpus_files
         config = CorpusConfig(clean_header=False, split_size=split_val)
         partitions = self.partitioner.get_partitions(
@@ -218,7 +246,7 @@ class PartitionerTest(unittest.TestCase):
         total_no_files = random.randint(10, 15_000_000)
         split_val = random.randint(100_000, 1_000_000)
         single_file_size = random.randint(1000, 10_000)
-        self.size_estimator.set_file_size(single_file_size)
+        self.mock_path_finder.set_file_size(single_file_size)
         corpus_dir = "test_dir"
         corpus_files = [f"file{i}.xml" for i in range(total_no_files)]
         config = CorpusConfig(clean_header=False, split_size=split_val)
@@ -248,7 +276,6 @@ class PartitionerTest(unittest.TestCase):
         partitioner = Partitioner(
             self.mock_header_handler,
             self.mock_path_finder,
-            self.size_estimator,
             self.id_handler,
         )
         config = CorpusConfig(clean_header=False, processing_instructions=pis)
@@ -268,10 +295,129 @@ class PartitionerTest(unittest.TestCase):
         partitioner = Partitioner(
             header_handler=self.mock_header_handler,
             path_finder=self.mock_path_finder,
-            size_estimator=self.size_estimator,
             xmlid_handler=self.id_handler,
             docid_handler=DocIdToIdnoHandler(),
         )
         self.mock_path_finder.files["test"] = ["test/subdir/file.xml"]
         result = next(partitioner.get_partitions("test", self.header_file))
         self.assertTrue(result.docid_handler, DocIdToIdnoHandler)
+
+    def test_fragment_cache_passed_to_partitions(self):
+        config = CorpusConfig(
+            clean_header=False,
+            split_docs=1,
+            fragment_cache="cache",
+            fragment_cache_size=2000,
+        )
+        self.mock_path_finder.files["test"] = ["test/file1.xml", "test/file2.xml"]
+        partitions = list(
+            self.partitioner.get_partitions("test", self.header_file, config)
+        )
+        self.assertEqual(len(partitions), 2)
+        for partition in partitions:
+            self.assertEqual(partition.fragment_cache.directory, "cache")
+            self.assertEqual(partition.fragment_cache.max_size, 2000)
+        self.assertIsNone(
+            next(self.partitioner.get_partitions("test", self.header_file)).fragment_cache
+        )
+
+    def test_path_store_filled_from_iterator_of_sorted_files(self):
+        self.mock_path_finder.files["test"] = [f"file{i:02}.xml" for i in range(25)]
+        # the lists of all files are not requested
+        self.mock_path_finder.get_paths_for_corpus_files = None
+        self.mock_path_finder.get_paths_and_sizes_for_corpus_files = None
+        for options in [{"split_docs": 10}, {"split_size": 10_000}]:
+            config = CorpusConfig(clean_header=False, **options)
+            with self.subTest(**options):
+                partitions = list(
+                    self.partitioner.get_partitions("test", self.header_file, config)
+                )
+                self.assertEqual(
+                    [file for part in partitions for file in part.files],
+                    self.mock_path_finder.files["test"],
+                )
+                self.assertTrue(
+                    all(isinstance(part.files, PathRange) for part in partitions)
+                )
+
+    def test_streamed_files_in_single_partition(self):
+        self.mock_path_finder.files["test"] = [f"file{i}.xml" for i in range(10)]
+        config = CorpusConfig(clean_header=False, discovery="walk")
+        partitions = list(
+            self.partitioner.get_partitions("test", self.header_file, config)
+        )
+        self.assertEqual(len(partitions), 1)
+        self.assertEqual(list(partitions[0].files), self.mock_path_finder.files["test"])
+
+    def test_no_partition_for_empty_corpus_with_streamed_files(self):
+        for discovery in ["walk", "external-sort"]:
+            config = CorpusConfig(clean_header=False, discovery=discovery)
+            with self.subTest():
+                partitions = list(
+                    self.partitioner.get_partitions("test", self.header_file, config)
+                )
+                self.assertEqual(partitions, [])
+
+    def test_external_sort_used_for_streamed_files(self):
+        self.mock_path_finder.files["test"] = ["b.xml", "c.xml", "a.xml"]
+        config = CorpusConfig(clean_header=False, discovery="external-sort")
+        partition = next(
+            self.partitioner.get_partitions("test", self.header_file, config)
+        )
+        self.assertEqual(list(partition.files), ["a.xml", "b.xml", "c.xml"])
+
+    def test_streamed_partitioning_with_number_of_documents_per_file(self):
+        corpus_files = [f"file{i}.xml" for i in range(1000)]
+        self.mock_path_finder.files["test"] = corpus_files
+        config = CorpusConfig(clean_header=False, split_docs=100, discovery="walk")
+        partitions = list(
+            self.partitioner.get_partitions("test", self.header_file, config)
+        )
+        self.assertEqual([len(part) for part in partitions], [100] * 10)
+        self.assertEqual(
+            [file for part in partitions for file in part.files], corpus_files
+        )
+
+    def test_small_last_streamed_partition_added_to_previous_partition(self):
+        self.mock_path_finder.files["test"] = [f"file{i}.xml" for i in range(1020)]
+        config = CorpusConfig(clean_header=False, split_docs=100, discovery="walk")
+        partitions = list(
+            self.partitioner.get_partitions("test", self.header_file, config)
+        )
+        self.assertEqual([len(part) for part in partitions], [100] * 9 + [120])
+
+    def test_streamed_partitioning_with_file_size_same_as_sorted(self):
+        self.mock_path_finder.files["test"] = [f"file{i:04}.xml" for i in range(2500)]
+        for split_size in [1, 999, 1000, 1500, 50_000, 2_500_000, 3_000_000]:
+            results = []
+            for discovery in ["sort", "walk"]:
+                config = CorpusConfig(
+                    clean_header=False, split_size=split_size, discovery=discovery
+                )
+                partitions = self.partitioner.get_partitions(
+                    "test", self.header_file, config
+                )
+                results.append([list(part.files) for part in partitions])
+            with self.subTest(split_size=split_size):
+                self.assertEqual(results[0], results[1])
+
+    def test_file_sizes_of_discovery_passed_to_partitions(self):
+        self.mock_path_finder.files["test"] = [f"file{i}.xml" for i in range(25)]
+        settings = [
+            ("sort", {"split_size": 10_000}),
+            ("sort", {"schedule": "size"}),
+            ("walk", {"split_size": 10_000}),
+            ("walk", {"split_docs": 10, "schedule": "size"}),
+        ]
+        for discovery, options in settings:
+            config = CorpusConfig(
+                clean_header=False, discovery=discovery, workers=2, **options
+            )
+            partitions = self.partitioner.get_partitions(
+                "test", self.header_file, config
+            )
+            with self.subTest(discovery=discovery, **options):
+                for part in partitions:
+                    self.assertEqual(
+                        list(part.file_sizes), [1000] * len(list(part.files))
+                    )
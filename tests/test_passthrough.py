@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from lxml import etree
+
+from tei_make_corpus.passthrough import read_unchanged_document
+
+
+class ReadUnchangedDocumentTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_document_without_xmlid_copied(self):
+        file_path = os.path.join(
+            "tests", "testdata", "rec_corpus", "part1", "subpart", "file1.xml"
+        )
+        result = read_unchanged_document(file_path)
+        expected = etree.tostring(etree.parse(file_path).getroot(), encoding="UTF-8")
+        self.assertEqual(
+            etree.tostring(etree.fromstring(result), method="c14n"),
+            etree.tostring(etree.fromstring(expected), method="c14n"),
+        )
+
+    def test_prolog_stripped(self):
+        file_path = self._write_file(
+            b'\xef\xbb\xbf<?xml version="1.0" encoding="UTF-8"?>\n'
+            b'<!DOCTYPE TEI SYSTEM "tei_all.dtd">\n'
+            b"<!-- comment --><?pi x?>\n"
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><text/></TEI>\n\n'
+        )
+        self.assertEqual(
+            read_unchanged_document(file_path),
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><text/></TEI>',
+        )
+
+    def test_prefixed_root_element_copied(self):
+        content = b'<tei:TEI xmlns:tei="http://www.tei-c.org/ns/1.0"></tei:TEI >'
+        file_path = self._write_file(content)
+        self.assertEqual(read_unchanged_document(file_path), content)
+
+    def test_documents_that_need_parsing_not_copied(self):
+        for content in [
+            b'<TEI><p xml:id="p1"/></TEI>',
+            b"<TEI><p>xml:id</p></TEI>",
+            b'<?xml version="1.0" encoding="ISO-8859-1"?><TEI><p>\xe4</p></TEI>',
+            b'<!DOCTYPE TEI [<!ENTITY e "entity">]><TEI>&e;</TEI>',
+            b"<teiCorpus><TEI/></teiCorpus>",
+            b"<TEIheader></TEIheader>",
+            b"<TEI><text/></TEI><!-- epilog -->",
+            b"<TEI><unclosed></TEI>",
+            b"<TEI><p>&undefined;</p></TEI>",
+            b"<TEI><text/>",
+            b"<TEI/>",
+            b"",
+        ]:
+            with self.subTest(content=content):
+                self.assertIsNone(read_unchanged_document(self._write_file(content)))
+
+    def _write_file(self, content):
+        file_path = os.path.join(self.tempdir.name, "doc.xml")
+        with open(file_path, "wb") as ptr:
+            ptr.write(content)
+        return file_path
@@ -1,3 +1,4 @@
+import gzip
 import os
 import tempfile
 import unittest
@@ -72,3 +73,200 @@ class PathFinderTest(unittest.TestCase):
                 tempdir, header_file
             )
         self.assertEqual(corpus_files, sorted(file_names))
+
+    def test_paths_yielded_in_sorted_order_per_directory(self):
+        header_file = "header.xml"
+        with tempfile.TemporaryDirectory() as tempdir:
+            for path in ["b.xml", "a/c.xml", "a-b.xml", "a/b/a.xml", "a.txt"]:
+                os.makedirs(os.path.dirname(os.path.join(tempdir, path)), exist_ok=True)
+                open(os.path.join(tempdir, path), "w").close()
+            corpus_files = list(
+                self.path_finder.iter_paths_for_corpus_files(tempdir, header_file)
+            )
+        expected = ["a-b.xml", "b.xml", "a/c.xml", "a/b/a.xml"]
+        self.assertEqual(
+            corpus_files, [os.path.join(tempdir, file) for file in expected]
+        )
+
+    def test_header_file_ignored_when_paths_are_streamed(self):
+        corpus_dir = os.path.join("tests", "testdata", "corpus")
+        header_file = os.path.join("tests", "testdata", "corpus", "header.xml")
+        corpus_files = self.path_finder.iter_paths_for_corpus_files(
+            corpus_dir, header_file
+        )
+        expected = [
+            "tests/testdata/corpus/file1.xml",
+            "tests/testdata/corpus/file2.xml",
+        ]
+        self.assertEqual(list(corpus_files), expected)
+
+    def test_external_sort_yields_paths_in_sorted_order(self):
+        header_file = "header.xml"
+        path_finder = PathFinderImpl(sort_buffer_size=7)
+        with tempfile.TemporaryDirectory() as tempdir:
+            for _ in range(5):
+                sub_dir = tempfile.mkdtemp(dir=tempdir)
+                for directory in [tempdir, sub_dir]:
+                    for _ in range(5):
+                        fd, _ = tempfile.mkstemp(".xml", dir=directory)
+                        os.close(fd)
+            expected = path_finder.get_paths_for_corpus_files(tempdir, header_file)
+            corpus_files = path_finder.iter_sorted_paths_for_corpus_files(
+                tempdir, header_file
+            )
+            self.assertEqual(list(corpus_files), expected)
+
+    def test_external_sort_with_fewer_paths_than_buffer_size(self):
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        header_file = "header.xml"
+        corpus_files = self.path_finder.iter_sorted_paths_for_corpus_files(
+            corpus_dir, header_file
+        )
+        expected = self.path_finder.get_paths_for_corpus_files(corpus_dir, header_file)
+        self.assertEqual(list(corpus_files), expected)
+
+    def test_paths_and_sizes_in_same_order_as_paths(self):
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        header_file = "header.xml"
+        file_records = self.path_finder.get_paths_and_sizes_for_corpus_files(
+            corpus_dir, header_file
+        )
+        expected = self.path_finder.get_paths_for_corpus_files(corpus_dir, header_file)
+        self.assertEqual([file_path for file_path, _ in file_records], expected)
+
+    def test_sizes_of_corpus_files_determined_while_scanning(self):
+        header_file = "header.xml"
+        with tempfile.TemporaryDirectory() as tempdir:
+            for path, size in [("b.xml", 10), ("a/c.xml", 0), ("a/b/a.xml", 250)]:
+                os.makedirs(os.path.dirname(os.path.join(tempdir, path)), exist_ok=True)
+                with open(os.path.join(tempdir, path), "w") as fp:
+                    fp.write("x" * size)
+            file_records = self.path_finder.iter_paths_and_sizes_for_corpus_files(
+                tempdir, header_file
+            )
+            expected = [("b.xml", 10), ("a/c.xml", 0), ("a/b/a.xml", 250)]
+            self.assertEqual(
+                list(file_records),
+                [(os.path.join(tempdir, path), size) for path, size in expected],
+            )
+
+    def test_broken_symlink_has_size_zero(self):
+        header_file = "header.xml"
+        with tempfile.TemporaryDirectory() as tempdir:
+            os.symlink(
+                os.path.join(tempdir, "missing.txt"), os.path.join(tempdir, "a.xml")
+            )
+            file_records = self.path_finder.get_paths_and_sizes_for_corpus_files(
+                tempdir, header_file
+            )
+            self.assertEqual(file_records, [(os.path.join(tempdir, "a.xml"), 0)])
+
+    def test_external_sort_of_paths_and_sizes(self):
+        header_file = "header.xml"
+        path_finder = PathFinderImpl(sort_buffer_size=3)
+        with tempfile.TemporaryDirectory() as tempdir:
+            for _ in range(3):
+                sub_dir = tempfile.mkdtemp(dir=tempdir)
+                for directory in [tempdir, sub_dir]:
+                    for _ in range(3):
+                        fd, _ = tempfile.mkstemp(".xml", dir=directory)
+                        os.write(fd, b"<a/>")
+                        os.close(fd)
+            expected = path_finder.get_paths_and_sizes_for_corpus_files(
+                tempdir, header_file
+            )
+            file_records = path_finder.iter_sorted_paths_and_sizes_for_corpus_files(
+                tempdir, header_file
+            )
+            self.assertEqual(list(file_records), expected)
+
+    def test_same_paths_and_sizes_with_multiple_walk_threads(self):
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        header_file = "header.xml"
+        path_finder = PathFinderImpl(walk_threads=4)
+        self.assertEqual(
+            path_finder.get_paths_for_corpus_files(corpus_dir, header_file),
+            self.path_finder.get_paths_for_corpus_files(corpus_dir, header_file),
+        )
+        self.assertEqual(
+            list(path_finder.iter_paths_for_corpus_files(corpus_dir, header_file)),
+            list(self.path_finder.iter_paths_for_corpus_files(corpus_dir, header_file)),
+        )
+        self.assertEqual(
+            path_finder.get_paths_and_sizes_for_corpus_files(corpus_dir, header_file),
+            self.path_finder.get_paths_and_sizes_for_corpus_files(
+                corpus_dir, header_file
+            ),
+        )
+
+    def test_same_paths_and_sizes_with_listing_cache(self):
+        corpus_dir = os.path.join("tests", "testdata", "rec_corpus")
+        header_file = "header.xml"
+        with tempfile.TemporaryDirectory() as tempdir:
+            path_finder = PathFinderImpl(
+                listing_cache=os.path.join(tempdir, "listings.db")
+            )
+            for _ in range(2):
+                with self.subTest():
+                    self.assertEqual(
+                        path_finder.get_paths_for_corpus_files(corpus_dir, header_file),
+                        self.path_finder.get_paths_for_corpus_files(
+                            corpus_dir, header_file
+                        ),
+                    )
+                    self.assertEqual(
+                        list(
+                            path_finder.iter_paths_for_corpus_files(
+                                corpus_dir, header_file
+                            )
+                        ),
+                        list(
+                            self.path_finder.iter_paths_for_corpus_files(
+                                corpus_dir, header_file
+                            )
+                        ),
+                    )
+                    self.assertEqual(
+                        path_finder.get_paths_and_sizes_for_corpus_files(
+                            corpus_dir, header_file
+                        ),
+                        self.path_finder.get_paths_and_sizes_for_corpus_files(
+                            corpus_dir, header_file
+                        ),
+                    )
+
+    def test_header_file_ignored_with_listing_cache(self):
+        corpus_dir = os.path.join("tests", "testdata", "corpus")
+        with tempfile.TemporaryDirectory() as tempdir:
+            path_finder = PathFinderImpl(
+                listing_cache=os.path.join(tempdir, "listings.db")
+            )
+            result = path_finder.get_paths_for_corpus_files(corpus_dir, "header.xml")
+        self.assertEqual(
+            result,
+            ["tests/testdata/corpus/file1.xml", "tests/testdata/corpus/file2.xml"],
+        )
+
+    def test_compressed_corpus_files_found_with_uncompressed_size(self):
+        header_file = "header.xml"
+        with tempfile.TemporaryDirectory() as tempdir:
+            with gzip.open(os.path.join(tempdir, "a.xml.gz"), "wb") as fp:
+                fp.write(b"x" * 1000)
+            for file_name in ["b.xml", "c.txt.gz", "d.xml.bz2"]:
+                with open(os.path.join(tempdir, file_name), "wb") as fp:
+                    fp.write(b"x" * 10)
+            expected = [
+                (os.path.join(tempdir, "a.xml.gz"), 1000),
+                (os.path.join(tempdir, "b.xml"), 10),
+                (os.path.join(tempdir, "d.xml.bz2"), 10 * 5),
+            ]
+            self.assertEqual(
+                self.path_finder.get_paths_and_sizes_for_corpus_files(
+                    tempdir, header_file
+                ),
+                expected,
+            )
+            self.assertEqual(
+                self.path_finder.get_paths_for_corpus_files(tempdir, header_file),
+                [path for path, _ in expected],
+            )
@@ -0,0 +1,84 @@
+import os
+import pickle
+import unittest
+
+from tei_make_corpus.path_store import PathRange, PathStore
+
+
+class PathStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.paths = [
+            os.path.join("corpus", "a", "file1.xml"),
+            os.path.join("corpus", "a", "file2.xml"),
+            os.path.join("corpus", "b", "file1.xml"),
+            "file.xml",
+            os.path.join("corpus", "a", "fïle\udcff.xml"),
+            os.path.join("corpus", "a", ""),
+            os.path.join("corpus", "a", "file3.xml"),
+        ]
+        self.store = PathStore(self.paths)
+
+    def test_paths_returned_unchanged(self):
+        self.assertEqual(list(self.store), self.paths)
+        self.assertEqual(len(self.store), len(self.paths))
+
+    def test_access_by_index(self):
+        for index in range(-len(self.paths), len(self.paths)):
+            with self.subTest(index=index):
+                self.assertEqual(self.store[index], self.paths[index])
+
+    def test_index_out_of_range(self):
+        for index in [len(self.paths), -len(self.paths) - 1]:
+            with self.subTest(index=index):
+                with self.assertRaises(IndexError):
+                    self.store[index]
+
+    def test_directories_stored_once(self):
+        self.assertEqual(len(self.store._directories), 3)
+
+    def test_paths_appended(self):
+        store = PathStore()
+        for path in self.paths:
+            store.append(path)
+        self.assertEqual(list(store), self.paths)
+
+    def test_slice_is_range_of_store(self):
+        for start, stop in [(0, 7), (1, 4), (3, 3), (5, 2), (-3, None), (0, 100)]:
+            with self.subTest(start=start, stop=stop):
+                part = self.store[start:stop]
+                self.assertIsInstance(part, PathRange)
+                self.assertEqual(list(part), self.paths[start:stop])
+                self.assertEqual(len(part), len(self.paths[start:stop]))
+
+    def test_slice_with_step_rejected(self):
+        with self.assertRaises(ValueError):
+            self.store[::2]
+
+
+class PathRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.paths = [os.path.join("corpus", f"file{i}.xml") for i in range(10)]
+        self.part = PathStore(self.paths)[2:8]
+
+    def test_access_by_index(self):
+        self.assertEqual(self.part[0], self.paths[2])
+        self.assertEqual(self.part[-1], self.paths[7])
+        with self.assertRaises(IndexError):
+            self.part[6]
+
+    def test_slice_of_range(self):
+        self.assertEqual(list(self.part[1:3]), self.paths[3:5])
+        self.assertEqual(list(self.part[4:]), self.paths[6:8])
+
+    def test_range_equal_to_sequence_with_same_paths(self):
+        self.assertEqual(self.part, self.paths[2:8])
+        self.assertEqual(self.paths[2:8], self.part)
+        self.assertEqual(self.part, tuple(self.paths[2:8]))
+        self.assertNotEqual(self.part, self.paths[2:7])
+        self.assertNotEqual(self.part, self.paths[1:7])
+        self.assertNotEqual(self.part, "corpus")
+
+    def test_range_pickled_as_list(self):
+        unpickled = pickle.loads(pickle.dumps(self.part))
+        self.assertEqual(unpickled, self.paths[2:8])
+        self.assertIsInstance(unpickled, list)
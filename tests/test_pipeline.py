@@ -0,0 +1,89 @@
+import os
+import unittest
+
+from tei_make_corpus.document_pool import serialize_tei_document
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.pipeline import DocumentPipeline
+from tei_make_corpus.xmlid_handler import XmlIdPrefixer, XmlIdRemover
+
+
+class DocumentPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.corpus_dir = os.path.join("tests", "testdata", "cleaning")
+        self.header_handler = TeiHeaderHandlerImpl(
+            os.path.join(self.corpus_dir, "header.xml")
+        )
+        self.invalid_file = os.path.join(
+            "tests", "testdata", "dir_invalid", "invalid.xml"
+        )
+        self.files = [
+            os.path.join(self.corpus_dir, file) for file in ["file1.xml", "header.xml"]
+        ] * 5
+
+    def test_documents_passed_in_order_of_files(self):
+        result = self._write(
+            self._partition(self.files, XmlIdPrefixer()),
+            {"read": 2, "transform": 4, "serialize": 2},
+            queue_size=1,
+        )
+        expected = self._prepare_serially(self.files, XmlIdPrefixer())
+        self.assertEqual(result, expected)
+
+    def test_invalid_document_results_in_empty_string(self):
+        files = [self.invalid_file] + self.files
+        with self.assertLogs("tei_make_corpus.partition"):
+            result = self._write(self._partition(files, XmlIdRemover()))
+        self.assertEqual(result[0], b"")
+        self.assertEqual(len(result), len(files))
+
+    def test_prefixes_shifted_by_invalid_document_corrected(self):
+        files = [self.invalid_file] + self.files
+        with self.assertLogs("tei_make_corpus.partition"):
+            result = self._write(
+                self._partition(files, XmlIdPrefixer()), {"transform": 3}
+            )
+            expected = self._prepare_serially(files, XmlIdPrefixer())
+        self.assertEqual(result, expected)
+
+    def test_missing_file_raises_error(self):
+        files = self.files + [os.path.join(self.corpus_dir, "missing.xml")]
+        with self.assertRaises(OSError):
+            self._write(self._partition(files, XmlIdRemover()), {"read": 2})
+
+    def test_statistics_collected_per_stage(self):
+        pipeline = DocumentPipeline(
+            self._partition(self.files, XmlIdRemover()), {"read": 2}, 2
+        )
+        pipeline.write_documents(lambda serialized: None)
+        self.assertEqual(
+            {stage: stats.documents for stage, stats in pipeline.stats.items()},
+            {"discover": 10, "read": 10, "transform": 10, "serialize": 10, "write": 10},
+        )
+        self.assertTrue(
+            all(stats.mean_queue_depth() <= 2 for stats in pipeline.stats.values())
+        )
+        self.assertEqual(
+            pipeline.queue_depths(),
+            {"read": 0, "transform": 0, "serialize": 0, "write": 0},
+        )
+
+    def test_no_documents(self):
+        self.assertEqual(self._write(self._partition([], XmlIdRemover())), [])
+
+    def _partition(self, files, xmlid_handler):
+        return Partition(self.header_handler, files, xmlid_handler, clean_files=True)
+
+    def _write(self, partition, stage_workers=None, queue_size=2):
+        result = []
+        DocumentPipeline(partition, stage_workers, queue_size).write_documents(
+            result.append
+        )
+        return result
+
+    def _prepare_serially(self, files, xmlid_handler):
+        partition = self._partition(files, xmlid_handler)
+        return [
+            serialize_tei_document(partition._prepare_single_tei_file(file))
+            for file in files
+        ]
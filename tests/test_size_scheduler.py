@@ -0,0 +1,62 @@
+import unittest
+
+from tei_make_corpus.size_scheduler import SizeScheduler
+
+
+class SizeSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.sizes = {"a": 10, "b": 500, "c": 20, "d": 300, "e": 30}
+
+    def test_largest_documents_dispatched_first(self):
+        scheduler = self._scheduler(window_size=10_000)
+        self.assertEqual(
+            self._dispatch_all(scheduler),
+            [[(1, "b")], [(3, "d")], [(4, "e")], [(2, "c")], [(0, "a")]],
+        )
+
+    def test_documents_admitted_while_window_not_full(self):
+        scheduler = self._scheduler(window_size=400)
+        self.assertEqual(scheduler.next_batch(1, 1), [(1, "b")])
+        self.assertEqual(scheduler.window(), 510)
+        self.assertEqual(scheduler.next_batch(1, 1), [(0, "a")])
+        self.assertEqual(scheduler.next_batch(1, 1), [])
+
+    def test_released_documents_free_window(self):
+        scheduler = self._scheduler(window_size=400)
+        scheduler.next_batch(2, 10_000)
+        scheduler.release(0)
+        self.assertEqual(scheduler.next_batch(1, 1), [])
+        scheduler.release(1)
+        self.assertEqual(scheduler.window(), 0)
+        self.assertEqual(
+            scheduler.next_batch(5, 10_000), [(3, "d"), (4, "e"), (2, "c")]
+        )
+
+    def test_batch_completed_at_size(self):
+        scheduler = self._scheduler(window_size=10_000)
+        self.assertEqual(scheduler.next_batch(5, 400), [(1, "b")])
+        self.assertEqual(scheduler.next_batch(5, 310), [(3, "d"), (4, "e")])
+        self.assertEqual(scheduler.next_batch(1, 1_000), [(2, "c")])
+
+    def test_single_large_document_exceeds_window(self):
+        scheduler = self._scheduler(window_size=1)
+        self.assertEqual(
+            self._dispatch_all(scheduler, release=True),
+            [[(0, "a")], [(1, "b")], [(2, "c")], [(3, "d")], [(4, "e")]],
+        )
+
+    def test_no_documents(self):
+        scheduler = SizeScheduler([], 100)
+        self.assertEqual(scheduler.next_batch(5, 100), [])
+
+    def _scheduler(self, window_size):
+        return SizeScheduler(sorted(self.sizes.items()), window_size)
+
+    def _dispatch_all(self, scheduler, release=False):
+        batches = []
+        while batch := scheduler.next_batch(1, 1):
+            batches.append(batch)
+            if release:
+                for index, _ in batch:
+                    scheduler.release(index)
+        return batches
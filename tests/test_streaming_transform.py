@@ -0,0 +1,193 @@
+import dataclasses
+import glob
+import os
+import tempfile
+import unittest
+
+from tei_make_corpus.doc_id_handler import DocIdToIdnoHandler
+from tei_make_corpus.document_pool import serialize_tei_document
+from tei_make_corpus.header_handler import TeiHeaderHandlerImpl
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.streaming_transform import StreamingTransformer
+from tei_make_corpus.xmlid_handler import (
+    PresetXmlIdPrefixer,
+    XmlIdPrefixer,
+    XmlIdRemover,
+)
+
+
+class StreamingTransformerTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.header_handler = TeiHeaderHandlerImpl(
+            os.path.join("tests", "testdata", "xmlid", "header.xml")
+        )
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_output_identical_to_transformed_tree(self):
+        files = sorted(glob.glob(os.path.join("tests", "testdata", "*", "*.xml")))
+        for clean_files in [False, True]:
+            for docid_handler in [None, DocIdToIdnoHandler()]:
+                for xmlid_handler_class in [XmlIdRemover, XmlIdPrefixer]:
+                    with self.subTest(
+                        clean_files=clean_files,
+                        docid_handler=docid_handler,
+                        xmlid_handler=xmlid_handler_class,
+                    ), self.assertLogs(level="INFO"):
+                        partition = Partition(
+                            self.header_handler,
+                            files,
+                            xmlid_handler_class(),
+                            clean_files=clean_files,
+                            docid_handler=docid_handler,
+                        )
+                        self.assertEqual(
+                            self._stream(partition, files),
+                            self._transform_trees(partition, files),
+                        )
+
+    def test_markup_serialized_as_in_tree(self):
+        file_path = self._write_file(
+            "doc.xml",
+            b'<?xml version="1.0"?>\n'
+            b'<!DOCTYPE TEI [<!ENTITY e "entity">]>\n'
+            b"<!-- before --><?pi before?>\n"
+            b'<TEI xmlns:xi="http://www.w3.org/2001/XInclude"'
+            b' xmlns="http://www.tei-c.org/ns/1.0" xml:id="doc">'
+            b'<teiHeader xmlns:h="urn:h"><fileDesc h:a="1"/></teiHeader>\n'
+            b'<text xml:id="t" corresp="#doc" n="a&amp;b &lt;&gt; &quot;">'
+            b"<body>&e; &amp;&lt;&gt;&#13;\xc3\xa4<!-- c --><?pi x?>tail"
+            b'<x:seg xmlns:x="urn:x" xi:href="#t"><x:s/> <p/></x:seg>'
+            b'<p xmlns="http://www.tei-c.org/ns/1.0" xml:id="p">redundant</p>'
+            b"<p></p></body></text></TEI>\n"
+            b"<!-- after -->",
+        )
+        for xmlid_handler in [XmlIdRemover(), XmlIdPrefixer()]:
+            with self.subTest(xmlid_handler=xmlid_handler):
+                partition = Partition(self.header_handler, [file_path], xmlid_handler)
+                self.assertEqual(
+                    self._stream(partition, [file_path]),
+                    self._transform_trees(partition, [file_path]),
+                )
+
+    def test_document_without_namespace_declarations_serialized_as_in_tree(self):
+        file_path = self._write_file(
+            "doc.xml",
+            b'<TEI><teiHeader/><text><p xml:id="a" target="#a">x</p></text></TEI>',
+        )
+        for xmlid_handler in [XmlIdRemover(), XmlIdPrefixer()]:
+            with self.subTest(xmlid_handler=xmlid_handler):
+                partition = Partition(self.header_handler, [file_path], xmlid_handler)
+                self.assertEqual(
+                    self._stream(partition, [file_path]),
+                    self._transform_trees(partition, [file_path]),
+                )
+
+    def test_lists_of_pointers_prefixed_as_in_tree(self):
+        file_path = self._write_file(
+            "doc.xml",
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0" corresp="#t #p">'
+            b"<teiHeader/>"
+            b'<text xml:id="t"><p xml:id="p" target="#t #x #p"/></text></TEI>',
+        )
+        partition = Partition(self.header_handler, [file_path], XmlIdPrefixer())
+        self.assertEqual(
+            self._stream(partition, [file_path]),
+            self._transform_trees(partition, [file_path]),
+        )
+
+    def test_references_to_removed_header_elements_not_prefixed(self):
+        header_file = os.path.join("tests", "testdata", "xmlid", "header.xml")
+        file_path = self._write_file(
+            "doc.xml",
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc>'
+            b"<titleStmt><title>Corpus title</title>"
+            b'<funder xml:id="Funder">Funder</funder></titleStmt>'
+            b"</fileDesc></teiHeader>"
+            b'<text><p corresp="#Funder"/></text></TEI>',
+        )
+        partition = Partition(
+            TeiHeaderHandlerImpl(header_file),
+            [file_path],
+            XmlIdPrefixer(),
+            clean_files=True,
+        )
+        result = self._stream(partition, [file_path])
+        self.assertIn(b'corresp="#Funder"', result[0])
+        self.assertEqual(result, self._transform_trees(partition, [file_path]))
+
+    def test_invalid_document_not_written(self):
+        file_path = self._write_file(
+            "doc.xml",
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader/>'
+            + b"<p>text</p>" * 100
+            + b"<text>",
+        )
+        partition = Partition(self.header_handler, [file_path], XmlIdPrefixer())
+        with self.assertLogs("tei_make_corpus.streaming_transform", level="ERROR"):
+            self.assertEqual(self._stream(partition, [file_path]), [b""])
+
+    def test_no_prefix_generated_for_omitted_document(self):
+        file_path = self._write_file("doc.xml", b"<TEI><text>")
+        xmlid_handler = PresetXmlIdPrefixer(["pa", "pb"])
+        partition = Partition(self.header_handler, [file_path], xmlid_handler)
+        with self.assertLogs("tei_make_corpus.streaming_transform", level="ERROR"):
+            self._stream(partition, [file_path])
+        self.assertEqual(xmlid_handler.generate_prefix(file_path), "pa")
+
+    def test_document_without_tei_root_ignored(self):
+        file_path = self._write_file("doc.xml", b"<teiCorpus><TEI/></teiCorpus>")
+        partition = Partition(self.header_handler, [file_path], XmlIdRemover())
+        with self.assertLogs("tei_make_corpus.streaming_transform", level="INFO"):
+            self.assertEqual(self._stream(partition, [file_path]), [b""])
+
+    def test_only_files_reaching_threshold_streamed(self):
+        small = self._write_file("small.xml", b"<TEI/>")
+        large = self._write_file("large.xml", b"<TEI>" + b" " * 100 + b"</TEI>")
+        streamer = StreamingTransformer(
+            Partition(self.header_handler, [], XmlIdRemover()), 100
+        )
+        self.assertFalse(streamer.streams(small))
+        self.assertTrue(streamer.streams(large))
+
+    def test_output_written_in_chunks(self):
+        file_path = self._write_file(
+            "doc.xml",
+            b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><text>'
+            + (b"<p>" + b"a" * 1000 + b"</p>") * 2000
+            + b"</text></TEI>",
+        )
+        partition = Partition(self.header_handler, [file_path], XmlIdRemover())
+        chunks = []
+        StreamingTransformer(partition, 0).write_document(file_path, chunks.append)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(
+            [b"".join(chunks)], self._transform_trees(partition, [file_path])
+        )
+
+    def _stream(self, partition, files):
+        result = []
+        streamer = StreamingTransformer(partition, 0)
+        for file_path in files:
+            chunks = []
+            streamer.write_document(file_path, chunks.append)
+            result.append(b"".join(chunks))
+        return result
+
+    def _transform_trees(self, partition, files):
+        # prefixes are generated again with a new handler
+        partition = dataclasses.replace(
+            partition, xmlid_handler=type(partition.xmlid_handler)()
+        )
+        return [
+            serialize_tei_document(partition._prepare_single_tei_file(file_path))
+            for file_path in files
+        ]
+
+    def _write_file(self, name, content):
+        file_path = os.path.join(self.tempdir.name, name)
+        with open(file_path, "wb") as ptr:
+            ptr.write(content)
+        return file_path
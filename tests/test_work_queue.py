@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tei_make_corpus.partition import Partition
+from tei_make_corpus.partition_plan import PartitionPlan
+from tei_make_corpus.work_queue import WorkQueue
+from tei_make_corpus.xmlid_handler import XmlIdRemover
+from tests.utils import MockHeaderHandler
+
+
+class MockClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.clock = MockClock()
+        self.queue = WorkQueue(os.path.join(self.tempdir.name, "queue.db"), self.clock)
+        self.plan = PartitionPlan(
+            [
+                (
+                    Partition(
+                        MockHeaderHandler(),
+                        [f"file{i}a.xml", f"file{i}b.xml"],
+                        XmlIdRemover(),
+                    ),
+                    f"part{i:04}.xml",
+                )
+                for i in range(3)
+            ]
+        )
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_parts_claimed_in_order_of_plan(self):
+        self.queue.create(self.plan)
+        claimed = [self.queue.claim("worker", 60) for _ in range(3)]
+        self.assertEqual([part.index for part in claimed], [0, 1, 2])
+        self.assertEqual(claimed[1].output_file, "part0001.xml")
+        self.assertEqual(claimed[1].files, ["file1a.xml", "file1b.xml"])
+        self.assertIsNone(claimed[1].reserved_prefixes)
+
+    def test_no_part_left_to_claim(self):
+        self.queue.create(self.plan)
+        for _ in range(3):
+            self.queue.claim("worker", 60)
+        self.assertIsNone(self.queue.claim("other", 60))
+
+    def test_part_with_expired_lease_claimed_again(self):
+        self.queue.create(self.plan)
+        part = self.queue.claim("crashed", 10)
+        for _ in range(2):
+            self.queue.claim("worker", 60)
+        self.clock.now += 5
+        self.assertIsNone(self.queue.claim("worker", 60))
+        self.clock.now += 10
+        self.assertEqual(self.queue.claim("worker", 60).index, part.index)
+
+    def test_done_part_not_claimed_again(self):
+        self.queue.create(self.plan)
+        part = self.queue.claim("worker", 10)
+        self.queue.complete(part.index)
+        self.clock.now += 20
+        self.assertEqual(self.queue.claim("worker", 60).index, 1)
+
+    def test_renewed_lease_not_claimed_by_other_worker(self):
+        self.queue.create(self.plan)
+        part = self.queue.claim("worker", 10)
+        self.queue.renew(part.index, "worker", 60)
+        for _ in range(2):
+            self.queue.claim("other", 60)
+        self.clock.now += 20
+        self.assertIsNone(self.queue.claim("other", 60))
+
+    def test_lease_kept_while_context_active(self):
+        self.queue.create(self.plan)
+        part = self.queue.claim("worker", 10)
+        for _ in range(2):
+            self.queue.claim("other", 60)
+        renewed = threading.Event()
+        renew = self.queue.renew
+
+        def renew_and_notify(*args):
+            renew(*args)
+            renewed.set()
+
+        # the lease expired, but is renewed before another worker claims it
+        self.clock.now += 20
+        with mock.patch.object(self.queue, "renew", side_effect=renew_and_notify):
+            with self.queue.keep_lease(part.index, "worker", 0.03):
+                self.assertTrue(renewed.wait(10))
+                self.assertIsNone(self.queue.claim("other", 60))
+
+    def test_status_counts_parts_per_state(self):
+        self.queue.create(self.plan)
+        part = self.queue.claim("worker", 60)
+        self.queue.claim("worker", 60)
+        self.queue.complete(part.index)
+        self.assertEqual(self.queue.status(), {"pending": 1, "claimed": 1, "done": 1})
+
+    def test_reserved_prefixes_stored_with_part(self):
+        self.queue.create(self.plan, [set(), {"b", "a"}, {"c"}])
+        self.queue.claim("worker", 60)
+        self.assertEqual(self.queue.claim("worker", 60).reserved_prefixes, ["a", "b"])
+
+    def test_digest_of_plan_stored(self):
+        self.queue.create(self.plan)
+        self.assertEqual(self.queue.digest(), self.plan.digest())
+
+    def test_existing_queue_not_overwritten(self):
+        self.queue.create(self.plan)
+        with self.assertRaises(FileExistsError):
+            self.queue.create(self.plan)
@@ -2,7 +2,11 @@ import unittest
 
 from lxml import etree
 
-from tei_make_corpus.xmlid_handler import XmlIdPrefixer, XmlIdRemover
+from tei_make_corpus.xmlid_handler import (
+    PresetXmlIdPrefixer,
+    XmlIdPrefixer,
+    XmlIdRemover,
+)
 
 
 class XmlIdRemoverTest(unittest.TestCase):
@@ -228,3 +232,75 @@ class XmlIdPrefixerTest(unittest.TestCase):
                 {"{http://www.w3.org/XML/1998/namespace}id": "p054536-a"},
             ],
         )
+
+    def test_prefix_added_to_each_reference_in_list_of_pointers(self):
+        doc = etree.XML(
+            """
+            <root>
+                <el1 xml:id='a'/>
+                <el2 xml:id='b'/>
+                <el3 corresp='#a #b' target='#b  #c&#10;#a'/>
+            </root>
+            """
+        )
+        self.prefix_handler.process_document(doc, "file.xml")
+        self.assertEqual(
+            doc[2].attrib,
+            {
+                "corresp": "#p054536-a #p054536-b",
+                "target": "#p054536-b  #c\n#p054536-a",
+            },
+        )
+
+    def test_prefix_not_added_to_list_without_referenced_xmlid(self):
+        doc = etree.XML("<root><el1 xml:id='a'/><el2 target='#aa b#a #'/></root>")
+        self.prefix_handler.process_document(doc, "file.xml")
+        self.assertEqual(doc[1].attrib, {"target": "#aa b#a #"})
+
+    def test_prefix_added_to_reference_to_xmlid_with_quotes(self):
+        doc = etree.Element("root")
+        etree.SubElement(
+            doc, "el1", {"{http://www.w3.org/XML/1998/namespace}id": "a'b\""}
+        )
+        etree.SubElement(doc, "el2", {"corresp": "#a'b\""})
+        self.prefix_handler.process_document(doc, "file.xml")
+        result = [node.attrib for node in doc]
+        self.assertEqual(
+            result,
+            [
+                {"{http://www.w3.org/XML/1998/namespace}id": "p054536-a'b\""},
+                {"corresp": "#p054536-a'b\""},
+            ],
+        )
+
+    def test_prefix_element_adds_prefix_to_list_of_pointers(self):
+        element = etree.XML("<el corresp='#a #b #c'/>")
+        self.prefix_handler.prefix_element(element, "p1", {"a", "c"})
+        self.assertEqual(element.get("corresp"), "#p1-a #b #p1-c")
+
+    def test_reserved_prefixes_used_for_collisions(self):
+        prefix_handler = XmlIdPrefixer(["0cf83b", "0cf83b0"])
+        result = prefix_handler.generate_prefix("path/to/file.xml")
+        self.assertEqual(result, "p0cf83b1")
+
+    def test_reserved_prefixes_for_file_path(self):
+        files = ["path/to/file.xml"] * 3 + ["file.xml"]
+        for file in files:
+            self.prefix_handler.generate_prefix(file)
+        result = self.prefix_handler.reserved_prefixes("path/to/file.xml")
+        self.assertEqual(result, {"0cf83b", "0cf83b0", "0cf83b1"})
+
+    def test_no_reserved_prefixes_for_new_file_path(self):
+        self.prefix_handler.generate_prefix("file.xml")
+        result = self.prefix_handler.reserved_prefixes("path/to/file.xml")
+        self.assertEqual(result, set())
+
+
+class PresetXmlIdPrefixerTest(unittest.TestCase):
+    def test_preset_prefixes_used_in_order(self):
+        prefix_handler = PresetXmlIdPrefixer(["pa", "pb"])
+        docs = [etree.XML("<root xml:id='a'/>"), etree.XML("<root xml:id='a'/>")]
+        for doc in docs:
+            prefix_handler.process_document(doc, "file.xml")
+        result = [doc.get("{http://www.w3.org/XML/1998/namespace}id") for doc in docs]
+        self.assertEqual(result, ["pa-a", "pb-a"])